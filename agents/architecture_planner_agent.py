@@ -1,7 +1,7 @@
 from utils.llm import call_llm
 
 class ArchitecturePlannerAgent:
-    def run(self, parsed_features: str) -> str:
+    async def run(self, parsed_features: str, on_delta=None) -> str:
         prompt = f"""
 You are a Systems Architect.
 
@@ -15,4 +15,4 @@ Design a scalable system architecture. Include:
 
 Do NOT provide a Mermaid.js diagram or any diagram. Only return a clear, structured explanation of the architecture in markdown text.
 """
-        return call_llm(prompt)
+        return await call_llm(prompt, on_delta=on_delta)
@@ -1,7 +1,7 @@
 from utils.llm import call_llm
 
 class FeatureParserAgent:
-    def run(self, research_summary: str) -> str:
+    async def run(self, research_summary: str, on_delta=None) -> str:
         prompt = f"""
 You are a Product Feature Analyst.
 
@@ -16,4 +16,4 @@ Extract and list:
 
 Return in structured markdown format with headings.
 """
-        return call_llm(prompt)
+        return await call_llm(prompt, on_delta=on_delta)
@@ -1,7 +1,7 @@
 from utils.llm import call_llm
 
 class ResearchAgent:
-    def run(self, product_idea: str) -> str:
+    async def run(self, product_idea: str, on_delta=None) -> str:
         prompt = f"""
 You are a Research Expert. Your task is to analyze the market and user landscape for the following product idea:
 
@@ -14,4 +14,4 @@ Provide:
 
 Return your response in clear, markdown-formatted text.
 """
-        return call_llm(prompt)
+        return await call_llm(prompt, on_delta=on_delta)
@@ -1,7 +1,7 @@
 from utils.llm import call_llm
 
 class SecurityInfraAgent:
-    def run(self, architecture_plan: str) -> str:
+    async def run(self, architecture_plan: str, on_delta=None) -> str:
         prompt = f"""
 You are a Security & Infrastructure Specialist.
 
@@ -15,4 +15,4 @@ Provide:
 
 Return your response in a markdown list format.
 """
-        return call_llm(prompt)
+        return await call_llm(prompt, on_delta=on_delta)
@@ -1,7 +1,7 @@
 from utils.llm import call_llm
 
 class TechStackSelectorAgent:
-    def run(self, architecture_plan: str) -> str:
+    async def run(self, architecture_plan: str, on_delta=None) -> str:
         prompt = f"""
 You are a Tech Stack Strategist.
 
@@ -33,4 +33,4 @@ Output your answer as clear, concise bullet points grouped by component type. Do
 - Caching: Redis
 
 """
-        return call_llm(prompt)
+        return await call_llm(prompt, on_delta=on_delta)
@@ -0,0 +1,108 @@
+import os
+import time
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from utils.log import get_logger
+
+FIREBASE_CREDENTIALS = os.getenv(
+    "FIREBASE_CREDENTIALS", os.path.join(os.path.dirname(__file__), "firebase-service-account.json")
+)
+AUTH_TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_TOKEN_CACHE_MAX_ENTRIES", "10000"))
+AUTH_CERT_REFRESH_SECONDS = float(os.getenv("AUTH_CERT_REFRESH_SECONDS", "1800"))
+
+stats = {"hits": 0, "misses": 0, "expired": 0, "cert_refreshes": 0, "cert_refresh_errors": 0}
+
+# sha256(token) -> decoded claims; entries live until the token's own exp claim
+_token_cache = OrderedDict()
+_refresh_task = None
+_init_lock = threading.Lock()
+logger = get_logger("auth")
+
+
+def firebase_auth():
+    # firebase_admin pulls in google-auth, requests, etc. (~250 ms); imported and initialized on
+    # first use, off the event loop, instead of when the app is imported
+    import firebase_admin
+    from firebase_admin import auth, credentials
+    with _init_lock:
+        if not firebase_admin._apps:
+            firebase_admin.initialize_app(credentials.Certificate(FIREBASE_CREDENTIALS))
+    return auth
+
+
+def verify_id_token(token: str) -> dict:
+    return firebase_auth().verify_id_token(token)
+
+
+def _cache_get(key: str):
+    decoded = _token_cache.get(key)
+    if decoded is None:
+        return None
+    if decoded["exp"] <= time.time():
+        del _token_cache[key]
+        stats["expired"] += 1
+        return None
+    _token_cache.move_to_end(key)
+    return decoded
+
+
+def _cache_set(key: str, decoded: dict):
+    if decoded.get("exp", 0) <= time.time():
+        return
+    _token_cache[key] = decoded
+    _token_cache.move_to_end(key)
+    while len(_token_cache) > AUTH_TOKEN_CACHE_MAX_ENTRIES:
+        _token_cache.popitem(last=False)
+
+
+async def verify_token(token: str) -> dict:
+    key = hashlib.sha256(token.encode("utf-8")).hexdigest()
+    decoded = _cache_get(key)
+    if decoded is not None:
+        stats["hits"] += 1
+        return decoded
+
+    stats["misses"] += 1
+    # RSA check (and any certificate fetch) happens off the event loop
+    decoded = await asyncio.to_thread(verify_id_token, token)
+    _cache_set(key, decoded)
+    return decoded
+
+
+def _fetch_signing_certs():
+    # Goes through firebase_admin's own cache-control session, so a forced fetch here
+    # leaves fresh certificates for verify_id_token and it never blocks on Google.
+    import firebase_admin
+    from firebase_admin import _token_gen
+    verifier = firebase_auth()._get_client(firebase_admin.get_app())._token_verifier
+    verifier.request(_token_gen.ID_TOKEN_CERT_URI, headers={"Cache-Control": "no-cache"})
+
+
+async def _refresh_certs_forever():
+    while True:
+        try:
+            await asyncio.to_thread(_fetch_signing_certs)
+            stats["cert_refreshes"] += 1
+        except Exception as e:
+            stats["cert_refresh_errors"] += 1
+            logger.warning("Signing certificate refresh failed", error=str(e))
+        await asyncio.sleep(AUTH_CERT_REFRESH_SECONDS)
+
+
+def start_cert_refresh():
+    global _refresh_task
+    if _refresh_task is None or _refresh_task.done():
+        _refresh_task = asyncio.ensure_future(_refresh_certs_forever())
+
+
+def stop_cert_refresh():
+    global _refresh_task
+    if _refresh_task is not None:
+        _refresh_task.cancel()
+        _refresh_task = None
+
+
+def token_cache_stats() -> dict:
+    return {**stats, "entries": len(_token_cache)}
@@ -0,0 +1,99 @@
+import os
+import json
+import time
+import asyncio
+from chat_store import blueprint_chat_row, save_blueprint_chats
+from utils.log import get_logger
+
+BLUEPRINT_BATCH_MAX_ITEMS = int(os.getenv("BLUEPRINT_BATCH_MAX_ITEMS", "1000"))
+# Pipelines running at once for one batch request (they still share the global LLM limiter)
+BLUEPRINT_BATCH_CONCURRENCY = int(os.getenv("BLUEPRINT_BATCH_CONCURRENCY", "8"))
+BLUEPRINT_BATCH_MAX_CONCURRENCY = int(os.getenv("BLUEPRINT_BATCH_MAX_CONCURRENCY", "32"))
+# Finished blueprints are written to chat in one multi-row INSERT per flush
+BLUEPRINT_BATCH_FLUSH_SIZE = int(os.getenv("BLUEPRINT_BATCH_FLUSH_SIZE", "25"))
+BLUEPRINT_BATCH_FLUSH_SECONDS = float(os.getenv("BLUEPRINT_BATCH_FLUSH_SECONDS", "2.0"))
+
+logger = get_logger("batch")
+
+stats = {"batches": 0, "items": 0, "succeeded": 0, "failed": 0, "flushes": 0, "flush_errors": 0}
+
+
+def ndjson_line(data: dict) -> str:
+    return json.dumps(data) + "\n"
+
+
+async def _flush(rows: list):
+    # Returns an NDJSON line reporting a failed write, or None
+    if not rows:
+        return None
+    batch = list(rows)
+    rows.clear()
+    try:
+        await save_blueprint_chats(batch)
+        stats["flushes"] += 1
+    except Exception as e:
+        stats["flush_errors"] += 1
+        logger.exception("Saving batch of blueprint chats failed", chats=len(batch))
+        return ndjson_line({"status": "save_failed", "chat_ids": [row["id"] for row in batch], "error": str(e)})
+    return None
+
+
+async def iter_blueprint_batch(user_id: str, titles: list, run_fn, concurrency: int = BLUEPRINT_BATCH_CONCURRENCY):
+    # Runs run_fn(title) -> pipeline result for every title, at most `concurrency` at a time, and
+    # yields one NDJSON line per title as it finishes (completion order, not submission order).
+    # Chat ids are assigned up front so a line can go out before its row is flushed.
+    stats["batches"] += 1
+    stats["items"] += len(titles)
+    semaphore = asyncio.Semaphore(max(1, min(concurrency, BLUEPRINT_BATCH_MAX_CONCURRENCY)))
+
+    async def run_one(title: str):
+        async with semaphore:
+            try:
+                return await run_fn(title)
+            except Exception as e:
+                return {"error": str(e)}
+
+    pending = {asyncio.ensure_future(run_one(title)): (index, title) for index, title in enumerate(titles)}
+    rows = []
+    flush_deadline = None
+    succeeded = failed = 0
+    try:
+        while pending:
+            timeout = max(0.0, flush_deadline - time.monotonic()) if flush_deadline is not None else None
+            done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                index, title = pending.pop(task)
+                result = task.result()
+                if "error" in result:
+                    failed += 1
+                    stats["failed"] += 1
+                    yield ndjson_line({"index": index, "title": title, "status": "failed", **result})
+                    continue
+                row = blueprint_chat_row(user_id, title, result)
+                rows.append(row)
+                flush_deadline = flush_deadline or time.monotonic() + BLUEPRINT_BATCH_FLUSH_SECONDS
+                succeeded += 1
+                stats["succeeded"] += 1
+                yield ndjson_line({"index": index, "title": title, "status": "succeeded", "chat_id": row["id"], "outputs": result})
+
+            if len(rows) >= BLUEPRINT_BATCH_FLUSH_SIZE or (flush_deadline is not None and time.monotonic() >= flush_deadline):
+                flush_deadline = None
+                error_line = await _flush(rows)
+                if error_line:
+                    yield error_line
+        error_line = await _flush(rows)
+        if error_line:
+            yield error_line
+        yield ndjson_line({"status": "done", "succeeded": succeeded, "failed": failed})
+    finally:
+        # Client went away: stop what hasn't finished, keep what has. Awaited, so the
+        # cancellation has reached the pipelines (see SingleFlight.cancel_abandoned) before we return
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        if rows:
+            await _flush(rows)
+
+
+def batch_stats() -> dict:
+    return dict(stats)
@@ -0,0 +1,37 @@
+# main.app wired to local stand-ins so it can be load tested offline:
+#   - Together API -> benchmarks/mock_together.py (TOGETHER_BASE_URL)
+#   - Postgres     -> a SQLite file (DATABASE_URL), tables created on import; needs aiosqlite,
+#                     see requirements-dev.txt
+#   - Firebase     -> a stub verifier: the bearer token "bench-<uid>" authenticates as <uid>
+#
+#   uvicorn benchmarks.bench_app:app --port 8000 --workers 2
+import os
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench.db")
+os.environ.setdefault("TOGETHER_BASE_URL", "http://127.0.0.1:8001/v1")
+os.environ.setdefault("TOGETHER_API_KEY", "bench")
+
+import sqlalchemy
+
+import auth
+import db
+
+BENCH_TOKEN_PREFIX = "bench-"
+
+
+def stub_verify_id_token(token: str) -> dict:
+    if not token.startswith(BENCH_TOKEN_PREFIX):
+        raise ValueError("Not a benchmark token")
+    uid = token[len(BENCH_TOKEN_PREFIX):]
+    return {"uid": uid, "user_id": uid, "exp": time.time() + 3600}
+
+
+# Installed before main is imported so nothing ever reaches Google (or imports firebase_admin)
+auth.verify_id_token = stub_verify_id_token
+auth._fetch_signing_certs = lambda: None
+
+if db.database.url.dialect == "sqlite":
+    db.metadata.create_all(sqlalchemy.create_engine(str(db.database.url)))
+
+from main import app  # noqa: E402
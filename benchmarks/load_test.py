@@ -0,0 +1,166 @@
+# Load scenarios against a running app (normally benchmarks/bench_app.py + mock_together.py):
+#
+#   uvicorn benchmarks.mock_together:app --port 8001 &
+#   uvicorn benchmarks.bench_app:app --port 8000 --workers 2 &
+#   python benchmarks/load_test.py --scenario all --concurrency 20 --requests 200 --workers 2
+#
+# Reports p50/p95/p99 latency, requests per second (total and per worker) and, for the
+# SSE endpoint, time to first event (the "run" event, sent before any upstream work) and
+# time to first token (the first delta or finished stage, i.e. actual pipeline output).
+import argparse
+import asyncio
+import json
+import time
+import uuid
+import httpx
+
+SCENARIOS = ("blueprint", "stream", "chats", "chat_save")
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Result:
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies = []
+        self.first_event = []
+        self.first_token = []
+        self.errors = 0
+        self.elapsed = 0.0
+
+    def report(self, workers: int) -> dict:
+        count = len(self.latencies)
+        rps = count / self.elapsed if self.elapsed else 0.0
+        report = {
+            "scenario": self.name,
+            "requests": count,
+            "errors": self.errors,
+            "rps": round(rps, 2),
+            "rps_per_worker": round(rps / workers, 2),
+            "p50_ms": round(percentile(self.latencies, 50) * 1000, 1),
+            "p95_ms": round(percentile(self.latencies, 95) * 1000, 1),
+            "p99_ms": round(percentile(self.latencies, 99) * 1000, 1),
+        }
+        if self.first_event:
+            report["ttfe_p50_ms"] = round(percentile(self.first_event, 50) * 1000, 1)
+            report["ttfe_p95_ms"] = round(percentile(self.first_event, 95) * 1000, 1)
+            report["ttfe_p99_ms"] = round(percentile(self.first_event, 99) * 1000, 1)
+        if self.first_token:
+            report["ttft_p50_ms"] = round(percentile(self.first_token, 50) * 1000, 1)
+            report["ttft_p95_ms"] = round(percentile(self.first_token, 95) * 1000, 1)
+            report["ttft_p99_ms"] = round(percentile(self.first_token, 99) * 1000, 1)
+        return report
+
+
+def idea_title(args, i: int) -> str:
+    # Unique titles by default so single-flight and the LLM cache don't hide upstream cost
+    return "Marketplace for dog walkers" if args.repeat_title else f"Benchmark idea {i} {uuid.uuid4().hex[:8]}"
+
+
+async def run_blueprint(client, args, i, result):
+    response = await client.post("/blueprint", json={"title": idea_title(args, i)})
+    return response.status_code == 200 and "error" not in response.json()
+
+
+async def run_stream(client, args, i, result):
+    started = time.perf_counter()
+    first = first_token = None
+    async with client.stream("POST", "/generate-architecture-stream/", json={"title": idea_title(args, i)}) as response:
+        if response.status_code != 200:
+            return False
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            if first is None:
+                first = time.perf_counter() - started
+                result.first_event.append(first)
+            payload = line[len("data:"):].strip()
+            if payload == "STREAM_END":
+                break
+            if first_token is None and json.loads(payload).get("type") in ("delta", "complete"):
+                first_token = time.perf_counter() - started
+                result.first_token.append(first_token)
+    return first_token is not None
+
+
+async def run_chats(client, args, i, result):
+    response = await client.get("/chats", params={"limit": args.page_size, "summary": "true"})
+    return response.status_code == 200
+
+
+async def run_chat_save(client, args, i, result):
+    chat_id = f"bench-{uuid.uuid4()}"
+    messages = [
+        {"role": "user", "content": idea_title(args, i)},
+        {"role": "assistant", "content": "x" * args.message_bytes},
+    ]
+    response = await client.post("/chat/save", json={"chat_id": chat_id, "title": "bench", "messages": messages})
+    return response.status_code == 200 and response.json().get("status") == "saved"
+
+
+RUNNERS = {
+    "blueprint": run_blueprint,
+    "stream": run_stream,
+    "chats": run_chats,
+    "chat_save": run_chat_save,
+}
+
+
+async def run_scenario(name: str, args) -> Result:
+    result = Result(name)
+    runner = RUNNERS[name]
+    counter = iter(range(args.requests))
+    headers = {"Authorization": f"Bearer bench-{args.user}"}
+    timeout = httpx.Timeout(args.timeout)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=args.base_url, headers=headers, timeout=timeout, limits=limits) as client:
+        async def worker():
+            for i in counter:
+                started = time.perf_counter()
+                try:
+                    ok = await runner(client, args, i, result)
+                except (httpx.HTTPError, ValueError):
+                    ok = False
+                if ok:
+                    result.latencies.append(time.perf_counter() - started)
+                else:
+                    result.errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(args.concurrency)])
+        result.elapsed = time.perf_counter() - started
+    return result
+
+
+async def main(args):
+    scenarios = SCENARIOS if args.scenario == "all" else (args.scenario,)
+    if "chats" in scenarios:
+        # Give the listing something to page through
+        seed = argparse.Namespace(**{**vars(args), "requests": args.seed_chats})
+        await run_scenario("chat_save", seed)
+    for name in scenarios:
+        result = await run_scenario(name, args)
+        print(json.dumps(result.report(args.workers)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Blueprint AI backend load test")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--scenario", choices=SCENARIOS + ("all",), default="all")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers serving the app, for rps/worker")
+    parser.add_argument("--user", default="loadtest")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--seed-chats", type=int, default=200)
+    parser.add_argument("--message-bytes", type=int, default=8000)
+    parser.add_argument("--repeat-title", action="store_true", help="reuse one title to exercise coalescing/caching")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,84 @@
+# Local stand-in for https://api.together.xyz/v1/chat/completions
+#
+#   uvicorn benchmarks.mock_together:app --port 8001
+#   TOGETHER_BASE_URL=http://127.0.0.1:8001/v1 ...
+#
+# Latency is log-normal around MOCK_LATENCY_MEDIAN_MS (time to first token when streaming),
+# then MOCK_TOKEN_INTERVAL_MS per generated token. MOCK_RATE_LIMIT_RATE / MOCK_ERROR_RATE
+# are the fraction of requests answered with 429 / 500.
+import os
+import math
+import json
+import time
+import random
+import asyncio
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+MOCK_LATENCY_MEDIAN_MS = float(os.getenv("MOCK_LATENCY_MEDIAN_MS", "800"))
+MOCK_LATENCY_SIGMA = float(os.getenv("MOCK_LATENCY_SIGMA", "0.5"))
+MOCK_TOKEN_INTERVAL_MS = float(os.getenv("MOCK_TOKEN_INTERVAL_MS", "5"))
+MOCK_COMPLETION_TOKENS = int(os.getenv("MOCK_COMPLETION_TOKENS", "300"))
+MOCK_ERROR_RATE = float(os.getenv("MOCK_ERROR_RATE", "0"))
+MOCK_RATE_LIMIT_RATE = float(os.getenv("MOCK_RATE_LIMIT_RATE", "0"))
+MOCK_RETRY_AFTER_SECONDS = os.getenv("MOCK_RETRY_AFTER_SECONDS", "1")
+
+WORDS = ["scalable", "service", "users", "market", "api", "cache", "database", "auth", "queue", "frontend"]
+
+app = FastAPI(title="Mock Together API")
+
+
+def sample_latency() -> float:
+    return random.lognormvariate(math.log(MOCK_LATENCY_MEDIAN_MS / 1000), MOCK_LATENCY_SIGMA)
+
+
+def fake_tokens(max_tokens: int):
+    count = min(max_tokens, MOCK_COMPLETION_TOKENS)
+    return [random.choice(WORDS) + " " for _ in range(count)]
+
+
+def usage(body: dict, completion_tokens: int) -> dict:
+    prompt_tokens = sum(len(m.get("content", "")) for m in body.get("messages", [])) // 4
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    roll = random.random()
+    if roll < MOCK_RATE_LIMIT_RATE:
+        return JSONResponse(
+            {"error": {"message": "rate limited (mock)"}},
+            status_code=429,
+            headers={"Retry-After": MOCK_RETRY_AFTER_SECONDS},
+        )
+    if roll < MOCK_RATE_LIMIT_RATE + MOCK_ERROR_RATE:
+        return JSONResponse({"error": {"message": "internal error (mock)"}}, status_code=500)
+
+    tokens = fake_tokens(body.get("max_tokens", 2048))
+    latency = sample_latency()
+    completion_id = f"mock-{time.time_ns()}"
+
+    if body.get("stream"):
+        async def events():
+            await asyncio.sleep(latency)
+            for token in tokens:
+                chunk = {"id": completion_id, "choices": [{"index": 0, "delta": {"content": token}}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(MOCK_TOKEN_INTERVAL_MS / 1000)
+            final = {"id": completion_id, "choices": [], "usage": usage(body, len(tokens))}
+            yield f"data: {json.dumps(final)}\n\n"
+            yield "data: [DONE]\n\n"
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    await asyncio.sleep(latency + len(tokens) * MOCK_TOKEN_INTERVAL_MS / 1000)
+    return {
+        "id": completion_id,
+        "model": body.get("model"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)}, "finish_reason": "stop"}],
+        "usage": usage(body, len(tokens)),
+    }
@@ -0,0 +1,89 @@
+# Semantic cache lookup benchmark: fills the in-memory index (utils/semantic_cache.py) with
+# synthetic product ideas owned by --users users and times lookups scoped to one user, as the
+# cache does unless SEMANTIC_CACHE_SHARED is set. No database or LLM involved.
+#
+#   python benchmarks/semantic_cache_bench.py --entries 100000 --lookups 2000 --users 1000
+#
+# Reports index build time and memory, and p50/p95/p99 of embed, search and total lookup time.
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.semantic_cache import SemanticIndex, embed  # noqa: E402
+
+SUBJECTS = [
+    "dog walkers", "tutors", "plumbers", "freelance designers", "food trucks", "yoga studios", "dentists",
+    "small landlords", "wedding planners", "indie game devs", "farmers markets", "car mechanics", "nurses",
+    "book clubs", "climbing gyms", "coffee roasters", "photographers", "podcasters", "daycares", "bike shops",
+]
+PRODUCTS = [
+    "marketplace", "booking system", "crm", "invoicing tool", "scheduling app", "community platform",
+    "inventory tracker", "loyalty program", "analytics dashboard", "ai assistant", "payroll service",
+    "review site", "subscription box", "learning platform", "job board", "chatbot",
+]
+MODIFIERS = ["", "with ai matching", "for teams", "on mobile", "with payments", "open source", "for enterprises", "with offline mode"]
+
+
+def synthetic_title(rng: random.Random) -> str:
+    title = f"{rng.choice(PRODUCTS)} for {rng.choice(SUBJECTS)} {rng.choice(MODIFIERS)}"
+    return f"{title} #{rng.randrange(10 ** 6)}"
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def main(args):
+    rng = random.Random(args.seed)
+    index = SemanticIndex(dim=args.dim, max_entries=args.entries)
+    expires_at = time.time() + 3600
+
+    started = time.perf_counter()
+    for i in range(args.entries):
+        owner = f"user-{rng.randrange(args.users)}" if args.users else ""
+        index.add(str(i), embed(synthetic_title(rng), args.dim), expires_at, owner)
+    build_seconds = time.perf_counter() - started
+
+    embed_ms, search_ms, total_ms = [], [], []
+    for _ in range(args.lookups):
+        title = synthetic_title(rng)
+        scope = f"user-{rng.randrange(args.users)}" if args.users else None
+        t0 = time.perf_counter()
+        vector = embed(title, args.dim)
+        t1 = time.perf_counter()
+        index.search(vector, scope=scope)
+        t2 = time.perf_counter()
+        embed_ms.append((t1 - t0) * 1000)
+        search_ms.append((t2 - t1) * 1000)
+        total_ms.append((t2 - t0) * 1000)
+
+    report = {
+        "entries": len(index),
+        "dim": args.dim,
+        "users": args.users,
+        "lookups": args.lookups,
+        "build_seconds": round(build_seconds, 2),
+        "index_mb": round(index.nbytes() / 2 ** 20, 1),
+    }
+    for name, values in (("embed", embed_ms), ("search", search_ms), ("lookup", total_ms)):
+        for pct in (50, 95, 99):
+            report[f"{name}_p{pct}_ms"] = round(percentile(values, pct), 3)
+    print(json.dumps(report))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Blueprint AI semantic cache lookup benchmark")
+    parser.add_argument("--entries", type=int, default=100000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--dim", type=int, default=256)
+    # 0: unscoped lookups, as with SEMANTIC_CACHE_SHARED
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    main(parser.parse_args())
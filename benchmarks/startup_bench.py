@@ -0,0 +1,71 @@
+# Cold-start benchmark: every sample is a fresh interpreter that imports the app, runs its
+# startup, and serves a first (cold) and second (warm) request in-process. Uses
+# benchmarks/bench_app.py, so Firebase is stubbed and the database is SQLite.
+#
+#   python benchmarks/startup_bench.py --samples 10
+#
+# Reports p50/p95 of import, startup, first-request and warm-request time.
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import json, time
+started = time.perf_counter()
+from benchmarks.bench_app import app
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(app) as client:
+    ready = time.perf_counter()
+    headers = {"Authorization": "Bearer bench-startup"}
+    first = client.get(%(path)r, headers=headers)
+    first_done = time.perf_counter()
+    client.get(%(path)r, headers=headers)
+    warm_done = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "startup_ms": (ready - imported) * 1000,
+    "first_request_ms": (first_done - ready) * 1000,
+    "warm_request_ms": (warm_done - first_done) * 1000,
+    "status": first.status_code,
+}))
+"""
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def run_sample(path: str) -> dict:
+    # The TestClient import is excluded from import_ms; it is not part of serving
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD % {"path": path}],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(args):
+    samples = [run_sample(args.path) for _ in range(args.samples)]
+    report = {"samples": len(samples), "path": args.path, "errors": sum(s["status"] >= 400 for s in samples)}
+    for key in ("import_ms", "startup_ms", "first_request_ms", "warm_request_ms"):
+        values = [s[key] for s in samples]
+        report[f"{key[:-3]}_p50_ms"] = round(percentile(values, 50), 1)
+        report[f"{key[:-3]}_p95_ms"] = round(percentile(values, 95), 1)
+    cold = [s["import_ms"] + s["startup_ms"] + s["first_request_ms"] for s in samples]
+    report["cold_start_p50_ms"] = round(percentile(cold, 50), 1)
+    report["cold_start_p95_ms"] = round(percentile(cold, 95), 1)
+    print(json.dumps(report))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Blueprint AI backend cold-start benchmark")
+    parser.add_argument("--samples", type=int, default=10)
+    parser.add_argument("--path", default="/chats?limit=20&summary=true", help="first request; should hit auth and the DB")
+    main(parser.parse_args())
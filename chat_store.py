@@ -0,0 +1,262 @@
+import os
+import re
+import json
+import uuid
+import datetime
+import sqlalchemy
+from sqlalchemy.dialects.postgresql import JSONB
+from db import chat, database, mark_write, upsert
+
+
+class VersionConflict(Exception):
+    def __init__(self, current_version: int):
+        super().__init__(f"Chat is at version {current_version}")
+        self.current_version = current_version
+
+
+class ChatNotFound(Exception):
+    pass
+
+
+def summarize_messages(messages: list):
+    # Denormalized columns: last user message, and all assistant/agent messages joined
+    user_message = None
+    for msg in reversed(messages):
+        if msg.get("role") == "user":
+            user_message = msg.get("content", "")
+            break
+    assistant_contents = [msg.get("content", "") for msg in messages if msg.get("role") != "user"]
+    assistant_message = "\n\n".join(assistant_contents) if assistant_contents else None
+    return user_message, assistant_message
+
+
+# "markdown" (default) renders the assistant message from the stage outputs; "json" keeps the old
+# JSON-encoded string content for clients that still parse it
+BLUEPRINT_CONTENT_FORMAT = os.getenv("BLUEPRINT_CONTENT_FORMAT", "markdown")
+
+
+def render_outputs(outputs: dict) -> str:
+    # Readable text for the assistant message (and the denormalized assistant_message column)
+    if BLUEPRINT_CONTENT_FORMAT == "json":
+        return json.dumps(outputs)
+    return "\n\n".join(f"## {key.replace('_', ' ').title()}\n\n{value}" for key, value in outputs.items())
+
+
+def blueprint_chat_row(user_id: str, title: str, result: dict, chat_id: str = None) -> dict:
+    # Stage outputs are stored natively in `outputs`; messages are stored too, so reads
+    # return them as-is instead of rebuilding them
+    chat_id = chat_id or str(uuid.uuid4())
+    content = render_outputs(result)
+    return {
+        "id": chat_id,
+        "user_id": user_id,
+        "title": title,
+        "user_message": title,
+        "assistant_message": content,
+        "created_at": datetime.datetime.utcnow(),
+        "outputs": result,
+        "messages": [
+            {"id": f"{chat_id}-user", "role": "user", "content": title},
+            {"id": f"{chat_id}-assistant", "role": "assistant", "content": content, "outputs": result},
+        ],
+        "version": 1,
+    }
+
+
+def blueprint_chat_response(row: dict) -> dict:
+    # A saved blueprint chat in the /chats shape
+    return {
+        "id": row["id"],
+        "title": row["title"],
+        "createdAt": row["created_at"].isoformat(),
+        "outputs": row["outputs"],
+        "messages": row["messages"],
+    }
+
+
+async def save_blueprint_chat(user_id: str, title: str, result: dict):
+    # Stores a finished pipeline result as a new chat and returns it in the /chats shape
+    row = blueprint_chat_row(user_id, title, result)
+    await database.execute(chat.insert().values(**row))
+    mark_write(user_id)
+    return blueprint_chat_response(row)
+
+
+async def save_blueprint_chats(rows: list):
+    # Many blueprint_chat_row()s in one multi-row INSERT
+    if rows:
+        await database.execute(chat.insert().values(rows))
+        for user_id in {row["user_id"] for row in rows}:
+            mark_write(user_id)
+
+
+async def append_messages(chat_id: str, user_id: str, messages: list, title: str = None, expected_version: int = None):
+    # Appends only the new messages; returns (version, message_count) after the write
+    mark_write(user_id)
+    # Two passes at most: a first append that loses the insert race to a concurrent one
+    # goes round again and appends to the row the winner created
+    for _ in range(2):
+        if database.url.dialect == "postgresql":
+            result = await _append_postgres(chat_id, user_id, messages, title, expected_version)
+        else:
+            result = await _append_generic(chat_id, user_id, messages, title, expected_version)
+        if result is not None:
+            return result
+
+        # Nothing matched: either the chat is new, belongs to someone else, or the version moved on
+        existing = await database.fetch_one(
+            sqlalchemy.select(chat.c.user_id, chat.c.version).where(chat.c.id == chat_id)
+        )
+        if existing is not None:
+            if existing["user_id"] != user_id:
+                raise ChatNotFound(chat_id)
+            raise VersionConflict(existing["version"])
+        if expected_version not in (None, 0):
+            raise ChatNotFound(chat_id)
+
+        user_message, assistant_message = summarize_messages(messages)
+        inserted = await database.fetch_one(upsert(chat).values(
+            id=chat_id,
+            user_id=user_id,
+            title=title,
+            user_message=user_message or "",
+            assistant_message=assistant_message or "",
+            created_at=datetime.datetime.utcnow(),
+            messages=messages,
+            version=1,
+        ).on_conflict_do_nothing(index_elements=[chat.c.id]).returning(chat.c.version))
+        if inserted is not None:
+            return 1, len(messages)
+    raise VersionConflict(1)
+
+
+async def _append_postgres(chat_id, user_id, messages, title, expected_version):
+    user_message, assistant_message = summarize_messages(messages)
+    new_messages = sqlalchemy.cast(sqlalchemy.bindparam("new_messages", json.dumps(messages), type_=sqlalchemy.Text), JSONB)
+    values = {
+        # JSONB concatenation: the existing array is never sent over the wire
+        "messages": sqlalchemy.func.coalesce(chat.c.messages, sqlalchemy.literal_column("'[]'::jsonb", JSONB)).op("||")(new_messages),
+        "version": chat.c.version + 1,
+    }
+    if title is not None:
+        values["title"] = title
+    if user_message is not None:
+        values["user_message"] = user_message
+    if assistant_message is not None:
+        values["assistant_message"] = sqlalchemy.case(
+            (sqlalchemy.func.coalesce(chat.c.assistant_message, "") == "", assistant_message),
+            else_=chat.c.assistant_message + "\n\n" + assistant_message,
+        )
+    stmt = chat.update().where(chat.c.id == chat_id).where(chat.c.user_id == user_id)
+    if expected_version is not None:
+        stmt = stmt.where(chat.c.version == expected_version)
+    stmt = stmt.values(**values).returning(chat.c.version, sqlalchemy.func.jsonb_array_length(chat.c.messages).label("message_count"))
+    row = await database.fetch_one(stmt)
+    if row is None:
+        return None
+    return row["version"], row["message_count"]
+
+
+async def _append_generic(chat_id, user_id, messages, title, expected_version):
+    # Read-modify-write for databases without JSONB (e.g. SQLite in local benchmarks)
+    await database.ensure_connected()
+    async with database.transaction():
+        query = chat.select().where(chat.c.id == chat_id).where(chat.c.user_id == user_id)
+        row = await database.fetch_one(query)
+        if row is None or (expected_version is not None and row["version"] != expected_version):
+            return None
+        user_message, assistant_message = summarize_messages(messages)
+        all_messages = list(row["messages"] or []) + messages
+        values = {"messages": all_messages, "version": row["version"] + 1}
+        if title is not None:
+            values["title"] = title
+        if user_message is not None:
+            values["user_message"] = user_message
+        if assistant_message is not None:
+            values["assistant_message"] = (
+                row["assistant_message"] + "\n\n" + assistant_message if row["assistant_message"] else assistant_message
+            )
+        update = chat.update().where(chat.c.id == chat_id).where(chat.c.version == row["version"]).values(**values)
+        await database.execute(update)
+        return values["version"], len(all_messages)
+
+
+# Full-text search over a user's chats. On Postgres this uses chat.search_vector, a generated
+# tsvector over title (weight A), user_message (B) and assistant_message (C), behind a
+# (user_id, search_vector) GIN index (migrations/008). The column is not part of db.chat so
+# chat.select() never ships it to the app.
+CHAT_SEARCH_CONFIG = "english"   # must match the expression in migrations/008
+CHAT_SEARCH_SNIPPET_OPTIONS = os.getenv(
+    "CHAT_SEARCH_SNIPPET_OPTIONS", "MaxFragments=2, MaxWords=24, MinWords=8, FragmentDelimiter=\" … \""
+)
+CHAT_SEARCH_SNIPPET_CHARS = 160
+SEARCH_TERM_RE = re.compile(r"[^\W_]+")   # no "_": it is a LIKE wildcard
+
+
+def _search_postgres(user_id: str, q: str, limit: int, offset: int):
+    config = sqlalchemy.literal_column(f"'{CHAT_SEARCH_CONFIG}'::regconfig")
+    tsquery = sqlalchemy.func.websearch_to_tsquery(config, q)
+    search_vector = sqlalchemy.literal_column("chat.search_vector")
+    rank = sqlalchemy.func.ts_rank_cd(search_vector, tsquery).label("rank")
+    matches = (
+        sqlalchemy.select(chat.c.id, chat.c.title, chat.c.created_at, chat.c.user_message, chat.c.assistant_message, rank)
+        .where(chat.c.user_id == user_id)
+        .where(search_vector.op("@@")(tsquery))
+        .order_by(rank.desc(), chat.c.created_at.desc(), chat.c.id.desc())
+        .limit(limit)
+        .offset(offset)
+        .subquery()
+    )
+    # ts_headline re-parses the document, so it only runs for the rows of this page
+    document = sqlalchemy.func.concat_ws("\n", matches.c.title, matches.c.user_message, matches.c.assistant_message)
+    snippet = sqlalchemy.func.ts_headline(config, document, tsquery, CHAT_SEARCH_SNIPPET_OPTIONS).label("snippet")
+    return sqlalchemy.select(matches.c.id, matches.c.title, matches.c.created_at, matches.c.rank, snippet).order_by(
+        matches.c.rank.desc(), matches.c.created_at.desc(), matches.c.id.desc()
+    )
+
+
+def _search_generic(user_id: str, terms: list, limit: int, offset: int):
+    # ILIKE scan for databases without tsvector (SQLite in tests and benchmarks): every term must
+    # appear in one of the columns; title matches rank first, then newest
+    query = sqlalchemy.select(chat.c.id, chat.c.title, chat.c.created_at, chat.c.user_message, chat.c.assistant_message)
+    query = query.where(chat.c.user_id == user_id)
+    title_hits = []
+    for term in terms:
+        pattern = f"%{term}%"
+        query = query.where(sqlalchemy.or_(
+            chat.c.title.ilike(pattern), chat.c.user_message.ilike(pattern), chat.c.assistant_message.ilike(pattern),
+        ))
+        title_hits.append(sqlalchemy.case((chat.c.title.ilike(pattern), 1), else_=0))
+    rank = sum(title_hits[1:], title_hits[0]).label("rank")
+    return query.add_columns(rank).order_by(rank.desc(), chat.c.created_at.desc(), chat.c.id.desc()).limit(limit).offset(offset)
+
+
+def _plain_snippet(row, terms: list) -> str:
+    # Text around the first term found, for the ILIKE fallback
+    for column in ("title", "user_message", "assistant_message"):
+        text = " ".join((row[column] or "").split())
+        lowered = text.lower()
+        positions = [lowered.find(term.lower()) for term in terms if term.lower() in lowered]
+        if positions:
+            start = max(0, min(positions) - CHAT_SEARCH_SNIPPET_CHARS // 3)
+            snippet = text[start:start + CHAT_SEARCH_SNIPPET_CHARS]
+            return ("…" if start else "") + snippet + ("…" if start + CHAT_SEARCH_SNIPPET_CHARS < len(text) else "")
+    return ""
+
+
+async def search_chats(db, user_id: str, q: str, limit: int, offset: int = 0) -> list:
+    # Ranked matches as [{"id", "title", "created_at", "rank", "snippet"}]; `db` is the pool to read from
+    if db.url.dialect == "postgresql":
+        rows = await db.fetch_all(_search_postgres(user_id, q, limit, offset))
+        return [
+            {"id": row["id"], "title": row["title"], "created_at": row["created_at"], "rank": row["rank"], "snippet": row["snippet"]}
+            for row in rows
+        ]
+    terms = SEARCH_TERM_RE.findall(q)
+    if not terms:
+        return []
+    rows = await db.fetch_all(_search_generic(user_id, terms, limit, offset))
+    return [
+        {"id": row["id"], "title": row["title"], "created_at": row["created_at"], "rank": float(row["rank"]), "snippet": _plain_snippet(row, terms)}
+        for row in rows
+    ]
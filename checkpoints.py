@@ -0,0 +1,156 @@
+import os
+import time
+import uuid
+import datetime
+from collections import OrderedDict
+from pipeline import iter_pipeline, BLUEPRINT_STAGES
+from utils import semantic_cache
+from utils.log import get_logger
+
+# "database" persists checkpoints in pipeline_checkpoint; "memory" keeps them in this process
+PIPELINE_CHECKPOINT_STORE = os.getenv("PIPELINE_CHECKPOINT_STORE", "database")
+# Failed runs can be resumed for this long
+PIPELINE_CHECKPOINT_TTL_SECONDS = float(os.getenv("PIPELINE_CHECKPOINT_TTL_SECONDS", str(7 * 24 * 3600)))
+PIPELINE_CHECKPOINT_MAX_RUNS = int(os.getenv("PIPELINE_CHECKPOINT_MAX_RUNS", "10000"))
+PIPELINE_CHECKPOINT_PURGE_EVERY = int(os.getenv("PIPELINE_CHECKPOINT_PURGE_EVERY", "500"))
+
+logger = get_logger("checkpoints")
+
+stats = {"saved": 0, "save_errors": 0, "resumed": 0, "stages_skipped": 0}
+
+
+def new_run_id() -> str:
+    return str(uuid.uuid4())
+
+
+class MemoryCheckpointStore:
+    def __init__(self, max_runs: int = PIPELINE_CHECKPOINT_MAX_RUNS, ttl_seconds: float = PIPELINE_CHECKPOINT_TTL_SECONDS):
+        self.max_runs = max_runs
+        self.ttl_seconds = ttl_seconds
+        self._runs = OrderedDict()  # run_id -> {"user_id", "outputs", "updated"}
+
+    async def save(self, run_id: str, user_id: str, key: str, output: str):
+        run = self._runs.setdefault(run_id, {"user_id": user_id, "outputs": {}})
+        run["outputs"][key] = output
+        run["updated"] = time.monotonic()
+        self._runs.move_to_end(run_id)
+        while len(self._runs) > self.max_runs:
+            self._runs.popitem(last=False)
+
+    async def load(self, run_id: str):
+        run = self._runs.get(run_id)
+        if run is None or run["updated"] + self.ttl_seconds <= time.monotonic():
+            return None
+        return {"user_id": run["user_id"], "outputs": dict(run["outputs"])}
+
+    async def delete(self, run_id: str):
+        self._runs.pop(run_id, None)
+
+
+class DatabaseCheckpointStore:
+    # One row per (run, stage); the product idea itself is stored as the "product_idea" stage
+    def __init__(self, ttl_seconds: float = PIPELINE_CHECKPOINT_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._writes_since_purge = 0
+
+    async def save(self, run_id: str, user_id: str, key: str, output: str):
+        from db import database, pipeline_checkpoint, upsert
+        now = datetime.datetime.now(datetime.timezone.utc)
+        await database.execute(
+            upsert(pipeline_checkpoint).values(
+                run_id=run_id, stage=key, user_id=user_id, output=output, created_at=now
+            ).on_conflict_do_update(
+                index_elements=[pipeline_checkpoint.c.run_id, pipeline_checkpoint.c.stage],
+                set_={"output": output, "created_at": now},
+            )
+        )
+        self._writes_since_purge += 1
+        if self._writes_since_purge >= PIPELINE_CHECKPOINT_PURGE_EVERY:
+            self._writes_since_purge = 0
+            await self.purge_expired()
+
+    async def load(self, run_id: str):
+        from db import database, pipeline_checkpoint
+        cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=self.ttl_seconds)
+        rows = await database.fetch_all(
+            pipeline_checkpoint.select()
+            .where(pipeline_checkpoint.c.run_id == run_id)
+            .where(pipeline_checkpoint.c.created_at > cutoff)
+        )
+        if not rows:
+            return None
+        return {"user_id": rows[0]["user_id"], "outputs": {row["stage"]: row["output"] for row in rows}}
+
+    async def delete(self, run_id: str):
+        from db import database, pipeline_checkpoint
+        await database.execute(pipeline_checkpoint.delete().where(pipeline_checkpoint.c.run_id == run_id))
+
+    async def purge_expired(self):
+        from db import database, pipeline_checkpoint
+        cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=self.ttl_seconds)
+        await database.execute(pipeline_checkpoint.delete().where(pipeline_checkpoint.c.created_at <= cutoff))
+
+
+def create_checkpoint_store():
+    # The app always has DATABASE_URL (db.py needs it); memory is for PIPELINE_CHECKPOINT_STORE=memory
+    # or for importing the pipeline on its own, without a database
+    if PIPELINE_CHECKPOINT_STORE == "database" and os.getenv("DATABASE_URL"):
+        return DatabaseCheckpointStore()
+    return MemoryCheckpointStore()
+
+
+checkpoint_store = create_checkpoint_store()
+
+
+async def load_run(run_id: str):
+    # {"user_id", "product_idea", "outputs"} for a resumable run, or None
+    run = await checkpoint_store.load(run_id)
+    if run is None or "product_idea" not in run["outputs"]:
+        return None
+    outputs = run["outputs"]
+    return {"user_id": run["user_id"], "product_idea": outputs.pop("product_idea"), "outputs": outputs}
+
+
+async def _save(run_id: str, user_id: str, key: str, output: str):
+    # A lost checkpoint only costs a re-run of that stage on resume; never fail the pipeline for it
+    try:
+        await checkpoint_store.save(run_id, user_id, key, output)
+        stats["saved"] += 1
+    except Exception as e:
+        stats["save_errors"] += 1
+        logger.warning("Saving pipeline checkpoint failed", run_id=run_id, stage=key, error=str(e))
+
+
+async def iter_checkpointed_pipeline(run_id: str, user_id: str, product_idea: str, completed: dict = None, on_delta=None, stages: list = BLUEPRINT_STAGES):
+    # iter_pipeline that checkpoints every finished stage under run_id; pass the outputs from
+    # load_run() as `completed` to resume. Checkpoints are dropped once every stage succeeded.
+    # A new run first asks the semantic cache: stages reused from a near-duplicate idea by the same
+    # user are yielded like freshly finished ones, and only the rest of the pipeline runs.
+    reused = None
+    if completed:
+        stats["resumed"] += 1
+        stats["stages_skipped"] += len(completed)
+    else:
+        reused = await semantic_cache.lookup(product_idea, user_id) or {}
+        if any(stage.key not in reused for stage in stages):
+            await _save(run_id, user_id, "product_idea", product_idea)
+            for key, output in reused.items():
+                await _save(run_id, user_id, key, output)
+        for stage in stages:
+            if stage.key in reused:
+                yield stage, reused[stage.key]
+    outputs = {**(completed or {}), **(reused or {})}
+    async for stage, output in iter_pipeline(product_idea, stages, on_delta=on_delta, completed=outputs):
+        outputs[stage.key] = output
+        await _save(run_id, user_id, stage.key, output)
+        yield stage, output
+    try:
+        await checkpoint_store.delete(run_id)
+    except Exception as e:
+        logger.warning("Deleting pipeline checkpoints failed", run_id=run_id, error=str(e))
+    if len(outputs) > len(reused or {}) and all(stage.key in outputs for stage in BLUEPRINT_STAGES):
+        await semantic_cache.store(product_idea, outputs, user_id)
+
+
+def checkpoint_stats() -> dict:
+    return dict(stats)
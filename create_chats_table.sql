@@ -1,9 +1,27 @@
--- SQL to create the chats table in Supabase/Postgres
-CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
-
-CREATE TABLE IF NOT EXISTS chats (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
-    product_idea TEXT NOT NULL,
-    response JSON NOT NULL,
-    created_at TIMESTAMPTZ DEFAULT NOW()
+-- SQL to create the chat table in Supabase/Postgres (matches db.chat).
+-- Existing databases: apply migrations/ in order instead; 006 reconciles the old `chats` table.
+CREATE TABLE IF NOT EXISTS chat (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    title TEXT,
+    user_message TEXT,
+    assistant_message TEXT,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    messages JSONB,
+    version INTEGER NOT NULL DEFAULT 0,
+    outputs JSONB,
+    -- Full-text search (migrations/008); not mapped in db.chat
+    search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(user_message, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(assistant_message, '')), 'C')
+    ) STORED
 );
+
+CREATE INDEX IF NOT EXISTS ix_chat_user_id_created_at
+    ON chat (user_id, created_at DESC, id DESC);
+
+CREATE EXTENSION IF NOT EXISTS btree_gin;
+
+CREATE INDEX IF NOT EXISTS ix_chat_user_id_search_vector
+    ON chat USING GIN (user_id, search_vector);
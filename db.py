@@ -1,9 +1,28 @@
 import os
+import time
+import asyncio
+import functools
+import contextlib
 import sqlalchemy
 import databases
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.dialects.postgresql import JSONB
+from metrics import track_query
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+# Optional read replica for read-only queries (chat listing etc.); writes always go to DATABASE_URL
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+
+# Pool settings (asyncpg); the replica gets its own pool of the same shape
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+# Prepared statements cached per connection; 0 when running behind pgbouncer in transaction mode
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+DB_MAX_INACTIVE_CONNECTION_LIFETIME = float(os.getenv("DB_MAX_INACTIVE_CONNECTION_LIFETIME", "300"))
+DB_COMMAND_TIMEOUT_SECONDS = float(os.getenv("DB_COMMAND_TIMEOUT_SECONDS", "30"))
+# How long a query may wait for a free connection before failing with PoolTimeout
+DB_POOL_ACQUIRE_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT_SECONDS", "10"))
+# After a user writes, their reads stay on the primary this long (replica lag)
+DB_READ_AFTER_WRITE_SECONDS = float(os.getenv("DB_READ_AFTER_WRITE_SECONDS", "5"))
 
 # SQLAlchemy specific code
 metadata = sqlalchemy.MetaData()
@@ -18,7 +37,225 @@ chat = sqlalchemy.Table(
     sqlalchemy.Column("user_message", sqlalchemy.Text),
     sqlalchemy.Column("assistant_message", sqlalchemy.Text),
     sqlalchemy.Column("created_at", sqlalchemy.DateTime(timezone=True), server_default=sqlalchemy.func.now()),
-    sqlalchemy.Column("messages", sqlalchemy.JSON),
+    sqlalchemy.Column("messages", sqlalchemy.JSON().with_variant(JSONB(), "postgresql")),
+    # Bumped on every write; used for optimistic concurrency on message appends
+    sqlalchemy.Column("version", sqlalchemy.Integer, nullable=False, server_default="0"),
+    # Blueprint chats: stage key -> agent output, so single stages can be read without decoding the rest
+    sqlalchemy.Column("outputs", sqlalchemy.JSON().with_variant(JSONB(), "postgresql")),
+)
+
+# Per-user history listing, newest first (keyset pagination on created_at, id)
+sqlalchemy.Index("ix_chat_user_id_created_at", chat.c.user_id, chat.c.created_at.desc(), chat.c.id.desc())
+# Postgres also has chat.search_vector (generated tsvector) and its GIN index, from migrations/008;
+# deliberately left out of this Table, see chat_store.search_chats
+
+# Persistent tier of the LLM response cache (see utils/llm_cache.py)
+llm_cache = sqlalchemy.Table(
+    "llm_cache",
+    metadata,
+    sqlalchemy.Column("key", sqlalchemy.Text, primary_key=True),
+    sqlalchemy.Column("model", sqlalchemy.Text),
+    sqlalchemy.Column("response", sqlalchemy.Text, nullable=False),
+    sqlalchemy.Column("created_at", sqlalchemy.DateTime(timezone=True), server_default=sqlalchemy.func.now()),
+    sqlalchemy.Column("expires_at", sqlalchemy.DateTime(timezone=True), nullable=False, index=True),
+)
+
+# Background blueprint jobs (see jobs.py); also the queue when BLUEPRINT_JOB_STORE=postgres
+blueprint_job = sqlalchemy.Table(
+    "blueprint_job",
+    metadata,
+    sqlalchemy.Column("id", sqlalchemy.Text, primary_key=True),
+    sqlalchemy.Column("user_id", sqlalchemy.Text, nullable=False),
+    sqlalchemy.Column("title", sqlalchemy.Text, nullable=False),
+    sqlalchemy.Column("status", sqlalchemy.Text, nullable=False),
+    sqlalchemy.Column("outputs", sqlalchemy.JSON().with_variant(JSONB(), "postgresql")),
+    sqlalchemy.Column("error", sqlalchemy.Text),
+    sqlalchemy.Column("chat_id", sqlalchemy.Text),
+    sqlalchemy.Column("version", sqlalchemy.Integer, nullable=False, server_default="0"),
+    sqlalchemy.Column("created_at", sqlalchemy.DateTime(timezone=True), server_default=sqlalchemy.func.now()),
+    sqlalchemy.Column("updated_at", sqlalchemy.DateTime(timezone=True), server_default=sqlalchemy.func.now()),
+    # Set while running; a running job past its lease is claimed again (worker crashed)
+    sqlalchemy.Column("lease_expires_at", sqlalchemy.DateTime(timezone=True)),
+)
+sqlalchemy.Index("ix_blueprint_job_status_created_at", blueprint_job.c.status, blueprint_job.c.created_at)
+
+# Per-stage outputs of blueprint runs, so a failed run can resume from its first incomplete stage
+pipeline_checkpoint = sqlalchemy.Table(
+    "pipeline_checkpoint",
+    metadata,
+    sqlalchemy.Column("run_id", sqlalchemy.Text, primary_key=True),
+    sqlalchemy.Column("stage", sqlalchemy.Text, primary_key=True),
+    sqlalchemy.Column("user_id", sqlalchemy.Text),
+    sqlalchemy.Column("output", sqlalchemy.Text, nullable=False),
+    sqlalchemy.Column("created_at", sqlalchemy.DateTime(timezone=True), server_default=sqlalchemy.func.now(), index=True),
+)
+
+# Semantic blueprint cache (see utils/semantic_cache.py): title embedding -> finished stage outputs.
+# Entries are scoped to user_id (NULL: anonymous runs) unless SEMANTIC_CACHE_SHARED is set
+blueprint_semantic_cache = sqlalchemy.Table(
+    "blueprint_semantic_cache",
+    metadata,
+    sqlalchemy.Column("id", sqlalchemy.Text, primary_key=True),
+    sqlalchemy.Column("user_id", sqlalchemy.Text),
+    sqlalchemy.Column("title", sqlalchemy.Text, nullable=False),
+    # float32 unit vector, SEMANTIC_CACHE_DIM entries
+    sqlalchemy.Column("embedding", sqlalchemy.LargeBinary, nullable=False),
+    sqlalchemy.Column("outputs", sqlalchemy.JSON().with_variant(JSONB(), "postgresql"), nullable=False),
+    sqlalchemy.Column("created_at", sqlalchemy.DateTime(timezone=True), server_default=sqlalchemy.func.now(), index=True),
+    sqlalchemy.Column("expires_at", sqlalchemy.DateTime(timezone=True), nullable=False, index=True),
 )
 
-database = databases.Database(DATABASE_URL)
+def describe_query(query):
+    # (table, operation) labels for query metrics
+    if isinstance(query, str):
+        return "raw", query.split(None, 1)[0].lower() if query.strip() else "raw"
+    if getattr(query, "is_dml", False):
+        return query.table.name, query.__visit_name__
+    froms = query.get_final_froms() if hasattr(query, "get_final_froms") else []
+    return (getattr(froms[0], "name", "subquery") if froms else "none"), "select"
+
+class PoolTimeout(Exception):
+    pass
+
+def pool_options(url: str) -> dict:
+    # asyncpg.create_pool() arguments; other backends (SQLite in benchmarks) take none of them
+    if databases.DatabaseURL(url).dialect != "postgresql":
+        return {}
+    return {
+        "min_size": DB_POOL_MIN_SIZE,
+        "max_size": DB_POOL_MAX_SIZE,
+        "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+        "max_inactive_connection_lifetime": DB_MAX_INACTIVE_CONNECTION_LIFETIME,
+        "command_timeout": DB_COMMAND_TIMEOUT_SECONDS,
+    }
+
+class Database(databases.Database):
+    # Connects on first query rather than at startup (fast cold starts), bounds how long a query
+    # waits for a connection, and times every query for /metrics, labelled by table and operation
+    def __init__(self, url, role: str = "primary", **options):
+        super().__init__(url, **options)
+        self.role = role
+        self.max_size = options.get("max_size", DB_POOL_MAX_SIZE)
+        self._connect_lock = asyncio.Lock()
+        self._slots = asyncio.Semaphore(self.max_size)
+        self.in_use = 0
+        self.waiting = 0
+        self.stats = {"acquired": 0, "timeouts": 0, "wait_seconds_total": 0.0, "wait_seconds_max": 0.0}
+
+    async def ensure_connected(self):
+        if not self.is_connected:
+            async with self._connect_lock:
+                if not self.is_connected:
+                    await self.connect()
+
+    @contextlib.asynccontextmanager
+    async def _checkout(self, query):
+        await self.ensure_connected()
+        # A task inside a transaction already holds its connection; gating it again could deadlock
+        if getattr(self.connection(), "_connection_counter", 0) > 0:
+            with track_query(*describe_query(query)):
+                yield
+            return
+        started = time.perf_counter()
+        self.waiting += 1
+        try:
+            # asyncio.timeout rather than wait_for: on 3.11 wait_for can return the acquired slot
+            # and drop a cancellation that arrives at the same time, so a cancelled task kept querying
+            async with asyncio.timeout(DB_POOL_ACQUIRE_TIMEOUT_SECONDS):
+                await self._slots.acquire()
+        except TimeoutError:
+            self.stats["timeouts"] += 1
+            raise PoolTimeout(f"No {self.role} database connection free after {DB_POOL_ACQUIRE_TIMEOUT_SECONDS}s")
+        finally:
+            self.waiting -= 1
+        waited = time.perf_counter() - started
+        self.stats["acquired"] += 1
+        self.stats["wait_seconds_total"] += waited
+        self.stats["wait_seconds_max"] = max(self.stats["wait_seconds_max"], waited)
+        self.in_use += 1
+        try:
+            with track_query(*describe_query(query)):
+                yield
+        finally:
+            self.in_use -= 1
+            self._slots.release()
+
+    async def fetch_all(self, query, values=None):
+        async with self._checkout(query):
+            return await super().fetch_all(query, values)
+
+    async def fetch_one(self, query, values=None):
+        async with self._checkout(query):
+            return await super().fetch_one(query, values)
+
+    async def fetch_val(self, query, values=None, column=0):
+        async with self._checkout(query):
+            return await super().fetch_val(query, values, column)
+
+    async def execute(self, query, values=None):
+        async with self._checkout(query):
+            return await super().execute(query, values)
+
+    async def execute_many(self, query, values):
+        async with self._checkout(query):
+            return await super().execute_many(query, values)
+
+    async def ping(self, timeout: float = 2.0) -> bool:
+        try:
+            async with asyncio.timeout(timeout):
+                await self.fetch_val("SELECT 1")
+            return True
+        except Exception:
+            return False
+
+    def pool_stats(self) -> dict:
+        pool = getattr(self._backend, "_pool", None)
+        return {
+            **self.stats,
+            "connected": self.is_connected,
+            "in_use": self.in_use,
+            "waiting": self.waiting,
+            "max_size": self.max_size,
+            "utilization": self.in_use / self.max_size if self.max_size else 0.0,
+            # Actual asyncpg pool, when there is one
+            "open_connections": pool.get_size() if hasattr(pool, "get_size") else None,
+            "idle_connections": pool.get_idle_size() if hasattr(pool, "get_idle_size") else None,
+        }
+
+database = Database(DATABASE_URL, **pool_options(DATABASE_URL))
+read_database = (
+    Database(DATABASE_REPLICA_URL, role="replica", **pool_options(DATABASE_REPLICA_URL))
+    if DATABASE_REPLICA_URL else database
+)
+
+# uid -> monotonic time of that user's last write through this process
+_recent_writes = {}
+
+def mark_write(user_id: str):
+    if read_database is database:
+        return
+    now = time.monotonic()
+    _recent_writes[user_id] = now
+    if len(_recent_writes) > 10000:
+        for uid, written in list(_recent_writes.items()):
+            if now - written > DB_READ_AFTER_WRITE_SECONDS:
+                del _recent_writes[uid]
+
+def reader_for(user_id: str = None) -> Database:
+    # Replica for read-only queries, except right after the same user wrote (read-your-writes)
+    written = _recent_writes.get(user_id)
+    if written is not None and time.monotonic() - written < DB_READ_AFTER_WRITE_SECONDS:
+        return database
+    return read_database
+
+@functools.lru_cache(maxsize=None)
+def _dialect_insert(dialect: str):
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert
+    return insert
+
+def upsert(table):
+    # INSERT ... ON CONFLICT for the configured backend (Postgres in production, SQLite locally)
+    return _dialect_insert(database.url.dialect)(table)
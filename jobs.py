@@ -0,0 +1,316 @@
+import os
+import uuid
+import asyncio
+import datetime
+import contextlib
+from collections import OrderedDict
+import sqlalchemy
+from db import blueprint_job, database
+from checkpoints import iter_checkpointed_pipeline, load_run
+from chat_store import save_blueprint_chat
+from utils.log import get_logger
+
+BLUEPRINT_JOB_WORKERS = int(os.getenv("BLUEPRINT_JOB_WORKERS", "4"))
+# "memory" keeps the queue in this process; "postgres" shares it between workers/instances
+BLUEPRINT_JOB_STORE = os.getenv("BLUEPRINT_JOB_STORE", "memory")
+BLUEPRINT_JOB_QUEUE_MAX = int(os.getenv("BLUEPRINT_JOB_QUEUE_MAX", "1000"))
+BLUEPRINT_JOB_RETENTION = int(os.getenv("BLUEPRINT_JOB_RETENTION", "10000"))
+BLUEPRINT_JOB_POLL_SECONDS = float(os.getenv("BLUEPRINT_JOB_POLL_SECONDS", "1.0"))
+# Shared queue: a running job whose worker stopped renewing its lease this long is claimed again
+BLUEPRINT_JOB_LEASE_SECONDS = float(os.getenv("BLUEPRINT_JOB_LEASE_SECONDS", "60"))
+
+TERMINAL_STATUSES = ("succeeded", "failed")
+
+logger = get_logger("jobs")
+
+
+class QueueFull(Exception):
+    pass
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def new_job(user_id: str, title: str) -> dict:
+    now = _now()
+    return {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "title": title,
+        "status": "queued",
+        "outputs": {},
+        "error": None,
+        "chat_id": None,
+        "version": 0,
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+def job_response(job: dict) -> dict:
+    return {
+        "id": job["id"],
+        "title": job["title"],
+        "status": job["status"],
+        "outputs": job["outputs"] or {},
+        "error": job["error"],
+        "chat_id": job["chat_id"],
+        "createdAt": job["created_at"].isoformat() if job["created_at"] else None,
+        "updatedAt": job["updated_at"].isoformat() if job["updated_at"] else None,
+    }
+
+
+class MemoryJobStore:
+    # Jobs never outlive this process, so there is no lease to keep
+    lease_seconds = None
+
+    def __init__(self, max_queued: int = BLUEPRINT_JOB_QUEUE_MAX, retention: int = BLUEPRINT_JOB_RETENTION):
+        self.retention = retention
+        self._jobs = OrderedDict()
+        self._queue = asyncio.Queue(maxsize=max_queued)
+
+    async def create(self, job: dict):
+        try:
+            self._queue.put_nowait(job["id"])
+        except asyncio.QueueFull:
+            raise QueueFull()
+        self._jobs[job["id"]] = dict(job)
+        # Forget the oldest finished jobs once over the retention limit
+        while len(self._jobs) > self.retention:
+            oldest_id, oldest = next(iter(self._jobs.items()))
+            if oldest["status"] not in TERMINAL_STATUSES:
+                break
+            del self._jobs[oldest_id]
+
+    async def claim(self) -> dict:
+        while True:
+            job_id = await self._queue.get()
+            job = self._jobs.get(job_id)
+            if job is not None and job["status"] == "queued":
+                job.update(status="running", version=job["version"] + 1, updated_at=_now())
+                return dict(job)
+
+    async def update(self, job_id: str, **fields):
+        job = self._jobs.get(job_id)
+        if job is not None:
+            job.update(fields, version=job["version"] + 1, updated_at=_now())
+
+    async def requeue(self, job_id: str):
+        job = self._jobs.get(job_id)
+        if job is not None:
+            job.update(status="queued", version=job["version"] + 1, updated_at=_now())
+            with contextlib.suppress(asyncio.QueueFull):
+                self._queue.put_nowait(job_id)
+
+    async def get(self, job_id: str):
+        job = self._jobs.get(job_id)
+        return dict(job) if job is not None else None
+
+    async def renew(self, job_id: str):
+        pass
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+
+class PostgresJobStore:
+    # Rows in blueprint_job are the queue; workers claim with FOR UPDATE SKIP LOCKED.
+    # A claim holds a lease that the worker renews while the job runs; a job left `running`
+    # by a crashed worker is claimed again once its lease has expired.
+    def __init__(self, poll_seconds: float = BLUEPRINT_JOB_POLL_SECONDS, lease_seconds: float = BLUEPRINT_JOB_LEASE_SECONDS):
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self._wakeup = asyncio.Event()
+
+    def _lease_expiry(self):
+        return _now() + datetime.timedelta(seconds=self.lease_seconds)
+
+    async def create(self, job: dict):
+        await database.execute(blueprint_job.insert().values(**job))
+        self._wakeup.set()
+
+    async def claim(self) -> dict:
+        while True:
+            now = _now()
+            next_claimable = (
+                sqlalchemy.select(blueprint_job.c.id)
+                .where(sqlalchemy.or_(
+                    blueprint_job.c.status == "queued",
+                    sqlalchemy.and_(blueprint_job.c.status == "running", blueprint_job.c.lease_expires_at < now),
+                ))
+                .order_by(blueprint_job.c.created_at)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+                .scalar_subquery()
+            )
+            claim_stmt = (
+                blueprint_job.update()
+                .where(blueprint_job.c.id == next_claimable)
+                .values(
+                    status="running", version=blueprint_job.c.version + 1, updated_at=now,
+                    lease_expires_at=self._lease_expiry(),
+                )
+                .returning(*blueprint_job.c)
+            )
+            row = await database.fetch_one(claim_stmt)
+            if row is not None:
+                return dict(row)
+            # Nothing queued: wait for a local submit, or poll for ones from other instances
+            self._wakeup.clear()
+            # asyncio.timeout rather than wait_for, which on 3.11 can swallow a cancel into another poll
+            try:
+                async with asyncio.timeout(self.poll_seconds):
+                    await self._wakeup.wait()
+            except TimeoutError:
+                pass
+
+    async def update(self, job_id: str, **fields):
+        await database.execute(
+            blueprint_job.update()
+            .where(blueprint_job.c.id == job_id)
+            .values(**fields, version=blueprint_job.c.version + 1, updated_at=_now())
+        )
+
+    async def get(self, job_id: str):
+        row = await database.fetch_one(blueprint_job.select().where(blueprint_job.c.id == job_id))
+        if row is None:
+            return None
+        return dict(row)
+
+    async def requeue(self, job_id: str):
+        # Handed back on shutdown: any worker (here or on another instance) claims it right away
+        # and resumes it from its checkpoints
+        await database.execute(
+            blueprint_job.update()
+            .where(blueprint_job.c.id == job_id)
+            .values(status="queued", lease_expires_at=None, version=blueprint_job.c.version + 1, updated_at=_now())
+        )
+        self._wakeup.set()
+
+    async def renew(self, job_id: str):
+        # Heartbeat: pushes the lease out without bumping version (subscribers see no change)
+        await database.execute(
+            blueprint_job.update()
+            .where(blueprint_job.c.id == job_id)
+            .where(blueprint_job.c.status == "running")
+            .values(lease_expires_at=self._lease_expiry())
+        )
+
+    def queue_depth(self) -> int:
+        # Only known locally for the memory store; use SQL for the shared queue
+        return -1
+
+
+class JobQueue:
+    def __init__(self, store, concurrency: int = BLUEPRINT_JOB_WORKERS):
+        self.store = store
+        self.concurrency = concurrency
+        self._workers = []
+        self._changed = asyncio.Condition()
+        self.running = 0
+
+    def start(self):
+        if not self._workers:
+            self._workers = [asyncio.ensure_future(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def submit(self, user_id: str, title: str) -> dict:
+        job = new_job(user_id, title)
+        await self.store.create(job)
+        return job
+
+    async def get(self, job_id: str):
+        return await self.store.get(job_id)
+
+    async def _update(self, job_id: str, **fields):
+        await self.store.update(job_id, **fields)
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def _worker(self):
+        while True:
+            job = await self.store.claim()
+            async with self._changed:
+                self._changed.notify_all()
+            self.running += 1
+            try:
+                await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Job crashed", job_id=job["id"])
+            finally:
+                self.running -= 1
+
+    async def _heartbeat(self, job_id: str):
+        while True:
+            await asyncio.sleep(self.store.lease_seconds / 3)
+            try:
+                await self.store.renew(job_id)
+            except Exception as e:
+                logger.warning("Renewing job lease failed", job_id=job_id, error=str(e))
+
+    async def _run(self, job: dict):
+        # The job id doubles as the pipeline run id, so every stage is checkpointed and a job
+        # reclaimed after its worker died resumes from the stages that had already finished
+        heartbeat = asyncio.ensure_future(self._heartbeat(job["id"])) if self.store.lease_seconds else None
+        try:
+            run = await load_run(job["id"])
+            completed = run["outputs"] if run is not None else None
+            if completed:
+                logger.info("Resuming job from checkpoints", job_id=job["id"], completed=list(completed))
+            outputs = dict(completed or {})
+            async for stage, output in iter_checkpointed_pipeline(job["id"], job["user_id"], job["title"], completed):
+                outputs[stage.key] = output
+                # Partial results survive a failure in a later stage
+                await self._update(job["id"], outputs=dict(outputs))
+            saved = await save_blueprint_chat(job["user_id"], job["title"], outputs)
+            await self._update(job["id"], status="succeeded", chat_id=saved["id"])
+        except asyncio.CancelledError:
+            # Shutting down: hand the job back rather than failing it; the checkpoints stay
+            await self.store.requeue(job["id"])
+            async with self._changed:
+                self._changed.notify_all()
+            raise
+        except Exception as e:
+            await self._update(job["id"], status="failed", error=str(e))
+        finally:
+            if heartbeat is not None:
+                heartbeat.cancel()
+
+    async def events(self, job_id: str):
+        # Yields a job snapshot whenever it changes, until it reaches a terminal status
+        last_version = None
+        while True:
+            job = await self.store.get(job_id)
+            if job is None:
+                return
+            if job["version"] != last_version:
+                last_version = job["version"]
+                yield job
+            if job["status"] in TERMINAL_STATUSES:
+                return
+            async with self._changed:
+                try:
+                    async with asyncio.timeout(BLUEPRINT_JOB_POLL_SECONDS):
+                        await self._changed.wait()
+                except TimeoutError:
+                    pass
+
+    def stats(self) -> dict:
+        return {
+            "workers": len(self._workers),
+            "running": self.running,
+            "queue_depth": self.store.queue_depth(),
+        }
+
+
+def create_job_queue() -> JobQueue:
+    store = PostgresJobStore() if BLUEPRINT_JOB_STORE == "postgres" else MemoryJobStore()
+    return JobQueue(store)
@@ -1,67 +1,61 @@
 # 📁 File: main.py
 
-from fastapi import FastAPI, HTTPException, status, Request, Depends
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, APIRouter, HTTPException, Request, Depends, Query, Header
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-import firebase_admin
-from firebase_admin import credentials, auth as firebase_auth
-import functools
+import base64
+import hashlib
+import contextlib
+import sqlalchemy
+from typing import Optional
 from fastapi.middleware.cors import CORSMiddleware
 import json
 from pydantic import BaseModel
 import os
-import uvicorn
-import uuid
 import datetime
-print("[DEBUG] DATABASE_URL:", os.getenv("DATABASE_URL"))
-from agents.research_agent import ResearchAgent
-from agents.feature_parser_agent import FeatureParserAgent
-from agents.architecture_planner_agent import ArchitecturePlannerAgent
-from agents.tech_stack_selector_agent import TechStackSelectorAgent
-from agents.security_infra_agent import SecurityInfraAgent
-from db import chat, database
-
-# Initialize Firebase Admin SDK if not already initialized
-if not firebase_admin._apps:
-    cred = credentials.Certificate(os.path.join(os.path.dirname(__file__), 'firebase-service-account.json'))
-    firebase_admin.initialize_app(cred)
-
-app = FastAPI()
-
-@app.get("/")
+from utils.log import configure_logging, get_logger, RequestIdMiddleware, stats as log_stats
+logger = get_logger("blueprint")
+from singleflight import SingleFlight, normalize_key
+from stream_utils import sse_format, shared_stream_blueprint_ai, resume_stream_blueprint_ai, attach_stream, stream_stats
+from batch import iter_blueprint_batch, batch_stats, BLUEPRINT_BATCH_MAX_ITEMS, BLUEPRINT_BATCH_CONCURRENCY
+from checkpoints import iter_checkpointed_pipeline, load_run, new_run_id, checkpoint_stats
+from db import chat, database, read_database, reader_for, mark_write, upsert, PoolTimeout
+from jobs import create_job_queue, job_response, QueueFull
+from chat_store import append_messages, save_blueprint_chat, search_chats, ChatNotFound, VersionConflict
+from utils.compression import CompressionMiddleware
+from utils.llm import close_client as close_llm_client
+from utils.rate_limit import llm_limiter
+from auth import verify_token, start_cert_refresh, stop_cert_refresh, token_cache_stats
+from utils.llm_cache import cache_stats
+from utils.compaction import compaction_stats
+from utils.routing import routing_stats
+from utils.semantic_cache import semantic_cache_stats
+from metrics import register_stats, render as render_metrics
+
+# Routes live on a router; create_app() (bottom of this file) assembles the application
+router = APIRouter()
+
+@router.get("/")
 def root():
     return {"message": "👋 Welcome to Blueprint AI Backend!", "status": "ok"}
 
 # Auth scheme for extracting JWT
 bearer_scheme = HTTPBearer()
 
-def authenticate_user(credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)):
+async def authenticate_user(credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)):
     token = credentials.credentials
     try:
-        decoded_token = firebase_auth.verify_id_token(token)
+        decoded_token = await verify_token(token)
         return decoded_token
     except Exception as e:
-        print(f"[AUTH] Invalid token: {e}")
+        logger.info("Invalid token", error=str(e))
         raise HTTPException(status_code=401, detail="Invalid or missing authentication token")
 
-
-@app.on_event("startup")
-async def startup():
-    await database.connect()
-    print("[DEBUG] DATABASE_URL:", os.getenv("DATABASE_URL"))
-
-@app.on_event("shutdown")
-async def shutdown():
-    await database.disconnect()
-
-# Enable CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# 📈 Prometheus metrics
+@router.get("/metrics")
+def get_metrics():
+    body, content_type = render_metrics()
+    return Response(body, media_type=content_type)
 
 
 # 🧾 Request schema
@@ -75,342 +69,292 @@ class Chat(BaseModel):
     created_at: str
 
 # 🔧 Health check
-@app.get("/health")
-def health_check():
-    return {"status": "ok"}
+@router.get("/health")
+async def health_check():
+    # Readiness of each pool (a SELECT 1 through it) alongside its utilization
+    pools = {"primary": database}
+    if read_database is not database:
+        pools["replica"] = read_database
+    db_status = {}
+    for role, pool in pools.items():
+        db_status[role] = {"ready": await pool.ping(), **pool.pool_stats()}
+    ready = all(pool["ready"] for pool in db_status.values())
+    return {"status": "ok" if ready else "degraded", "database": db_status, "llm_limiter": llm_limiter.snapshot()}
 
 # 🧠 AI Architecture pipeline endpoint (non-streaming)
-@app.post("/blueprint")
-async def run_blueprint(request: ProductIdea, user=Depends(authenticate_user)):
-    try:
-        result = run_blueprint_ai(request.title)
-    except Exception as e:
-        return {"error": str(e)}, 500
-    chat_id = str(uuid.uuid4())
-    now = datetime.datetime.utcnow()
-    user_message_id = str(uuid.uuid4())
-    assistant_message_id = str(uuid.uuid4())
-    user_id = user["uid"]
-    query = chat.insert().values(
-        id=chat_id,
-        user_id=user_id,
-        title=request.title,
-        user_message=request.title,
-        assistant_message=json.dumps(result),
-        created_at=now
-    )
-    await database.execute(query)
-    return {
-        "id": chat_id,
-        "title": request.title,
-        "createdAt": now.isoformat(),
-        "messages": [
-            {"id": user_message_id, "role": "user", "content": request.title},
-            {"id": assistant_message_id, "role": "assistant", "content": json.dumps(result)}
-        ]
-    }
-
-# 🧾 Return all chats
-@app.get("/chats")
-async def get_chat(user=Depends(authenticate_user)):
-    import traceback
-    print("[BACKEND] Fetching chat for user:", user)
-    print("[BACKEND] user['uid']:", user.get('uid'), type(user.get('uid')))
-    try:
-        query = chat.select().where(chat.c.user_id == user["uid"]).order_by(chat.c.created_at.desc())
-        rows = await database.fetch_all(query)
-        chats_list = []
-        for row in rows:
-            # Use messages column if present and not None
-            messages = row["messages"] if "messages" in row and row["messages"] else None
-            if messages:
-                chat_messages = messages
-            else:
-                chat_messages = []
-                if row["user_message"]:
-                    chat_messages.append({
-                        "id": str(uuid.uuid4()), "role": "user", "content": row["user_message"]
-                    })
-                if row["assistant_message"]:
-                    chat_messages.append({
-                        "id": str(uuid.uuid4()), "role": "assistant", "content": row["assistant_message"]
-                    })
-            chats_list.append({
-                "id": str(row["id"]),
-                "title": row["title"],
-                "createdAt": row["created_at"].isoformat() if row["created_at"] else None,
-                "messages": chat_messages
-            })
-        print(f"[BACKEND] Returning {len(chats_list)} chat for user {user['uid']}")
-        return chats_list
-    except Exception as e:
-        print("[BACKEND] Exception in /chat endpoint:", str(e))
-        traceback.print_exc()
-        return JSONResponse({"status": "error", "detail": str(e)}, status_code=500)
-
+# A pipeline nobody is waiting for any more (e.g. a batch whose client went away) is cancelled;
+# its finished stages stay checkpointed
+blueprint_flight = SingleFlight(cancel_abandoned=True)
 
-# 💾 Save chat (insert or update)
-class SaveChatRequest(BaseModel):
-    chat_id: str
-    title: str
-    messages: list
+async def blueprint_response(user_id: str, title: str, result: dict):
+    if "error" in result:
+        # Completed stages are checkpointed; POST /blueprint/runs/{run_id}/resume picks up from here
+        return JSONResponse(result, status_code=500)
+    return await save_blueprint_chat(user_id, title, result)
 
-@app.post("/chat/save")
-async def save_chat(request: Request, user=Depends(authenticate_user)):
-    data = await request.json()
-    print("[BACKEND] Received /chat/save data:", data)
-    print("[BACKEND] Authenticated user:", user)
-    chat_id = data.get("chat_id")
-    title = data.get("title")
-    messages = data.get("messages")
-    user_message = ""
-    assistant_message = ""
-    if messages and len(messages) > 0:
-        # Find last user message for user_message
-        for msg in reversed(messages):
-            if msg.get("role") == "user":
-                user_message = msg.get("content", "")
-                break
-        # Concatenate all assistant/agent messages for assistant_message
-        assistant_contents = [
-            msg.get("content", "")
-            for msg in messages
-            if msg.get("role") != "user"
-        ]
-        assistant_message = "\n\n".join(assistant_contents)
+@router.post("/blueprint")
+async def run_blueprint(request: ProductIdea, user=Depends(authenticate_user)):
+    uid = user["uid"]
     try:
-        # UPSERT: Insert or update on conflict (id, user_id)
-        from sqlalchemy.dialects.postgresql import insert as pg_insert
-        now = datetime.datetime.utcnow()
-        upsert_stmt = pg_insert(chat).values(
-            id=chat_id,
-            user_id=user["uid"],
-            title=title,
-            user_message=user_message,
-            assistant_message=assistant_message,
-            created_at=now,
-            messages=messages
-        ).on_conflict_do_update(
-            index_elements=[chat.c.id],
-            set_={
-                "user_id": user["uid"],
-                "title": title,
-                "user_message": user_message,
-                "assistant_message": assistant_message,
-                "created_at": now,
-                "messages": messages
-            }
+        # A retry or double-click for the same idea waits on the pipeline already running
+        result = await blueprint_flight.do(
+            f"{uid}:{normalize_key(request.title)}", lambda: run_blueprint_ai(request.title, uid)
         )
-        upsert_stmt = upsert_stmt.returning(chat)
-        result = await database.fetch_one(upsert_stmt)
-        print("[BACKEND] Upsert result (inserted/updated row):", result)
-        # Debug: fetch all chat to confirm insert
-        try:
-            all_chat = await database.fetch_all(chat.select())
-            print(f"[DEBUG] All chat in DB after save: {all_chat}")
-        except Exception as db_debug_exc:
-            print("[DEBUG] Error fetching all chats:", db_debug_exc)
-        return {"status": "saved", "row": dict(result) if result else None}
     except Exception as e:
-        import traceback
-        print("[ERROR] Exception in /chat/save:", e)
-        traceback.print_exc()
-        return JSONResponse({"status": "error", "detail": str(e)}, status_code=500)
+        return JSONResponse({"error": str(e)}, status_code=500)
+    return await blueprint_response(uid, request.title, result)
 
-# 🧹 Delete chat by ID
-@app.delete("/chat/{chat_id}/delete")
-async def delete_chat(chat_id: str):
-    query = chat.delete().where(chat.c.id == chat_id)
-    await database.execute(query)
-    return {"status": "deleted"}
+# 📦 Many ideas in one request; results stream back as NDJSON lines in completion order
+class BatchBlueprintRequest(BaseModel):
+    titles: list[str]
+    concurrency: Optional[int] = None
 
-# 🚀 Generate via /generate-architecture-stream/
-from stream_utils import stream_blueprint_ai
-from fastapi.responses import StreamingResponse
+@router.post("/blueprint/batch")
+async def run_blueprint_batch(request: BatchBlueprintRequest, user=Depends(authenticate_user)):
+    uid = user["uid"]
+    if not request.titles:
+        raise HTTPException(status_code=400, detail="No titles given")
+    if len(request.titles) > BLUEPRINT_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BLUEPRINT_BATCH_MAX_ITEMS} titles per batch")
+
+    def run_one(title: str):
+        return blueprint_flight.do(f"{uid}:{normalize_key(title)}", lambda: run_blueprint_ai(title, uid))
 
-@app.post("/generate-architecture-stream/")
-def generate_architecture(request: ProductIdea):
     return StreamingResponse(
-        stream_blueprint_ai(request.title),
-        media_type="text/event-stream"
+        iter_blueprint_batch(uid, request.titles, run_one, request.concurrency or BLUEPRINT_BATCH_CONCURRENCY),
+        media_type="application/x-ndjson"
     )
 
-def run_blueprint_ai(product_idea: str):
-    print("\n🧠 Starting Blueprint AI Pipeline...\n")
-    partials = {}
-    try:
-        print("🔍 Running Research Agent...")
-        research_agent = ResearchAgent()
-        research_summary = research_agent.run(product_idea)
-        print("\n✅ Research Summary:\n", research_summary)
-        partials["research_summary"] = research_summary
-
-        print("🤩 Running Feature Parser Agent...")
-        feature_parser = FeatureParserAgent()
-        parsed_features = feature_parser.run(research_summary)
-        print("\n✅ Parsed Features:\n", parsed_features)
-        partials["parsed_features"] = parsed_features
-
-        print("🏗️ Running Architecture Planner Agent...")
-        architecture_planner = ArchitecturePlannerAgent()
-        architecture_plan = architecture_planner.run(parsed_features)
-        print("\n✅ Architecture Plan:\n", architecture_plan)
-        partials["architecture_plan"] = architecture_plan
-
-        print("🧱 Running Tech Stack Selector Agent...")
-        tech_stack_selector = TechStackSelectorAgent()
-        tech_stack = tech_stack_selector.run(architecture_plan)
-        print("\n✅ Tech Stack:\n", tech_stack)
-        partials["tech_stack"] = tech_stack
-
-        print("🔐 Running Security & Infrastructure Agent...")
-        security_infra_agent = SecurityInfraAgent()
-        security_recommendations = security_infra_agent.run(architecture_plan)
-        print("\n✅ Security Recommendations:\n", security_recommendations)
-        partials["security_recommendations"] = security_recommendations
-
-        return partials
-    except Exception as e:
-        # Return whatever partials are available, plus error
-        partials["error"] = str(e)
-        return partials
-from fastapi import FastAPI, HTTPException, status, Request, Depends
-from fastapi.responses import JSONResponse
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-import firebase_admin
-from firebase_admin import credentials, auth as firebase_auth
-import functools
-from fastapi.middleware.cors import CORSMiddleware
-import json
-from pydantic import BaseModel
-import os
-import uvicorn
-import uuid
-import datetime
-print("[DEBUG] DATABASE_URL:", os.getenv("DATABASE_URL"))
-from agents.research_agent import ResearchAgent
-from agents.feature_parser_agent import FeatureParserAgent
-from agents.architecture_planner_agent import ArchitecturePlannerAgent
-from agents.tech_stack_selector_agent import TechStackSelectorAgent
-from agents.security_infra_agent import SecurityInfraAgent
-from db import chat, database
-
-# Initialize Firebase Admin SDK if not already initialized
-if not firebase_admin._apps:
-    cred = credentials.Certificate(os.path.join(os.path.dirname(__file__), 'firebase-service-account.json'))
-    firebase_admin.initialize_app(cred)
-
-app = FastAPI()
-
-@app.get("/")
-def root():
-    return {"message": "👋 Welcome to Blueprint AI Backend!", "status": "ok"}
+async def get_user_run(run_id: str, user_id: Optional[str]):
+    run = await load_run(run_id)
+    if run is None or run["user_id"] != user_id:
+        raise HTTPException(status_code=404, detail="Run not found or expired")
+    return run
 
-# Auth scheme for extracting JWT
-bearer_scheme = HTTPBearer()
+@router.get("/blueprint/runs/{run_id}")
+async def get_blueprint_run(run_id: str, user=Depends(authenticate_user)):
+    run = await get_user_run(run_id, user["uid"])
+    return {"run_id": run_id, "title": run["product_idea"], "completed": list(run["outputs"]), "outputs": run["outputs"]}
 
-def authenticate_user(credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)):
-    token = credentials.credentials
+@router.post("/blueprint/runs/{run_id}/resume")
+async def resume_blueprint_run(run_id: str, user=Depends(authenticate_user)):
+    run = await get_user_run(run_id, user["uid"])
     try:
-        decoded_token = firebase_auth.verify_id_token(token)
-        return decoded_token
+        result = await blueprint_flight.do(
+            f"resume:{run_id}", lambda: run_blueprint_ai(run["product_idea"], user["uid"], run_id, run["outputs"])
+        )
     except Exception as e:
-        print(f"[AUTH] Invalid token: {e}")
-        raise HTTPException(status_code=401, detail="Invalid or missing authentication token")
+        return JSONResponse({"error": str(e), "run_id": run_id}, status_code=500)
+    return await blueprint_response(user["uid"], run["product_idea"], result)
 
+# 📬 Background blueprint jobs: submit, then poll or subscribe
+job_queue = create_job_queue()
 
-@app.on_event("startup")
-async def startup():
-    await database.connect()
-    print("[DEBUG] DATABASE_URL:", os.getenv("DATABASE_URL"))
+@router.post("/blueprint/jobs", status_code=202)
+async def submit_blueprint_job(request: ProductIdea, user=Depends(authenticate_user)):
+    try:
+        job = await job_queue.submit(user["uid"], request.title)
+    except QueueFull:
+        raise HTTPException(status_code=503, detail="Blueprint job queue is full, retry later")
+    return job_response(job)
 
-@app.on_event("shutdown")
-async def shutdown():
-    await database.disconnect()
+async def get_user_job(job_id: str, user: dict):
+    job = await job_queue.get(job_id)
+    if job is None or job["user_id"] != user["uid"]:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
-# Enable CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+@router.get("/blueprint/jobs/{job_id}")
+async def get_blueprint_job(job_id: str, user=Depends(authenticate_user)):
+    return job_response(await get_user_job(job_id, user))
 
+@router.get("/blueprint/jobs/{job_id}/events")
+async def stream_blueprint_job(job_id: str, user=Depends(authenticate_user)):
+    await get_user_job(job_id, user)
 
-# 🧾 Request schema
-class ProductIdea(BaseModel):
-    title: str
+    async def job_events():
+        async for job in job_queue.events(job_id):
+            yield sse_format({"type": "job", **job_response(job)})
+        yield "data: STREAM_END\n\n"
 
-# 📄 Response schema
-class Chat(BaseModel):
-    id: str
-    title: str
-    created_at: str
+    return StreamingResponse(job_events(), media_type="text/event-stream")
 
-# 🔧 Health check
-@app.get("/health")
-def health_check():
-    return {"status": "ok"}
+# 🧾 Return chats, optionally as keyset-paginated summaries
+CHATS_MAX_PAGE_SIZE = int(os.getenv("CHATS_MAX_PAGE_SIZE", "100"))
 
-# 🧠 AI Architecture pipeline endpoint (non-streaming)
-@app.post("/blueprint")
-async def run_blueprint(request: ProductIdea, user=Depends(authenticate_user)):
+def encode_chat_cursor(created_at: datetime.datetime, chat_id: str) -> str:
+    raw = json.dumps([created_at.isoformat(), chat_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_chat_cursor(cursor: str):
     try:
-        result = run_blueprint_ai(request.title)
-    except Exception as e:
-        return {"error": str(e)}, 500
-    chat_id = str(uuid.uuid4())
-    now = datetime.datetime.utcnow()
-    user_message_id = str(uuid.uuid4())
-    assistant_message_id = str(uuid.uuid4())
-    user_id = user["uid"]
-    query = chat.insert().values(
-        id=chat_id,
-        user_id=user_id,
-        title=request.title,
-        user_message=request.title,
-        assistant_message=json.dumps(result),
-        created_at=now
-    )
-    await database.execute(query)
+        created_at, chat_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.datetime.fromisoformat(created_at), chat_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def chat_messages(row):
+    # Use messages column if present and not None
+    if row["messages"]:
+        return row["messages"]
+    # Legacy rows only have the denormalized columns; ids are derived from the chat id
+    # so they stay stable across reads
+    messages = []
+    if row["user_message"]:
+        messages.append({"id": f"{row['id']}-user", "role": "user", "content": row["user_message"]})
+    if row["assistant_message"]:
+        messages.append({"id": f"{row['id']}-assistant", "role": "assistant", "content": row["assistant_message"]})
+    return messages
+
+def chat_summary(row):
     return {
-        "id": chat_id,
-        "title": request.title,
-        "createdAt": now.isoformat(),
-        "messages": [
-            {"id": user_message_id, "role": "user", "content": request.title},
-            {"id": assistant_message_id, "role": "assistant", "content": json.dumps(result)}
-        ]
+        "id": str(row["id"]),
+        "title": row["title"],
+        "createdAt": row["created_at"].isoformat() if row["created_at"] else None,
     }
 
-# 🧾 Return all chats
-@app.get("/chats")
-async def get_chat(user=Depends(authenticate_user)):
-    import traceback
-    print("[BACKEND] Fetching chat for user:", user)
-    print("[BACKEND] user['uid']:", user.get('uid'), type(user.get('uid')))
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    weak = lambda tag: tag.strip().removeprefix("W/")
+    return weak(etag) in {weak(tag) for tag in if_none_match.split(",")}
+
+CHAT_CACHE_HEADERS = {"Cache-Control": "private, no-cache", "Vary": "Authorization"}
+
+async def chats_etag(user_id: str, *params) -> str:
+    # Changes whenever a chat of this user is added, deleted or written (every write bumps version);
+    # one index-backed aggregate instead of reading row bodies
+    query = sqlalchemy.select(
+        sqlalchemy.func.count().label("count"),
+        sqlalchemy.func.max(chat.c.created_at).label("latest"),
+        sqlalchemy.func.coalesce(sqlalchemy.func.sum(chat.c.version), 0).label("versions"),
+    ).where(chat.c.user_id == user_id)
+    row = await reader_for(user_id).fetch_one(query)
+    raw = json.dumps([row["count"], str(row["latest"]), row["versions"], params])
+    return f'W/"{hashlib.sha256(raw.encode()).hexdigest()[:32]}"'
+
+@router.get("/chats")
+async def get_chat(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+    summary: bool = False,
+    if_none_match: Optional[str] = Header(None),
+    user=Depends(authenticate_user),
+):
+    paginated = limit is not None or cursor is not None
     try:
-        query = chat.select().where(chat.c.user_id == user["uid"]).order_by(chat.c.created_at.desc())
-        rows = await database.fetch_all(query)
+        etag = await chats_etag(user["uid"], limit, cursor, summary)
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag, **CHAT_CACHE_HEADERS})
+        response.headers.update({"ETag": etag, **CHAT_CACHE_HEADERS})
+
+        if summary:
+            query = sqlalchemy.select(chat.c.id, chat.c.title, chat.c.created_at)
+        else:
+            query = chat.select()
+        # Served by ix_chat_user_id_created_at (user_id, created_at DESC, id DESC)
+        query = query.where(chat.c.user_id == user["uid"]).order_by(chat.c.created_at.desc(), chat.c.id.desc())
+        if cursor is not None:
+            cursor_created_at, cursor_id = decode_chat_cursor(cursor)
+            query = query.where(
+                sqlalchemy.tuple_(chat.c.created_at, chat.c.id) < sqlalchemy.tuple_(cursor_created_at, cursor_id)
+            )
+        if paginated:
+            page_size = min(limit or CHATS_MAX_PAGE_SIZE, CHATS_MAX_PAGE_SIZE)
+            # One extra row tells us whether there is a next page
+            query = query.limit(page_size + 1)
+        rows = await reader_for(user["uid"]).fetch_all(query)
+
+        next_cursor = None
+        if paginated and len(rows) > page_size:
+            rows = rows[:page_size]
+            last = rows[-1]
+            next_cursor = encode_chat_cursor(last["created_at"], str(last["id"]))
+
         chats_list = []
         for row in rows:
-            chats_list.append({
-                "id": str(row["id"]),
-                "title": row["title"],
-                "createdAt": row["created_at"].isoformat() if row["created_at"] else None,
-                "messages": [
-                    {"id": str(uuid.uuid4()), "role": "user", "content": row["user_message"]},
-                    {"id": str(uuid.uuid4()), "role": "assistant", "content": row["assistant_message"]}
-                ]
-            })
-        print(f"[BACKEND] Returning {len(chats_list)} chat for user {user['uid']}")
+            item = chat_summary(row)
+            if not summary:
+                item["messages"] = chat_messages(row)
+                if row["outputs"] is not None:
+                    item["outputs"] = row["outputs"]
+            chats_list.append(item)
+        logger.debug("Returning chats", uid=user["uid"], count=len(chats_list), summary=summary)
+        if paginated:
+            return {"chats": chats_list, "next_cursor": next_cursor}
         return chats_list
+    except (HTTPException, PoolTimeout):
+        raise
     except Exception as e:
-        print("[BACKEND] Exception in /chat endpoint:", str(e))
-        traceback.print_exc()
+        logger.exception("Listing chats failed", uid=user["uid"])
         return JSONResponse({"status": "error", "detail": str(e)}, status_code=500)
 
+# 🔎 Full-text search over the user's chats, ranked, with snippets
+CHAT_SEARCH_MAX_QUERY_CHARS = int(os.getenv("CHAT_SEARCH_MAX_QUERY_CHARS", "256"))
+CHAT_SEARCH_DEFAULT_PAGE_SIZE = int(os.getenv("CHAT_SEARCH_DEFAULT_PAGE_SIZE", "20"))
+
+@router.get("/chats/search")
+async def search_chat_history(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(CHAT_SEARCH_DEFAULT_PAGE_SIZE, ge=1),
+    offset: int = Query(0, ge=0),
+    user=Depends(authenticate_user),
+):
+    if len(q) > CHAT_SEARCH_MAX_QUERY_CHARS:
+        raise HTTPException(status_code=400, detail=f"Query longer than {CHAT_SEARCH_MAX_QUERY_CHARS} characters")
+    page_size = min(limit, CHATS_MAX_PAGE_SIZE)
+    try:
+        # One extra row tells us whether there is a next page
+        rows = await search_chats(reader_for(user["uid"]), user["uid"], q, page_size + 1, offset)
+        next_offset = offset + page_size if len(rows) > page_size else None
+        results = [{**chat_summary(row), "snippet": row["snippet"], "rank": row["rank"]} for row in rows[:page_size]]
+        logger.debug("Chat search", uid=user["uid"], results=len(results))
+        return {"results": results, "next_offset": next_offset}
+    except PoolTimeout:
+        raise
+    except Exception as e:
+        logger.exception("Chat search failed", uid=user["uid"])
+        return JSONResponse({"status": "error", "detail": str(e)}, status_code=500)
+
+# 📖 Return one chat with its full messages
+@router.get("/chat/{chat_id}")
+async def get_chat_by_id(
+    chat_id: str,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    user=Depends(authenticate_user),
+):
+    # Same ETag as the append endpoint: the chat's version
+    if if_none_match:
+        version = await reader_for(user["uid"]).fetch_val(
+            sqlalchemy.select(chat.c.version).where(chat.c.id == chat_id).where(chat.c.user_id == user["uid"])
+        )
+        if version is not None and etag_matches(if_none_match, f'"{version}"'):
+            return Response(status_code=304, headers={"ETag": f'"{version}"', **CHAT_CACHE_HEADERS})
+    query = chat.select().where(chat.c.id == chat_id).where(chat.c.user_id == user["uid"])
+    row = await reader_for(user["uid"]).fetch_one(query)
+    if row is None:
+        raise HTTPException(status_code=404, detail="Chat not found")
+    response.headers.update({"ETag": f'"{row["version"]}"', **CHAT_CACHE_HEADERS})
+    item = {**chat_summary(row), "messages": chat_messages(row)}
+    if row["outputs"] is not None:
+        item["outputs"] = row["outputs"]
+    return item
+
+# 🔎 One agent's output of a blueprint chat, read straight out of the outputs column
+@router.get("/chat/{chat_id}/outputs/{stage}")
+async def get_chat_stage_output(chat_id: str, stage: str, user=Depends(authenticate_user)):
+    query = sqlalchemy.select(chat.c.outputs[stage].as_string().label("output")).where(
+        chat.c.id == chat_id
+    ).where(chat.c.user_id == user["uid"])
+    row = await reader_for(user["uid"]).fetch_one(query)
+    if row is None or row["output"] is None:
+        raise HTTPException(status_code=404, detail="Chat or stage not found")
+    return {"id": chat_id, "stage": stage, "output": row["output"]}
+
 
 # 💾 Save chat (insert or update)
 class SaveChatRequest(BaseModel):
@@ -418,32 +362,40 @@ class SaveChatRequest(BaseModel):
     title: str
     messages: list
 
-@app.post("/chat/save")
+@router.post("/chat/save")
 async def save_chat(request: Request, user=Depends(authenticate_user)):
     data = await request.json()
-    print("[BACKEND] Received /chat/save data:", data)
-    print("[BACKEND] Authenticated user:", user)
+    logger.debug("Saving chat", uid=user["uid"], chat_id=data.get("chat_id"), payload=data)
     chat_id = data.get("chat_id")
     title = data.get("title")
     messages = data.get("messages")
     user_message = ""
     assistant_message = ""
-    if messages and len(messages) >= 2:
-        user_message = messages[-2]["content"]
-        assistant_message = messages[-1]["content"]
-    elif messages and len(messages) == 1:
-        user_message = messages[0]["content"]
+    if messages and len(messages) > 0:
+        # Find last user message for user_message
+        for msg in reversed(messages):
+            if msg.get("role") == "user":
+                user_message = msg.get("content", "")
+                break
+        # Concatenate all assistant/agent messages for assistant_message
+        assistant_contents = [
+            msg.get("content", "")
+            for msg in messages
+            if msg.get("role") != "user"
+        ]
+        assistant_message = "\n\n".join(assistant_contents)
     try:
         # UPSERT: Insert or update on conflict (id, user_id)
-        from sqlalchemy.dialects.postgresql import insert as pg_insert
         now = datetime.datetime.utcnow()
-        upsert_stmt = pg_insert(chat).values(
+        upsert_stmt = upsert(chat).values(
             id=chat_id,
             user_id=user["uid"],
             title=title,
             user_message=user_message,
             assistant_message=assistant_message,
-            created_at=now
+            created_at=now,
+            messages=messages,
+            version=1
         ).on_conflict_do_update(
             index_elements=[chat.c.id],
             set_={
@@ -451,79 +403,170 @@ async def save_chat(request: Request, user=Depends(authenticate_user)):
                 "title": title,
                 "user_message": user_message,
                 "assistant_message": assistant_message,
-                "created_at": now
+                "created_at": now,
+                "messages": messages,
+                "version": chat.c.version + 1
             }
         )
         upsert_stmt = upsert_stmt.returning(chat)
         result = await database.fetch_one(upsert_stmt)
-        print("[BACKEND] Upsert result (inserted/updated row):", result)
-        # Debug: fetch all chat to confirm insert
-        try:
-            all_chat = await database.fetch_all(chat.select())
-            print(f"[DEBUG] All chat in DB after save: {all_chat}")
-        except Exception as db_debug_exc:
-            print("[DEBUG] Error fetching all chats:", db_debug_exc)
+        mark_write(user["uid"])
+        logger.debug("Chat saved", chat_id=chat_id, version=result["version"] if result else None)
         return {"status": "saved", "row": dict(result) if result else None}
+    except PoolTimeout:
+        raise
     except Exception as e:
-        import traceback
-        print("[ERROR] Exception in /chat/save:", e)
-        traceback.print_exc()
+        logger.exception("Saving chat failed", uid=user["uid"], chat_id=chat_id)
         return JSONResponse({"status": "error", "detail": str(e)}, status_code=500)
 
+# ➕ Append new messages to a chat (only the delta is sent and written)
+class AppendMessagesRequest(BaseModel):
+    messages: list
+    title: Optional[str] = None
+    expected_version: Optional[int] = None
+
+@router.post("/chat/{chat_id}/messages")
+async def append_chat_messages(
+    chat_id: str,
+    request: AppendMessagesRequest,
+    if_match: Optional[str] = Header(None),
+    user=Depends(authenticate_user),
+):
+    expected_version = request.expected_version
+    if expected_version is None and if_match:
+        try:
+            expected_version = int(if_match.strip().removeprefix("W/").strip('"'))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid If-Match header")
+    try:
+        version, message_count = await append_messages(
+            chat_id, user["uid"], request.messages, title=request.title, expected_version=expected_version
+        )
+    except ChatNotFound:
+        raise HTTPException(status_code=404, detail="Chat not found")
+    except VersionConflict as e:
+        return JSONResponse(
+            {"status": "conflict", "version": e.current_version},
+            status_code=412,
+            headers={"ETag": f'"{e.current_version}"'},
+        )
+    return JSONResponse(
+        {"status": "appended", "version": version, "message_count": message_count},
+        headers={"ETag": f'"{version}"'},
+    )
+
 # 🧹 Delete chat by ID
-@app.delete("/chat/{chat_id}/delete")
+@router.delete("/chat/{chat_id}/delete")
 async def delete_chat(chat_id: str):
     query = chat.delete().where(chat.c.id == chat_id)
     await database.execute(query)
     return {"status": "deleted"}
 
 # 🚀 Generate via /generate-architecture-stream/
-from stream_utils import stream_blueprint_ai
-from fastapi.responses import StreamingResponse
 
-@app.post("/generate-architecture-stream/")
-def generate_architecture(request: ProductIdea):
-    return StreamingResponse(
-        stream_blueprint_ai(request.title),
-        media_type="text/event-stream"
-    )
-
-def run_blueprint_ai(product_idea: str):
-    print("\n🧠 Starting Blueprint AI Pipeline...\n")
-    partials = {}
+def event_stream_response(stream_id: str, events):
+    return StreamingResponse(events, media_type="text/event-stream", headers={"X-Stream-Id": stream_id})
+
+@router.post("/generate-architecture-stream/")
+async def generate_architecture(request: ProductIdea, http_request: Request, last_event_id: Optional[str] = Header(None)):
+    stream_id, events = shared_stream_blueprint_ai(request.title, last_event_id, http_request)
+    return event_stream_response(stream_id, events)
+
+# 🔁 Reattach to a running (or recently finished) stream: replays events after Last-Event-ID,
+# then follows live output. GET so EventSource can reconnect on its own.
+@router.get("/generate-architecture-stream/{stream_id}")
+async def reattach_generate_architecture(
+    stream_id: str,
+    request: Request,
+    last_event_id: Optional[str] = Header(None),
+    last_event_id_param: Optional[str] = Query(None, alias="last_event_id"),
+):
+    attached = attach_stream(stream_id, last_event_id or last_event_id_param, request)
+    if attached is None:
+        raise HTTPException(status_code=404, detail="Stream not found or expired")
+    return event_stream_response(*attached)
+
+# ⏯️ Resume a failed stream from its checkpoints (run_id comes from the stream's "run"/"error" events)
+@router.post("/generate-architecture-stream/{run_id}/resume")
+async def resume_generate_architecture(run_id: str, request: Request):
+    # Stream runs are anonymous, so only anonymous checkpoints can be resumed here
+    run = await get_user_run(run_id, None)
+    return event_stream_response(*resume_stream_blueprint_ai(run_id, run["product_idea"], run["outputs"], request))
+
+async def run_blueprint_ai(product_idea: str, user_id: str = None, run_id: str = None, completed: dict = None):
+    run_id = run_id or new_run_id()
+    logger.info("Starting Blueprint AI pipeline", product_idea=product_idea, run_id=run_id, resumed=list(completed or {}))
+    partials = dict(completed or {})
     try:
-        print("🔍 Running Research Agent...")
-        research_agent = ResearchAgent()
-        research_summary = research_agent.run(product_idea)
-        print("\n✅ Research Summary:\n", research_summary)
-        partials["research_summary"] = research_summary
-
-        print("🤩 Running Feature Parser Agent...")
-        feature_parser = FeatureParserAgent()
-        parsed_features = feature_parser.run(research_summary)
-        print("\n✅ Parsed Features:\n", parsed_features)
-        partials["parsed_features"] = parsed_features
-
-        print("🏗️ Running Architecture Planner Agent...")
-        architecture_planner = ArchitecturePlannerAgent()
-        architecture_plan = architecture_planner.run(parsed_features)
-        print("\n✅ Architecture Plan:\n", architecture_plan)
-        partials["architecture_plan"] = architecture_plan
-
-        print("🧱 Running Tech Stack Selector Agent...")
-        tech_stack_selector = TechStackSelectorAgent()
-        tech_stack = tech_stack_selector.run(architecture_plan)
-        print("\n✅ Tech Stack:\n", tech_stack)
-        partials["tech_stack"] = tech_stack
-
-        print("🔐 Running Security & Infrastructure Agent...")
-        security_infra_agent = SecurityInfraAgent()
-        security_recommendations = security_infra_agent.run(architecture_plan)
-        print("\n✅ Security Recommendations:\n", security_recommendations)
-        partials["security_recommendations"] = security_recommendations
-
+        async for stage, output in iter_checkpointed_pipeline(run_id, user_id, product_idea, completed):
+            logger.info("Agent finished", agent=stage.agent_name, output_chars=len(output), output=output)
+            partials[stage.key] = output
         return partials
     except Exception as e:
-        # Return whatever partials are available, plus error
+        # Return whatever partials are available, plus the error and the run to resume
+        logger.warning("Blueprint pipeline failed", error=str(e), run_id=run_id, completed=list(partials))
         partials["error"] = str(e)
+        partials["run_id"] = run_id
         return partials
+
+
+# 🏗️ Application factory. Startup does no I/O: Firebase is initialized on the first token
+# verification and the DB pool is opened by the first query.
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    start_cert_refresh()
+    job_queue.start()
+    logger.info("Startup complete")
+    yield
+    stop_cert_refresh()
+    await job_queue.stop()
+    for pool in {database, read_database}:
+        if pool.is_connected:
+            await pool.disconnect()
+    await close_llm_client()
+
+
+async def pool_timeout_handler(request: Request, exc: PoolTimeout):
+    logger.warning("Database pool exhausted", path=request.url.path, error=str(exc))
+    return JSONResponse({"status": "error", "detail": "Database busy, retry later"}, status_code=503, headers={"Retry-After": "1"})
+
+
+def create_app() -> FastAPI:
+    configure_logging()
+    app = FastAPI(lifespan=lifespan)
+    app.include_router(router)
+    app.add_exception_handler(PoolTimeout, pool_timeout_handler)
+
+    register_stats("llm_cache", cache_stats)
+    register_stats("llm_limiter", llm_limiter.snapshot)
+    register_stats("auth_token_cache", token_cache_stats)
+    register_stats("logging", lambda: dict(log_stats))
+    register_stats("compaction", compaction_stats)
+    register_stats("llm_routing", routing_stats)
+    register_stats("semantic_cache", semantic_cache_stats)
+    register_stats("pipeline_checkpoints", checkpoint_stats)
+    register_stats("blueprint_batch", batch_stats)
+    register_stats("blueprint_streams", stream_stats)
+    register_stats("blueprint_jobs", job_queue.stats)
+    register_stats("db_pool", database.pool_stats)
+    if read_database is not database:
+        register_stats("db_replica_pool", read_database.pool_stats)
+
+    # Correlation id on every log line of a request
+    app.add_middleware(RequestIdMiddleware)
+
+    # gzip (or brotli, if installed) for large JSON and SSE responses
+    app.add_middleware(CompressionMiddleware)
+
+    # Enable CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    return app
+
+
+app = create_app()
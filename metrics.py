@@ -0,0 +1,164 @@
+import time
+import asyncio
+import contextlib
+from contextvars import ContextVar
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client.core import GaugeMetricFamily
+
+registry = CollectorRegistry()
+
+# Agent stage that owns the current task; lets call_llm label LLM metrics by agent
+current_agent = ContextVar("current_agent", default="none")
+
+LLM_BUCKETS = (0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 45, 60, 90, 120, 180)
+DB_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+AGENT_DURATION = Histogram(
+    "blueprint_agent_duration_seconds", "Wall-clock duration of one agent run",
+    ["agent"], buckets=LLM_BUCKETS, registry=registry,
+)
+AGENT_IN_FLIGHT = Gauge(
+    "blueprint_agent_in_flight", "Agent runs currently executing",
+    ["agent"], registry=registry,
+)
+AGENT_ERRORS = Counter(
+    "blueprint_agent_errors_total", "Agent runs that raised",
+    ["agent", "error_type"], registry=registry,
+)
+AGENT_CANCELLED = Counter(
+    "blueprint_agent_cancelled_total", "Agent runs cancelled before finishing (e.g. abandoned streams)",
+    ["agent"], registry=registry,
+)
+
+LLM_DURATION = Histogram(
+    "llm_request_duration_seconds", "Duration of one call_llm, including retries and limiter wait",
+    ["agent", "model"], buckets=LLM_BUCKETS, registry=registry,
+)
+LLM_IN_FLIGHT = Gauge(
+    "llm_requests_in_flight", "call_llm invocations currently waiting or running",
+    ["agent", "model"], registry=registry,
+)
+LLM_TOKENS = Counter(
+    "llm_tokens_total", "Tokens reported in Together usage blocks",
+    ["agent", "model", "kind"], registry=registry,
+)
+LLM_ERRORS = Counter(
+    "llm_errors_total", "Failed call_llm invocations",
+    ["agent", "model", "error_type"], registry=registry,
+)
+LLM_CANCELLED = Counter(
+    "llm_cancelled_total", "call_llm invocations cancelled in flight",
+    ["agent", "model"], registry=registry,
+)
+LLM_CANCELLED_SECONDS = Counter(
+    "llm_cancelled_seconds_total", "Time cancelled call_llm invocations had been running",
+    ["agent", "model"], registry=registry,
+)
+LLM_FALLBACKS = Counter(
+    "llm_fallbacks_total", "Calls that failed on a model and moved on to the route's next fallback",
+    ["agent", "model"], registry=registry,
+)
+LLM_HEDGES = Counter(
+    "llm_hedged_requests_total", "Hedge requests sent after an agent's p95 latency, and hedges that won",
+    ["agent", "model", "outcome"], registry=registry,
+)
+
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds", "Database query duration",
+    ["table", "operation"], buckets=DB_BUCKETS, registry=registry,
+)
+DB_ERRORS = Counter(
+    "db_query_errors_total", "Database queries that raised",
+    ["table", "operation", "error_type"], registry=registry,
+)
+
+
+@contextlib.contextmanager
+def track_agent(agent: str):
+    token = current_agent.set(agent)
+    AGENT_IN_FLIGHT.labels(agent).inc()
+    started = time.perf_counter()
+    try:
+        yield
+    except asyncio.CancelledError:
+        AGENT_CANCELLED.labels(agent).inc()
+        raise
+    except Exception as e:
+        AGENT_ERRORS.labels(agent, type(e).__name__).inc()
+        raise
+    finally:
+        AGENT_DURATION.labels(agent).observe(time.perf_counter() - started)
+        AGENT_IN_FLIGHT.labels(agent).dec()
+        current_agent.reset(token)
+
+
+@contextlib.contextmanager
+def track_llm_call(model: str):
+    agent = current_agent.get()
+    LLM_IN_FLIGHT.labels(agent, model).inc()
+    started = time.perf_counter()
+    try:
+        yield
+    except asyncio.CancelledError:
+        LLM_CANCELLED.labels(agent, model).inc()
+        LLM_CANCELLED_SECONDS.labels(agent, model).inc(time.perf_counter() - started)
+        raise
+    except Exception as e:
+        LLM_ERRORS.labels(agent, model, type(e).__name__).inc()
+        raise
+    finally:
+        LLM_DURATION.labels(agent, model).observe(time.perf_counter() - started)
+        LLM_IN_FLIGHT.labels(agent, model).dec()
+
+
+def record_usage(model: str, usage: dict):
+    if not usage:
+        return
+    agent = current_agent.get()
+    for kind in ("prompt_tokens", "completion_tokens"):
+        if usage.get(kind):
+            LLM_TOKENS.labels(agent, model, kind.removesuffix("_tokens")).inc(usage[kind])
+
+
+@contextlib.contextmanager
+def track_query(table: str, operation: str):
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        DB_ERRORS.labels(table, operation, type(e).__name__).inc()
+        raise
+    finally:
+        DB_QUERY_DURATION.labels(table, operation).observe(time.perf_counter() - started)
+
+
+class StatsCollector:
+    # Exposes the plain stats dicts kept by caches, limiters and queues as gauges
+    def __init__(self):
+        self._sources = {}
+
+    def register(self, prefix: str, stats_fn):
+        self._sources[prefix] = stats_fn
+
+    def collect(self):
+        for prefix, stats_fn in self._sources.items():
+            try:
+                stats = stats_fn()
+            except Exception:
+                continue
+            for key, value in stats.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                yield GaugeMetricFamily(f"{prefix}_{key}", f"{prefix} {key.replace('_', ' ')}", value=value)
+
+
+stats_collector = StatsCollector()
+registry.register(stats_collector)
+
+
+def register_stats(prefix: str, stats_fn):
+    stats_collector.register(prefix, stats_fn)
+
+
+def render():
+    return generate_latest(registry), CONTENT_TYPE_LATEST
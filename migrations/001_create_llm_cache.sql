@@ -0,0 +1,10 @@
+-- Persistent tier of the LLM response cache (db.llm_cache)
+CREATE TABLE IF NOT EXISTS llm_cache (
+    key TEXT PRIMARY KEY,
+    model TEXT,
+    response TEXT NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    expires_at TIMESTAMPTZ NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS ix_llm_cache_expires_at ON llm_cache (expires_at);
@@ -0,0 +1,4 @@
+-- Composite index for per-user chat listing, newest first (db.ix_chat_user_id_created_at).
+-- id is the keyset tie-breaker for /chats?cursor=
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_chat_user_id_created_at
+    ON chat (user_id, created_at DESC, id DESC);
@@ -0,0 +1,7 @@
+-- Incremental message appends: messages becomes JSONB (so new messages can be
+-- concatenated in place) and every write bumps a version for optimistic checks.
+ALTER TABLE chat
+    ALTER COLUMN messages TYPE JSONB USING messages::jsonb;
+
+ALTER TABLE chat
+    ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 0;
@@ -0,0 +1,15 @@
+-- Background blueprint jobs (db.blueprint_job); doubles as the shared work queue
+CREATE TABLE IF NOT EXISTS blueprint_job (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    title TEXT NOT NULL,
+    status TEXT NOT NULL,
+    outputs JSONB,
+    error TEXT,
+    chat_id TEXT,
+    version INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS ix_blueprint_job_status_created_at ON blueprint_job (status, created_at);
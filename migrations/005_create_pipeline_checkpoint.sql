@@ -0,0 +1,12 @@
+-- Per-stage blueprint run checkpoints (db.pipeline_checkpoint); rows of a run are
+-- deleted once it completes, failed runs expire after PIPELINE_CHECKPOINT_TTL_SECONDS
+CREATE TABLE IF NOT EXISTS pipeline_checkpoint (
+    run_id TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    user_id TEXT,
+    output TEXT NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (run_id, stage)
+);
+
+CREATE INDEX IF NOT EXISTS ix_pipeline_checkpoint_created_at ON pipeline_checkpoint (created_at);
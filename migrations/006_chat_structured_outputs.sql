@@ -0,0 +1,79 @@
+-- Structured blueprint storage. Stage outputs live in chat.outputs (JSONB, stage key -> text),
+-- and messages are stored rather than rebuilt from the denormalized columns on every read.
+--
+-- This also reconciles the two schemas: create_chats_table.sql used to describe a `chats`
+-- (product_idea, response) table while the app has always used `chat` (db.py). Rows found in
+-- a legacy `chats` table are copied into `chat`; `chats` itself is left for a manual DROP.
+
+CREATE TABLE IF NOT EXISTS chat (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    title TEXT,
+    user_message TEXT,
+    assistant_message TEXT,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    messages JSONB,
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+ALTER TABLE chat
+    ADD COLUMN IF NOT EXISTS outputs JSONB;
+
+-- assistant_message of blueprint chats holds json.dumps(result); anything else is left alone
+CREATE OR REPLACE FUNCTION pg_temp.try_jsonb_object(value TEXT) RETURNS JSONB AS $$
+BEGIN
+    IF value IS NULL OR left(ltrim(value), 1) <> '{' THEN
+        RETURN NULL;
+    END IF;
+    RETURN value::jsonb;
+EXCEPTION WHEN others THEN
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+UPDATE chat
+SET outputs = pg_temp.try_jsonb_object(assistant_message) - 'error'
+WHERE outputs IS NULL
+  AND messages IS NULL
+  AND pg_temp.try_jsonb_object(assistant_message) IS NOT NULL;
+
+-- Legacy rows without stored messages: materialize the messages /chats used to derive
+-- (same ids as main.chat_messages), with the parsed outputs on the assistant message
+UPDATE chat
+SET messages = (
+        CASE WHEN coalesce(user_message, '') <> '' THEN
+            jsonb_build_array(jsonb_build_object('id', id || '-user', 'role', 'user', 'content', user_message))
+        ELSE '[]'::jsonb END
+    ) || (
+        CASE WHEN coalesce(assistant_message, '') <> '' THEN
+            jsonb_build_array(
+                jsonb_build_object('id', id || '-assistant', 'role', 'assistant', 'content', assistant_message)
+                || CASE WHEN outputs IS NOT NULL THEN jsonb_build_object('outputs', outputs) ELSE '{}'::jsonb END
+            )
+        ELSE '[]'::jsonb END
+    )
+WHERE messages IS NULL;
+
+DO $$
+BEGIN
+    IF to_regclass('public.chats') IS NOT NULL THEN
+        INSERT INTO chat (id, user_id, title, user_message, assistant_message, created_at, messages, outputs, version)
+        SELECT
+            c.id::text,
+            'legacy-unassigned',
+            c.product_idea,
+            c.product_idea,
+            c.response::text,
+            c.created_at,
+            jsonb_build_array(
+                jsonb_build_object('id', c.id::text || '-user', 'role', 'user', 'content', c.product_idea),
+                jsonb_build_object('id', c.id::text || '-assistant', 'role', 'assistant', 'content', c.response::text,
+                                   'outputs', c.response::jsonb)
+            ),
+            c.response::jsonb,
+            1
+        FROM chats c
+        ON CONFLICT (id) DO NOTHING;
+    END IF;
+END;
+$$;
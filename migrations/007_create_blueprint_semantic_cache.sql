@@ -0,0 +1,13 @@
+-- Semantic blueprint cache (db.blueprint_semantic_cache); embeddings are float32 unit
+-- vectors loaded into an in-memory index, rows expire after SEMANTIC_CACHE_TTL_SECONDS
+CREATE TABLE IF NOT EXISTS blueprint_semantic_cache (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    embedding BYTEA NOT NULL,
+    outputs JSONB NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    expires_at TIMESTAMPTZ NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS ix_blueprint_semantic_cache_created_at ON blueprint_semantic_cache (created_at);
+CREATE INDEX IF NOT EXISTS ix_blueprint_semantic_cache_expires_at ON blueprint_semantic_cache (expires_at);
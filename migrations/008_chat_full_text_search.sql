@@ -0,0 +1,21 @@
+-- Full-text search over chat history (GET /chats/search, chat_store.search_chats).
+-- search_vector is maintained by Postgres itself (generated column, PG 12+): title is weighted
+-- A, user_message B, assistant_message C. The text search config must match
+-- chat_store.CHAT_SEARCH_CONFIG.
+--
+-- Adding a stored generated column rewrites the table; on a large chat table run this in a
+-- maintenance window. The index is built CONCURRENTLY, outside a transaction (like 002).
+
+ALTER TABLE chat
+    ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(user_message, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(assistant_message, '')), 'C')
+    ) STORED;
+
+-- btree_gin lets user_id share the GIN index, so a search only visits that user's matching rows
+-- instead of every matching row in the table
+CREATE EXTENSION IF NOT EXISTS btree_gin;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_chat_user_id_search_vector
+    ON chat USING GIN (user_id, search_vector);
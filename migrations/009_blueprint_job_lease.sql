@@ -0,0 +1,11 @@
+-- Job leases (db.blueprint_job.lease_expires_at). Workers renew the lease while a job runs;
+-- a `running` job whose lease expired (its worker crashed) is claimed again and resumes
+-- from its pipeline checkpoints. Rows already stuck in `running` have no lease yet:
+-- requeue them once here.
+ALTER TABLE blueprint_job
+    ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMPTZ;
+
+UPDATE blueprint_job SET status = 'queued' WHERE status = 'running' AND lease_expires_at IS NULL;
+
+CREATE INDEX IF NOT EXISTS ix_blueprint_job_running_lease
+    ON blueprint_job (lease_expires_at) WHERE status = 'running';
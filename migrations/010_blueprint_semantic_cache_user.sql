@@ -0,0 +1,7 @@
+-- Semantic cache entries are scoped to the user whose run produced them
+-- (db.blueprint_semantic_cache.user_id, NULL for anonymous runs). Existing rows have no
+-- known owner and were shared across all users; it's a cache, so drop them.
+DELETE FROM blueprint_semantic_cache;
+
+ALTER TABLE blueprint_semantic_cache
+    ADD COLUMN IF NOT EXISTS user_id TEXT;
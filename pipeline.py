@@ -0,0 +1,83 @@
+import asyncio
+import functools
+from metrics import track_agent
+from utils.compaction import compact_inputs
+from agents.research_agent import ResearchAgent
+from agents.feature_parser_agent import FeatureParserAgent
+from agents.architecture_planner_agent import ArchitecturePlannerAgent
+from agents.tech_stack_selector_agent import TechStackSelectorAgent
+from agents.security_infra_agent import SecurityInfraAgent
+
+
+class Stage:
+    def __init__(self, key: str, agent_name: str, agent_cls, inputs: list):
+        self.key = key                  # name of the output this stage produces
+        self.agent_name = agent_name
+        self.agent_cls = agent_cls
+        self.inputs = inputs            # keys this stage's agent.run() takes, in order
+        self._agent = None
+
+    @property
+    def agent(self):
+        # Agents are stateless: one instance per stage for the life of the process
+        if self._agent is None:
+            self._agent = self.agent_cls()
+        return self._agent
+
+
+# Each agent declares which upstream outputs it needs; "product_idea" is the pipeline input
+BLUEPRINT_STAGES = [
+    Stage("research_summary", "ResearchAgent", ResearchAgent, ["product_idea"]),
+    Stage("parsed_features", "FeatureParserAgent", FeatureParserAgent, ["research_summary"]),
+    Stage("architecture_plan", "ArchitecturePlannerAgent", ArchitecturePlannerAgent, ["parsed_features"]),
+    Stage("tech_stack", "TechStackSelectorAgent", TechStackSelectorAgent, ["architecture_plan"]),
+    Stage("security_recommendations", "SecurityInfraAgent", SecurityInfraAgent, ["architecture_plan"]),
+]
+
+
+async def _run_stage(stage: Stage, results: dict, on_delta=None) -> str:
+    agent = stage.agent
+    stage_on_delta = functools.partial(on_delta, stage) if on_delta else None
+    with track_agent(stage.agent_name):
+        # Upstream outputs are held to the agent's input budget; the raw product idea is passed as-is
+        upstream = [name for name in stage.inputs if name != "product_idea"]
+        inputs = dict(zip(upstream, await compact_inputs(stage.agent_name, [results[name] for name in upstream])))
+        return await agent.run(*[inputs.get(name, results[name]) for name in stage.inputs], on_delta=stage_on_delta)
+
+
+# Starts every stage whose inputs are ready, concurrently, and yields (stage, output) in completion order.
+# If on_delta is given, completions are token-streamed and on_delta(stage, text) is called per delta.
+# Stages whose output is already in `completed` (a resumed run) are skipped and not yielded.
+async def iter_pipeline(product_idea: str, stages: list = BLUEPRINT_STAGES, on_delta=None, completed: dict = None):
+    results = {**(completed or {}), "product_idea": product_idea}
+    remaining = [stage for stage in stages if stage.key not in results]
+    running = {}
+    try:
+        while remaining or running:
+            for stage in [s for s in remaining if all(name in results for name in s.inputs)]:
+                remaining.remove(stage)
+                running[asyncio.ensure_future(_run_stage(stage, results, on_delta))] = stage
+            if not running:
+                missing = {name for s in remaining for name in s.inputs if name not in results}
+                raise ValueError(f"Pipeline stages have unsatisfiable inputs: {sorted(missing)}")
+
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            # Every stage that succeeded in this round is yielded (and so checkpointed) before a
+            # sibling's failure is raised
+            finished, error = [], None
+            for task in done:
+                stage = running.pop(task)
+                if task.exception() is not None:
+                    error = error or task.exception()
+                    continue
+                results[stage.key] = task.result()
+                finished.append(stage)
+            for stage in finished:
+                yield stage, results[stage.key]
+            if error is not None:
+                raise error
+    finally:
+        # A failed stage (or a consumer that stops early) must not leave siblings running
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
@@ -0,0 +1,189 @@
+import time
+import uuid
+import asyncio
+from collections import deque, OrderedDict
+
+
+def normalize_key(title: str) -> str:
+    # "  Uber for Dogs " and "uber for   dogs" are the same blueprint request
+    return " ".join(title.lower().split())
+
+
+class SingleFlight:
+    # Coalesces concurrent calls with the same key onto one running task. With
+    # cancel_abandoned=True the task is cancelled once its last waiter is cancelled,
+    # so nobody keeps paying for a result no one will read.
+    def __init__(self, cancel_abandoned: bool = False):
+        self.cancel_abandoned = cancel_abandoned
+        self.abandoned = 0
+        self._calls = {}
+        self._waiters = {}  # task -> callers currently awaiting it
+
+    async def do(self, key: str, fn):
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            self._waiters[task] = 0
+            task.add_done_callback(lambda t: self._forget(key, t))
+        self._waiters[task] += 1
+        try:
+            # Shielded so one caller going away doesn't cancel the result everyone else is waiting on
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self.cancel_abandoned and self._waiters.get(task) == 1 and not task.done():
+                self.abandoned += 1
+                task.cancel()
+                # A caller arriving now starts a fresh flight instead of joining the cancelled one
+                self._forget(key, task)
+            raise
+        finally:
+            if task in self._waiters:
+                self._waiters[task] -= 1
+
+    def _forget(self, key: str, task):
+        self._waiters.pop(task, None)
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+    def __len__(self):
+        return len(self._calls)
+
+
+class Gap:
+    # Yielded by Broadcast.subscribe() in place of events that already fell out of the log
+    def __init__(self, missed: int):
+        self.missed = missed
+
+
+class Broadcast:
+    # Pumps one async event source into a bounded log. Events get consecutive sequence numbers;
+    # any number of subscribers can read from the start or resume after a given sequence number.
+    # With idle_timeout set, the source is cancelled once it has had no subscribers for that long.
+    def __init__(self, source, stream_id: str = None, max_events: int = None, idle_timeout: float = None, on_abandon=None):
+        self.id = stream_id or str(uuid.uuid4())
+        self.events = deque(maxlen=max_events)
+        self.first_seq = 0      # sequence number of events[0]
+        self.next_seq = 0
+        self.done = False
+        self.abandoned = False
+        self.finished_at = None
+        self.subscribers = 0
+        self.idle_timeout = idle_timeout
+        self._on_abandon = on_abandon
+        self._idle_handle = None
+        self._changed = asyncio.Condition()
+        self.task = asyncio.ensure_future(self._pump(source))
+        if idle_timeout is not None:
+            # Covers a client that went away before it ever subscribed
+            self._idle_handle = asyncio.get_running_loop().call_later(idle_timeout, self._abandon_if_idle)
+
+    async def _pump(self, source):
+        try:
+            async for event in source:
+                if self.events.maxlen is not None and len(self.events) == self.events.maxlen:
+                    self.first_seq += 1
+                self.events.append(event)
+                self.next_seq += 1
+                async with self._changed:
+                    self._changed.notify_all()
+        finally:
+            # Also runs on cancellation: close the source so its own cleanup (e.g. cancelling
+            # in-flight LLM requests) happens now rather than at garbage collection
+            await source.aclose()
+            self.done = True
+            self.finished_at = time.monotonic()
+            async with self._changed:
+                self._changed.notify_all()
+
+    async def subscribe(self, after: int = -1):
+        # Yields (seq, event) for every event after `after`, then follows live events until the source ends
+        seq = after + 1
+        self.subscribers += 1
+        if self._idle_handle is not None:
+            self._idle_handle.cancel()
+            self._idle_handle = None
+        try:
+            while True:
+                async with self._changed:
+                    await self._changed.wait_for(lambda: seq < self.next_seq or self.done)
+                if seq < self.first_seq:
+                    yield None, Gap(self.first_seq - seq)
+                    seq = self.first_seq
+                while seq < self.next_seq:
+                    yield seq, self.events[seq - self.first_seq]
+                    seq += 1
+                if self.done and seq >= self.next_seq:
+                    return
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.done and self.idle_timeout is not None:
+                self._idle_handle = asyncio.get_running_loop().call_later(self.idle_timeout, self._abandon_if_idle)
+
+    def _abandon_if_idle(self):
+        self._idle_handle = None
+        if self.subscribers == 0 and not self.done:
+            self.abandoned = True
+            self.task.cancel()
+            if self._on_abandon is not None:
+                self._on_abandon(self)
+
+
+class StreamFlight:
+    # Single-flight for event streams: later callers with the same key attach to the running
+    # broadcast. Broadcasts stay reachable by id until `retention_seconds` after they finish,
+    # so a dropped client can reattach and replay what it missed.
+    # With idle_timeout set, a broadcast nobody is subscribed to for that long is cancelled.
+    def __init__(self, retention_seconds: float = 0, max_retained: int = 1000, max_events: int = None, idle_timeout: float = None):
+        self.retention_seconds = retention_seconds
+        self.max_retained = max_retained
+        self.max_events = max_events
+        self.idle_timeout = idle_timeout
+        self.abandoned = 0
+        self._running = {}              # coalescing key -> running broadcast
+        self._by_id = OrderedDict()     # stream id -> broadcast (running or retained)
+
+    def start(self, key: str, source_factory) -> Broadcast:
+        # source_factory(stream_id) builds the event source for a new broadcast
+        broadcast = self._running.get(key)
+        if broadcast is None:
+            self._expire()
+            stream_id = str(uuid.uuid4())
+            broadcast = Broadcast(
+                source_factory(stream_id), stream_id,
+                max_events=self.max_events, idle_timeout=self.idle_timeout, on_abandon=self._abandoned,
+            )
+            self._running[key] = broadcast
+            self._by_id[broadcast.id] = broadcast
+            broadcast.task.add_done_callback(lambda t: self._forget(key, broadcast))
+        return broadcast
+
+    def get(self, stream_id: str):
+        self._expire()
+        return self._by_id.get(stream_id)
+
+    def _abandoned(self, broadcast):
+        self.abandoned += 1
+
+    def _forget(self, key: str, broadcast):
+        if self._running.get(key) is broadcast:
+            del self._running[key]
+        if self.retention_seconds <= 0:
+            self._by_id.pop(broadcast.id, None)
+
+    def _expire(self):
+        now = time.monotonic()
+        finished = [b for b in self._by_id.values() if b.done]
+        for broadcast in finished:
+            if now - broadcast.finished_at >= self.retention_seconds:
+                del self._by_id[broadcast.id]
+        # Over the cap: drop the oldest finished streams first
+        overflow = len(self._by_id) - self.max_retained
+        for broadcast in [b for b in finished if b.id in self._by_id][:max(0, overflow)]:
+            del self._by_id[broadcast.id]
+
+    def retained(self) -> int:
+        return len(self._by_id)
+
+    def __len__(self):
+        return len(self._running)
@@ -1,52 +1,156 @@
-from fastapi.responses import StreamingResponse
+import os
 import json
-import time
+import asyncio
+from pipeline import BLUEPRINT_STAGES
+from checkpoints import iter_checkpointed_pipeline, new_run_id
+from singleflight import StreamFlight, Gap, normalize_key
+
+# Events kept per stream for Last-Event-ID replay (older ones are reported as a gap)
+STREAM_EVENT_LOG_SIZE = int(os.getenv("STREAM_EVENT_LOG_SIZE", "10000"))
+# How long a finished stream can still be reattached to and replayed
+STREAM_RETENTION_SECONDS = float(os.getenv("STREAM_RETENTION_SECONDS", "300"))
+STREAM_MAX_RETAINED = int(os.getenv("STREAM_MAX_RETAINED", "1000"))
+# A run with no connected subscriber for this long is cancelled (pending LLM calls included);
+# the grace period leaves room for a Last-Event-ID reconnect
+STREAM_ABANDON_AFTER_SECONDS = float(os.getenv("STREAM_ABANDON_AFTER_SECONDS", "15"))
+# How often a subscriber checks whether its client is still connected while waiting for events
+STREAM_DISCONNECT_POLL_SECONDS = float(os.getenv("STREAM_DISCONNECT_POLL_SECONDS", "1.0"))
+
+stats = {"disconnects": 0}
+
+STREAM_END = "STREAM_END"
 
 # Utility to format as SSE
-def sse_format(data: dict):
-    return f"data: {json.dumps(data)}\n\n"
+def sse_format(data, event_id: str = None):
+    payload = data if isinstance(data, str) else json.dumps(data)
+    prefix = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{prefix}data: {payload}\n\n"
+
+_DONE = object()
 
-def stream_blueprint_ai(product_idea: str):
-    from agents.research_agent import ResearchAgent
-    from agents.feature_parser_agent import FeatureParserAgent
-    from agents.architecture_planner_agent import ArchitecturePlannerAgent
-    from agents.tech_stack_selector_agent import TechStackSelectorAgent
-    from agents.security_infra_agent import SecurityInfraAgent
+async def stream_blueprint_ai(product_idea: str, run_id: str = None, completed: dict = None, stream_id: str = None):
+    # Stages run concurrently and push token deltas into the queue as they arrive;
+    # this generator just drains it, so the first token reaches the client immediately.
+    # Every stage is checkpointed under run_id; after an error the client can resume the run.
+    run_id = run_id or new_run_id()
+    queue = asyncio.Queue()
+    seqs = {}
 
+    def on_delta(stage, delta: str):
+        seq = seqs.get(stage.agent_name, 0)
+        seqs[stage.agent_name] = seq + 1
+        queue.put_nowait({"type": "delta", "agent_name": stage.agent_name, "seq": seq, "delta": delta})
+
+    async def produce():
+        try:
+            async for stage, output in iter_checkpointed_pipeline(run_id, None, product_idea, completed, on_delta=on_delta):
+                queue.put_nowait({"type": "complete", "agent_name": stage.agent_name, "output": output})
+        except Exception as e:
+            queue.put_nowait({"type": "error", "agent_name": "Error", "output": str(e), "run_id": run_id})
+        finally:
+            queue.put_nowait(_DONE)
+
+    yield {"type": "run", "run_id": run_id, "stream_id": stream_id}
+    # A resumed run first replays the stages that were already done
+    for stage in BLUEPRINT_STAGES:
+        if completed and stage.key in completed:
+            yield {"type": "complete", "agent_name": stage.agent_name, "output": completed[stage.key]}
+
+    producer = asyncio.ensure_future(produce())
     try:
-        # 1. Research Agent
-        research_agent = ResearchAgent()
-        research_summary = research_agent.run(product_idea)
-        yield sse_format({"agent_name": "ResearchAgent", "output": research_summary})
-        time.sleep(0.2)
-
-        # 2. Feature Parser Agent
-        feature_parser = FeatureParserAgent()
-        parsed_features = feature_parser.run(research_summary)
-        yield sse_format({"agent_name": "FeatureParserAgent", "output": parsed_features})
-        time.sleep(0.2)
-
-        # 3. Architecture Planner Agent
-        architecture_planner = ArchitecturePlannerAgent()
-        architecture_plan = architecture_planner.run(parsed_features)
-        yield sse_format({"agent_name": "ArchitecturePlannerAgent", "output": architecture_plan})
-        time.sleep(0.2)
-
-        # 4. Tech Stack Selector Agent
-        tech_stack_selector = TechStackSelectorAgent()
-        tech_stack = tech_stack_selector.run(architecture_plan)
-        yield sse_format({"agent_name": "TechStackSelectorAgent", "output": tech_stack})
-        time.sleep(0.2)
-
-        # 5. Security & Infra Expert Agent
-        security_infra_agent = SecurityInfraAgent()
-        security_recommendations = security_infra_agent.run(architecture_plan)
-        yield sse_format({"agent_name": "SecurityInfraAgent", "output": security_recommendations})
-        time.sleep(0.2)
+        while True:
+            event = await queue.get()
+            if event is _DONE:
+                break
+            yield event
 
         # End of stream
-        yield "data: STREAM_END\n\n"
-    except Exception as e:
-        # Send error as SSE
-        yield sse_format({"agent_name": "Error", "output": str(e)})
-        yield "data: STREAM_END\n\n"
+        yield STREAM_END
+    finally:
+        producer.cancel()
+
+# Identical in-flight stream requests share one pipeline run; finished runs stay replayable for a while
+stream_flight = StreamFlight(
+    retention_seconds=STREAM_RETENTION_SECONDS,
+    max_retained=STREAM_MAX_RETAINED,
+    max_events=STREAM_EVENT_LOG_SIZE,
+    idle_timeout=STREAM_ABANDON_AFTER_SECONDS,
+)
+
+def parse_event_id(value: str):
+    # SSE ids are "<stream_id>:<seq>"
+    stream_id, _, seq = (value or "").strip().rpartition(":")
+    if not stream_id or not seq.isdigit():
+        return None
+    return stream_id, int(seq)
+
+async def sse_stream(broadcast, after: int = -1, request=None):
+    # While waiting for the next event, polls request.is_disconnected(): a client that went away
+    # unsubscribes right away instead of at the next write, which may be a long LLM call later
+    events = broadcast.subscribe(after)
+    next_event = None
+    finished = False
+    try:
+        while True:
+            next_event = asyncio.ensure_future(events.__anext__())
+            while request is not None and not next_event.done():
+                await asyncio.wait({next_event}, timeout=STREAM_DISCONNECT_POLL_SECONDS)
+                if not next_event.done() and await request.is_disconnected():
+                    return
+            try:
+                seq, event = await next_event
+            except StopAsyncIteration:
+                break
+            if isinstance(event, Gap):
+                yield sse_format({"type": "gap", "missed": event.missed})
+                continue
+            yield sse_format(event, event_id=f"{broadcast.id}:{seq}")
+        finished = True
+        if broadcast.abandoned:
+            # Replay of a run that was cancelled for lack of subscribers; resume it from its checkpoints
+            yield sse_format({"type": "cancelled"})
+    finally:
+        # Left before the end: our own poll saw the disconnect, or the server cancelled/closed us
+        # (Starlette cancels the response task on http.disconnect)
+        if not finished:
+            stats["disconnects"] += 1
+        # The subscription can't be closed while next_event is still running it
+        if next_event is not None and not next_event.done():
+            next_event.cancel()
+            await asyncio.gather(next_event, return_exceptions=True)
+        await events.aclose()
+
+def attach_stream(stream_id: str, last_event_id: str = None, request=None):
+    # (stream_id, SSE generator) replaying after Last-Event-ID, or None if the stream is unknown/expired
+    broadcast = stream_flight.get(stream_id)
+    if broadcast is None:
+        return None
+    position = parse_event_id(last_event_id)
+    after = position[1] if position and position[0] == stream_id else -1
+    return broadcast.id, sse_stream(broadcast, after, request)
+
+def shared_stream_blueprint_ai(product_idea: str, last_event_id: str = None, request=None):
+    # A reconnect carrying Last-Event-ID picks up its own stream instead of starting a new run
+    position = parse_event_id(last_event_id)
+    if position is not None:
+        attached = attach_stream(position[0], last_event_id, request)
+        if attached is not None:
+            return attached
+    broadcast = stream_flight.start(
+        normalize_key(product_idea), lambda stream_id: stream_blueprint_ai(product_idea, stream_id=stream_id)
+    )
+    return broadcast.id, sse_stream(broadcast, request=request)
+
+def resume_stream_blueprint_ai(run_id: str, product_idea: str, completed: dict, request=None):
+    broadcast = stream_flight.start(
+        f"resume:{run_id}", lambda stream_id: stream_blueprint_ai(product_idea, run_id, completed, stream_id)
+    )
+    return broadcast.id, sse_stream(broadcast, request=request)
+
+def stream_stats() -> dict:
+    return {
+        **stats,
+        "running": len(stream_flight),
+        "retained": stream_flight.retained(),
+        "cancelled_runs": stream_flight.abandoned,
+    }
@@ -0,0 +1,23 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The app modules are flat top-level files; db.py reads DATABASE_URL at import time.
+# Tests run on SQLite through aiosqlite: pip install -r requirements-dev.txt
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+TEST_DB_PATH = os.path.join(tempfile.mkdtemp(prefix="blueprint-tests-"), "test.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{TEST_DB_PATH}")
+
+
+@pytest.fixture
+def sqlite_db():
+    # Fresh tables for each test; connect to db.database inside the test's own event loop
+    import sqlalchemy
+    import db
+    engine = sqlalchemy.create_engine(f"sqlite:///{TEST_DB_PATH}")
+    db.metadata.drop_all(engine)
+    db.metadata.create_all(engine)
+    engine.dispose()
+    return db.database
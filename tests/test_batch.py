@@ -0,0 +1,31 @@
+import asyncio
+import json
+from batch import iter_blueprint_batch
+from singleflight import SingleFlight
+
+
+def test_closing_the_stream_cancels_unfinished_pipelines():
+    started, cancelled = [], []
+
+    async def pipeline(title):
+        started.append(title)
+        try:
+            if title == "quick":
+                return {"error": "failed fast"}
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(title)
+            raise
+
+    async def run():
+        flight = SingleFlight(cancel_abandoned=True)
+        lines = iter_blueprint_batch("u1", ["quick", "slow-1", "slow-2"], lambda t: flight.do(t, lambda: pipeline(t)), 3)
+        first = json.loads(await lines.__anext__())
+        # The client goes away after the first line
+        await lines.aclose()
+        return first
+
+    first = asyncio.run(run())
+    assert first["status"] == "failed"
+    assert sorted(started) == ["quick", "slow-1", "slow-2"]
+    assert sorted(cancelled) == ["slow-1", "slow-2"]
@@ -0,0 +1,33 @@
+import asyncio
+import json
+import sqlite3
+import chat_store
+from chat_store import append_messages
+from conftest import TEST_DB_PATH
+
+
+def test_first_append_that_loses_the_insert_race_appends_instead(sqlite_db, monkeypatch):
+    # A concurrent first append creates the row between our existence check and our insert
+    summarize = chat_store.summarize_messages
+    raced = []
+
+    def summarize_after_concurrent_insert(messages):
+        if not raced:
+            raced.append(True)
+            with sqlite3.connect(TEST_DB_PATH) as conn:
+                conn.execute(
+                    "INSERT INTO chat (id, user_id, messages, version) VALUES (?, ?, ?, 1)",
+                    ("chat-1", "u1", json.dumps([{"role": "user", "content": "winner"}])),
+                )
+        return summarize(messages)
+
+    monkeypatch.setattr(chat_store, "summarize_messages", summarize_after_concurrent_insert)
+
+    async def run():
+        await sqlite_db.connect()
+        try:
+            return await append_messages("chat-1", "u1", [{"role": "user", "content": "loser"}])
+        finally:
+            await sqlite_db.disconnect()
+
+    assert asyncio.run(run()) == (2, 2)
@@ -0,0 +1,28 @@
+import asyncio
+from utils import compaction
+from utils.routing import DEFAULT_ROUTES, LLM_DEFAULT_MAX_TOKENS
+
+
+def full_length_output(max_tokens: int) -> str:
+    line = "- The service keeps a per-tenant audit log of every change. "
+    return "## Plan\n" + "\n".join([line] * (max_tokens * compaction.CHARS_PER_TOKEN // len(line)))
+
+
+def test_compaction_is_opt_in(monkeypatch):
+    text = full_length_output(LLM_DEFAULT_MAX_TOKENS)
+    monkeypatch.setattr(compaction, "COMPACTION_DEFAULT_BUDGET", 100)
+    assert asyncio.run(compaction.compact_inputs("SecurityInfraAgent", [text])) == [text]
+
+
+def test_default_budget_keeps_a_full_length_upstream_output(monkeypatch):
+    monkeypatch.setattr(compaction, "COMPACTION_ENABLED", True)
+    largest = max([LLM_DEFAULT_MAX_TOKENS, *(route["max_tokens"] for route in DEFAULT_ROUTES.values())])
+    text = full_length_output(largest)
+    assert asyncio.run(compaction.compact_inputs("SecurityInfraAgent", [text])) == [text]
+
+
+def test_runaway_output_is_compacted_when_enabled(monkeypatch):
+    monkeypatch.setattr(compaction, "COMPACTION_ENABLED", True)
+    text = full_length_output(4 * compaction.COMPACTION_DEFAULT_BUDGET)
+    [compacted] = asyncio.run(compaction.compact_inputs("SecurityInfraAgent", [text]))
+    assert compaction.estimate_tokens(compacted) <= compaction.COMPACTION_DEFAULT_BUDGET
@@ -0,0 +1,91 @@
+import asyncio
+import zlib
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+from utils.compression import CompressionMiddleware
+
+
+def make_app(gate: asyncio.Event):
+    async def events():
+        yield "data: first\n\n"
+        await gate.wait()
+        yield "data: second\n\n"
+
+    routes = [
+        Route("/sse", lambda request: StreamingResponse(events(), media_type="text/event-stream")),
+        Route("/big", lambda request: PlainTextResponse("blueprint " * 500)),
+        Route("/small", lambda request: PlainTextResponse("ok")),
+        Route("/png", lambda request: PlainTextResponse("x" * 5000, media_type="image/png")),
+    ]
+    return CompressionMiddleware(Starlette(routes=routes), minimum_size=1024)
+
+
+def scope_for(path: str, accept_encoding: str = "gzip") -> dict:
+    return {
+        "type": "http", "asgi": {"version": "3.0", "spec_version": "2.4"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "root_path": "", "headers": [(b"accept-encoding", accept_encoding.encode())],
+        "client": ("127.0.0.1", 1), "server": ("testserver", 80),
+    }
+
+
+async def receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+def request(path: str, accept_encoding: str = "gzip"):
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    async def run():
+        await make_app(asyncio.Event())(scope_for(path, accept_encoding), receive, send)
+
+    asyncio.run(run())
+    headers = {k.decode(): v.decode() for k, v in sent[0]["headers"]}
+    return headers, b"".join(m.get("body", b"") for m in sent[1:])
+
+
+def test_sse_events_are_flushed_as_they_are_produced():
+    async def run():
+        gate = asyncio.Event()
+        sent = []
+        first_chunk = asyncio.Event()
+
+        async def send(message):
+            sent.append(message)
+            if message["type"] == "http.response.body" and message.get("body"):
+                first_chunk.set()
+
+        task = asyncio.ensure_future(make_app(gate)(scope_for("/sse"), receive, send))
+        # The second event is still blocked; the first must already be on the wire, decodable
+        await asyncio.wait_for(first_chunk.wait(), 1)
+        decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        before_gate = decoder.decompress(b"".join(m.get("body", b"") for m in sent[1:]))
+        gate.set()
+        await asyncio.wait_for(task, 1)
+        rest = decoder.decompress(b"".join(m.get("body", b"") for m in sent[2:])) + decoder.flush()
+        return sent[0], before_gate, rest
+
+    start, before_gate, rest = asyncio.run(run())
+    headers = {k.decode(): v.decode() for k, v in start["headers"]}
+    assert headers["content-encoding"] == "gzip" and "content-length" not in headers
+    assert before_gate == b"data: first\n\n"
+    assert rest == b"data: second\n\n"
+
+
+def test_large_response_is_gzipped_with_its_compressed_length():
+    headers, body = request("/big")
+    assert headers["content-encoding"] == "gzip"
+    assert headers["vary"] == "Accept-Encoding"
+    assert int(headers["content-length"]) == len(body)
+    assert zlib.decompress(body, 16 + zlib.MAX_WBITS) == b"blueprint " * 500
+
+
+def test_small_excluded_and_unrequested_responses_are_left_alone():
+    for path, accept_encoding in (("/small", "gzip"), ("/png", "gzip"), ("/big", "identity"), ("/big", "gzip;q=0")):
+        headers, body = request(path, accept_encoding)
+        assert "content-encoding" not in headers
+        assert int(headers["content-length"]) == len(body)
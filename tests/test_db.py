@@ -0,0 +1,35 @@
+import asyncio
+
+
+def test_cancelling_a_task_mid_query_is_never_lost(sqlite_db):
+    # Cancels land at every point of the query path, including right as a pool slot is acquired
+    async def run():
+        await sqlite_db.connect()
+        lost = 0
+        try:
+            for i in range(300):
+                stop = []
+
+                async def querying():
+                    # Stops by itself if its cancellation was lost, so the test fails rather than hangs
+                    while not stop:
+                        await sqlite_db.fetch_one("SELECT 1")
+
+                task = asyncio.ensure_future(querying())
+                for _ in range(i % 13):
+                    await asyncio.sleep(0)
+                task.cancel()
+                await asyncio.wait({task}, timeout=1)
+                if not task.cancelled():
+                    lost += 1
+                    stop.append(True)
+                    await asyncio.gather(task, return_exceptions=True)
+            return lost, sqlite_db.in_use, sqlite_db._slots._value
+        finally:
+            # aiosqlite threads of cancelled queries still report back to this loop
+            await asyncio.sleep(0.2)
+            await sqlite_db.disconnect()
+
+    lost, in_use, free_slots = asyncio.run(run())
+    assert lost == 0
+    assert in_use == 0 and free_slots == sqlite_db.max_size
@@ -0,0 +1,131 @@
+import asyncio
+import datetime
+import jobs
+from db import blueprint_job
+from jobs import JobQueue, MemoryJobStore, PostgresJobStore, new_job
+
+
+def test_expired_lease_is_claimed_again(sqlite_db):
+    # The claim query is plain UPDATE ... RETURNING; SQLite ignores FOR UPDATE SKIP LOCKED
+    async def run():
+        await sqlite_db.connect()
+        try:
+            store = PostgresJobStore(poll_seconds=0.01, lease_seconds=60)
+            job = new_job("u1", "idea")
+            await store.create(job)
+            claimed = await store.claim()
+            assert claimed["id"] == job["id"] and claimed["status"] == "running"
+            assert claimed["lease_expires_at"] is not None
+
+            # Leased: nobody else gets it
+            try:
+                await asyncio.wait_for(store.claim(), timeout=0.1)
+                raise AssertionError("claimed a job with a live lease")
+            except asyncio.TimeoutError:
+                pass
+
+            # The worker died and stopped renewing
+            expired = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=1)
+            await sqlite_db.execute(blueprint_job.update().values(lease_expires_at=expired))
+            reclaimed = await asyncio.wait_for(store.claim(), timeout=1)
+            assert reclaimed["id"] == job["id"]
+            assert reclaimed["version"] == claimed["version"] + 1
+        finally:
+            await sqlite_db.disconnect()
+
+    asyncio.run(run())
+
+
+def test_job_resumes_from_checkpoints(monkeypatch):
+    calls = {}
+
+    async def fake_load_run(run_id):
+        return {"user_id": "u1", "product_idea": "idea", "outputs": {"research_summary": "research"}}
+
+    async def fake_pipeline(run_id, user_id, product_idea, completed=None):
+        calls["run_id"], calls["completed"] = run_id, completed
+        yield type("Stage", (), {"key": "parsed_features"}), "features"
+
+    async def fake_save(user_id, title, outputs):
+        calls["saved"] = outputs
+        return {"id": "chat-1"}
+
+    monkeypatch.setattr(jobs, "load_run", fake_load_run)
+    monkeypatch.setattr(jobs, "iter_checkpointed_pipeline", fake_pipeline)
+    monkeypatch.setattr(jobs, "save_blueprint_chat", fake_save)
+
+    async def run():
+        queue = JobQueue(MemoryJobStore(), concurrency=1)
+        queue.start()
+        try:
+            job = await queue.submit("u1", "idea")
+            async for snapshot in queue.events(job["id"]):
+                pass
+            return job, snapshot
+        finally:
+            await queue.stop()
+
+    job, final = asyncio.run(run())
+    assert calls["run_id"] == job["id"]
+    assert calls["completed"] == {"research_summary": "research"}
+    assert calls["saved"] == {"research_summary": "research", "parsed_features": "features"}
+    assert final["status"] == "succeeded" and final["chat_id"] == "chat-1"
+
+
+def test_shutdown_requeues_the_job_and_the_lease_is_kept_alive(monkeypatch, sqlite_db):
+    release = asyncio.Event()
+    runs = []
+
+    async def fake_load_run(run_id):
+        return None
+
+    async def fake_pipeline(run_id, user_id, product_idea, completed=None):
+        runs.append(run_id)
+        if len(runs) == 1:
+            await asyncio.sleep(10)
+        await release.wait()
+        yield type("Stage", (), {"key": "research_summary"}), "research"
+
+    async def fake_save(user_id, title, outputs):
+        return {"id": "chat-1"}
+
+    monkeypatch.setattr(jobs, "load_run", fake_load_run)
+    monkeypatch.setattr(jobs, "iter_checkpointed_pipeline", fake_pipeline)
+    monkeypatch.setattr(jobs, "save_blueprint_chat", fake_save)
+
+    def utcnow():
+        return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+    async def run():
+        await sqlite_db.connect()
+        try:
+            # Heartbeats follow the store's lease, not BLUEPRINT_JOB_LEASE_SECONDS
+            store = PostgresJobStore(poll_seconds=0.01, lease_seconds=0.15)
+            queue = JobQueue(store, concurrency=1)
+            queue.start()
+            job = await queue.submit("u1", "idea")
+            await asyncio.sleep(0.4)
+            running = await store.get(job["id"])
+            assert running["status"] == "running"
+            assert running["lease_expires_at"].replace(tzinfo=None) > utcnow()
+
+            await queue.stop()
+            requeued = await store.get(job["id"])
+            assert requeued["status"] == "queued" and requeued["lease_expires_at"] is None
+
+            # Another instance picks it up straight away
+            other = JobQueue(PostgresJobStore(poll_seconds=0.01, lease_seconds=60), concurrency=1)
+            other.start()
+            try:
+                release.set()
+                async for snapshot in other.events(job["id"]):
+                    pass
+            finally:
+                await other.stop()
+            return job, snapshot
+        finally:
+            await sqlite_db.disconnect()
+
+    job, final = asyncio.run(run())
+    assert runs == [job["id"], job["id"]]
+    assert final["status"] == "succeeded" and final["chat_id"] == "chat-1"
@@ -0,0 +1,90 @@
+import asyncio
+import json
+import httpx
+import pytest
+from utils import llm, routing
+
+AGENT = "ResearchAgent"
+ROUTE = routing.Route("slow-model", 64, fallbacks=[], hedge_model="fast-model")
+
+
+@pytest.fixture
+def hedging(monkeypatch):
+    # Hedge after 20 ms: enough p95 samples, no budget cap
+    monkeypatch.setattr(routing, "LLM_HEDGING_ENABLED", True)
+    monkeypatch.setattr(routing, "LLM_HEDGE_MIN_DELAY_SECONDS", 0.02)
+    monkeypatch.setattr(routing, "LLM_HEDGE_MAX_RATIO", 1.0)
+    monkeypatch.setattr(routing, "stats", {**routing.stats, "calls": 1, "hedges": 0, "hedge_wins": 0})
+    tracker = routing.LatencyTracker()
+    for kind in ("complete", "first_token"):
+        for _ in range(routing.LLM_HEDGE_MIN_SAMPLES):
+            tracker.observe((AGENT, "slow-model", kind), 0.01)
+    monkeypatch.setattr(routing, "latency", tracker)
+
+
+class FakeUpstream:
+    # Together chat/completions stand-in; `delays` is seconds before each model starts answering
+    def __init__(self, delays: dict):
+        self.delays = delays
+        self.requests = []
+        self.cancelled = []
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        model = body["model"]
+        self.requests.append(model)
+        try:
+            await asyncio.sleep(self.delays[model])
+        except asyncio.CancelledError:
+            self.cancelled.append(model)
+            raise
+        text = f"answer from {model}"
+        if not body.get("stream"):
+            return httpx.Response(200, json={"choices": [{"message": {"content": text}}]})
+        chunks = [{"choices": [{"delta": {"content": word + " "}}]} for word in text.split()]
+        lines = [f"data: {json.dumps(chunk)}\n\n" for chunk in chunks] + ["data: [DONE]\n\n"]
+        return httpx.Response(200, content="".join(lines).encode(), headers={"content-type": "text/event-stream"})
+
+
+def call(upstream: FakeUpstream, on_delta=None):
+    async def run():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(upstream.handle))
+        previous, llm._client = llm._client, client
+        try:
+            return await llm._call_hedged(AGENT, ROUTE, {}, ROUTE.request("slow-model", "idea"), on_delta)
+        finally:
+            llm._client = previous
+            await client.aclose()
+    return asyncio.run(run())
+
+
+def test_hedge_wins_a_complete_call_and_the_original_is_cancelled(hedging):
+    upstream = FakeUpstream({"slow-model": 5, "fast-model": 0})
+    assert call(upstream) == "answer from fast-model"
+    assert upstream.requests == ["slow-model", "fast-model"]
+    assert upstream.cancelled == ["slow-model"]
+    assert routing.stats["hedges"] == 1 and routing.stats["hedge_wins"] == 1
+
+
+def test_hedge_wins_a_stream_and_only_its_deltas_are_forwarded(hedging):
+    upstream = FakeUpstream({"slow-model": 5, "fast-model": 0})
+    deltas = []
+    assert call(upstream, deltas.append).split() == ["answer", "from", "fast-model"]
+    assert "".join(deltas).split() == ["answer", "from", "fast-model"]
+    assert upstream.cancelled == ["slow-model"]
+    assert routing.stats["hedge_wins"] == 1
+
+
+def test_original_that_answers_first_cancels_the_hedge(hedging):
+    upstream = FakeUpstream({"slow-model": 0.06, "fast-model": 5})
+    assert call(upstream) == "answer from slow-model"
+    assert upstream.requests == ["slow-model", "fast-model"]
+    assert upstream.cancelled == ["fast-model"]
+    assert routing.stats["hedges"] == 1 and routing.stats["hedge_wins"] == 0
+
+
+def test_no_hedge_without_enough_latency_samples(hedging, monkeypatch):
+    monkeypatch.setattr(routing, "latency", routing.LatencyTracker())
+    upstream = FakeUpstream({"slow-model": 0.06, "fast-model": 0})
+    assert call(upstream) == "answer from slow-model"
+    assert upstream.requests == ["slow-model"]
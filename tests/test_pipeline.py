@@ -0,0 +1,46 @@
+import asyncio
+import pytest
+from pipeline import Stage, iter_pipeline
+
+
+class FastAgent:
+    async def run(self, product_idea, on_delta=None):
+        return f"fast:{product_idea}"
+
+
+class FailingAgent:
+    async def run(self, product_idea, on_delta=None):
+        raise RuntimeError("stage failed")
+
+
+class SlowAgent:
+    cancelled = False
+
+    async def run(self, product_idea, on_delta=None):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            SlowAgent.cancelled = True
+            raise
+
+
+def test_successful_siblings_are_yielded_before_a_failure_is_raised():
+    stages = [
+        Stage("fast", "FastAgent", FastAgent, ["product_idea"]),
+        Stage("failing", "FailingAgent", FailingAgent, ["product_idea"]),
+        Stage("slow", "SlowAgent", SlowAgent, ["product_idea"]),
+    ]
+
+    async def run():
+        yielded = []
+        with pytest.raises(RuntimeError, match="stage failed"):
+            async for stage, output in iter_pipeline("idea", stages):
+                yielded.append((stage.key, output))
+        # The still-running sibling was cancelled and awaited before the generator finished
+        assert SlowAgent.cancelled
+        return yielded
+
+    # fast and failing finish in the same round; the done set's iteration order varies
+    for _ in range(20):
+        SlowAgent.cancelled = False
+        assert asyncio.run(run()) == [("fast", "fast:idea")]
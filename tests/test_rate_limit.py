@@ -0,0 +1,108 @@
+import asyncio
+import pytest
+from utils.rate_limit import AdaptiveLimiter, RetryableError, parse_retry_after
+
+
+def make_limiter(**options):
+    # rate=0 turns the token bucket off so only the concurrency window is exercised
+    return AdaptiveLimiter(rate=0, burst=1, **{"min_limit": 1, "max_limit": 32, "initial_limit": 8, **options})
+
+
+def test_success_increases_the_window_additively():
+    limiter = make_limiter()
+
+    async def attempt(on_first_byte):
+        on_first_byte()
+        return "ok"
+
+    async def run():
+        for _ in range(8):
+            assert await limiter.call(attempt) == "ok"
+
+    asyncio.run(run())
+    assert 8.9 < limiter.limit < 9.1
+
+
+def test_long_completion_without_slow_first_byte_does_not_shrink_the_window():
+    # A long, healthy generation: the first token arrives quickly, the whole thing takes long
+    limiter = make_limiter(first_byte_target=0.02)
+
+    async def streamed(on_first_byte):
+        on_first_byte()
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    async def non_streamed(on_first_byte):
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    async def run():
+        await limiter.call(streamed)
+        await limiter.call(non_streamed)
+
+    asyncio.run(run())
+    assert limiter.limit > 8
+
+
+def test_slow_first_byte_shrinks_the_window():
+    limiter = make_limiter(first_byte_target=0.01)
+
+    async def attempt(on_first_byte):
+        await asyncio.sleep(0.03)
+        on_first_byte()
+        return "ok"
+
+    asyncio.run(limiter.call(attempt))
+    assert limiter.limit == pytest.approx(8 * 0.9)
+
+
+def test_overload_halves_the_window_and_retries():
+    limiter = make_limiter()
+    attempts = []
+
+    async def attempt(on_first_byte):
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise RetryableError("429", retry_after=0, overload=True)
+        on_first_byte()
+        return "ok"
+
+    assert asyncio.run(limiter.call(attempt)) == "ok"
+    assert len(attempts) == 3
+    assert limiter.stats["throttled"] == 2 and limiter.stats["retries"] == 2
+    assert limiter.limit == pytest.approx(2 + 1 / 2)
+    assert limiter.in_flight == 0
+
+
+def test_window_never_drops_below_min_and_retries_give_up():
+    limiter = make_limiter(max_retries=3)
+
+    async def attempt(on_first_byte):
+        raise RetryableError("503", retry_after=0, overload=True)
+
+    with pytest.raises(RuntimeError, match="503"):
+        asyncio.run(limiter.call(attempt))
+    assert limiter.limit == 1
+    assert limiter.in_flight == 0
+
+
+def test_in_flight_calls_stay_within_the_window():
+    limiter = make_limiter(initial_limit=2, max_limit=2)
+    peak = []
+
+    async def attempt(on_first_byte):
+        peak.append(limiter.in_flight)
+        await asyncio.sleep(0.01)
+        return "ok"
+
+    async def run():
+        await asyncio.gather(*[limiter.call(attempt) for _ in range(6)])
+
+    asyncio.run(run())
+    assert max(peak) == 2
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("1.5") == 1.5
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("not a date") is None
@@ -0,0 +1,71 @@
+import asyncio
+import pytest
+from utils import semantic_cache
+
+OUTPUTS = {"research_summary": "research", "parsed_features": "features"}
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.setattr(semantic_cache, "SEMANTIC_CACHE_ENABLED", True)
+    monkeypatch.setattr(semantic_cache, "index", semantic_cache.SemanticIndex(max_entries=100))
+    monkeypatch.setattr(semantic_cache, "_memory_outputs", {})
+    monkeypatch.setattr(semantic_cache, "_added_locally", set())
+    monkeypatch.setattr(semantic_cache, "_loaded_until", None)
+    monkeypatch.setattr(semantic_cache, "_refreshed_at", 0.0)
+    return semantic_cache
+
+
+def test_entries_are_only_reused_for_their_owner(cache, monkeypatch):
+    monkeypatch.setattr(cache, "SEMANTIC_CACHE_PERSIST", False)
+
+    async def run():
+        await cache.store("meal planner for diabetics", OUTPUTS, "u1")
+        return [await cache.lookup("Meal planner for diabetics", user_id) for user_id in ("u1", "u2", None)]
+
+    assert asyncio.run(run()) == [OUTPUTS, None, None]
+
+
+def test_shared_cache_reuses_entries_across_users(cache, monkeypatch):
+    monkeypatch.setattr(cache, "SEMANTIC_CACHE_PERSIST", False)
+    monkeypatch.setattr(cache, "SEMANTIC_CACHE_SHARED", True)
+
+    async def run():
+        await cache.store("meal planner for diabetics", OUTPUTS, "u1")
+        return await cache.lookup("meal planner for diabetics", "u2")
+
+    assert asyncio.run(run()) == OUTPUTS
+
+
+def test_persisted_entries_keep_their_owner(cache, monkeypatch, sqlite_db):
+    async def run():
+        await sqlite_db.connect()
+        try:
+            await cache.store("meal planner for diabetics", OUTPUTS, "u1")
+            await cache.store("crm for plumbers", OUTPUTS)
+            # Another worker: loads everything from the table
+            monkeypatch.setattr(cache, "index", cache.SemanticIndex(max_entries=100))
+            monkeypatch.setattr(cache, "_added_locally", set())
+            return [
+                await cache.lookup("meal planner for diabetics", "u1"),
+                await cache.lookup("meal planner for diabetics", "u2"),
+                await cache.lookup("crm for plumbers", None),
+                await cache.lookup("crm for plumbers", "u1"),
+            ]
+        finally:
+            await sqlite_db.disconnect()
+
+    assert asyncio.run(run()) == [OUTPUTS, None, OUTPUTS, None]
+
+
+def test_index_search_is_limited_to_a_scope():
+    index = semantic_cache.SemanticIndex(dim=16, max_entries=4)
+    vector = semantic_cache.embed("crm for plumbers", 16)
+    for i in range(6):
+        index.add(str(i), vector, expires_at=2e9, scope=f"u{i % 2}")
+    # Oldest entries were dropped along with their scopes
+    assert len(index) == 4
+    assert index.search(vector, now=0, scope="u0")[0] in {"2", "4"}
+    assert index.search(vector, now=0, scope="u1")[0] in {"3", "5"}
+    assert index.search(vector, now=0, scope="u2") is None
+    assert index.search(vector, now=0) is not None
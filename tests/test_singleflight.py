@@ -0,0 +1,185 @@
+import asyncio
+from singleflight import SingleFlight, Broadcast, StreamFlight, Gap, normalize_key
+
+
+def test_normalize_key():
+    assert normalize_key("  Uber for Dogs ") == normalize_key("uber for   dogs")
+
+
+def test_concurrent_calls_share_one_flight():
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def run():
+        flight = SingleFlight()
+        results = await asyncio.gather(*[flight.do("key", work) for _ in range(5)])
+        assert len(flight) == 0
+        return results
+
+    assert asyncio.run(run()) == ["result"] * 5
+    assert len(calls) == 1
+
+
+def test_errors_reach_every_waiter():
+    async def work():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def run():
+        flight = SingleFlight()
+        return await asyncio.gather(flight.do("key", work), flight.do("key", work), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert [type(r) for r in results] == [RuntimeError, RuntimeError]
+
+
+def test_one_waiter_leaving_does_not_cancel_the_others():
+    async def work():
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def run():
+        flight = SingleFlight()
+        leaving = asyncio.ensure_future(flight.do("key", work))
+        staying = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0.01)
+        leaving.cancel()
+        assert await staying == "result"
+        assert leaving.cancelled()
+
+    asyncio.run(run())
+
+
+def test_flight_is_cancelled_when_its_last_waiter_leaves():
+    state = {}
+
+    async def work():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            state["cancelled"] = True
+            raise
+
+    async def run():
+        flight = SingleFlight(cancel_abandoned=True)
+        first = asyncio.ensure_future(flight.do("key", work))
+        second = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        await asyncio.sleep(0.01)
+        assert "cancelled" not in state   # second is still waiting
+        second.cancel()
+        await asyncio.gather(first, second, return_exceptions=True)
+        await asyncio.sleep(0)
+        assert state.get("cancelled")
+        assert flight.abandoned == 1
+        assert len(flight) == 0
+
+    asyncio.run(run())
+
+
+def test_flight_keeps_running_without_cancel_abandoned():
+    async def work():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def run():
+        flight = SingleFlight()
+        waiter = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0.005)
+        (task,) = flight._calls.values()
+        waiter.cancel()
+        assert await task == "done"
+
+    asyncio.run(run())
+
+
+async def numbers(count: int, delay: float = 0):
+    for i in range(count):
+        if delay:
+            await asyncio.sleep(delay)
+        yield f"event-{i}"
+
+
+async def collect(events) -> list:
+    return [(seq, event.missed if isinstance(event, Gap) else event) async for seq, event in events]
+
+
+def test_broadcast_replays_after_a_given_sequence_number():
+    async def run():
+        broadcast = Broadcast(numbers(5))
+        live = asyncio.ensure_future(collect(broadcast.subscribe()))
+        await broadcast.task
+        # A reconnect with Last-Event-ID <id>:2 only gets what came after event 2
+        return await live, await collect(broadcast.subscribe(after=2))
+
+    live, replayed = asyncio.run(run())
+    assert live == [(i, f"event-{i}") for i in range(5)]
+    assert replayed == [(3, "event-3"), (4, "event-4")]
+
+
+def test_broadcast_reports_events_that_fell_out_of_the_log_as_a_gap():
+    async def run():
+        broadcast = Broadcast(numbers(6), max_events=3)
+        await broadcast.task
+        return await collect(broadcast.subscribe(after=0))
+
+    assert asyncio.run(run()) == [(None, 2), (3, "event-3"), (4, "event-4"), (5, "event-5")]
+
+
+def test_broadcast_is_abandoned_after_idle_timeout_without_subscribers():
+    closed, abandoned = [], []
+
+    async def source():
+        try:
+            yield "run"
+            await asyncio.sleep(10)
+        finally:
+            closed.append(True)
+
+    async def run():
+        broadcast = Broadcast(source(), idle_timeout=0.05, on_abandon=abandoned.append)
+        events = broadcast.subscribe()
+        assert await events.__anext__() == (0, "run")
+        # Subscribed: the idle timer is off however long the next event takes
+        await asyncio.sleep(0.1)
+        assert not broadcast.abandoned
+        await events.aclose()
+        await asyncio.wait_for(asyncio.gather(broadcast.task, return_exceptions=True), 1)
+        return broadcast
+
+    broadcast = asyncio.run(run())
+    assert broadcast.abandoned and broadcast.done
+    assert abandoned == [broadcast] and closed == [True]
+
+
+def test_broadcast_nobody_subscribed_to_is_abandoned():
+    async def run():
+        flight = StreamFlight(idle_timeout=0.05)
+        broadcast = flight.start("key", lambda stream_id: numbers(100, delay=0.01))
+        await asyncio.wait_for(asyncio.gather(broadcast.task, return_exceptions=True), 1)
+        return flight, broadcast
+
+    flight, broadcast = asyncio.run(run())
+    assert broadcast.abandoned and broadcast.next_seq < 100
+    assert flight.abandoned == 1 and len(flight) == 0
+
+
+def test_stream_flight_shares_running_broadcasts_and_retains_finished_ones():
+    async def run():
+        flight = StreamFlight(retention_seconds=60)
+        first = flight.start("key", lambda stream_id: numbers(3, delay=0.01))
+        assert flight.start("key", lambda stream_id: numbers(3)) is first
+        await first.task
+        # Finished: a new request starts a new run, the old one can still be replayed by id
+        second = flight.start("key", lambda stream_id: numbers(3))
+        await second.task
+        return flight, first, second
+
+    flight, first, second = asyncio.run(run())
+    assert second is not first
+    assert flight.get(first.id) is first and flight.retained() == 2
@@ -0,0 +1,120 @@
+import asyncio
+from starlette.responses import StreamingResponse
+import stream_utils
+from singleflight import StreamFlight
+
+
+class FakeRequest:
+    def __init__(self, disconnected: bool = False):
+        self.disconnected = disconnected
+
+    async def is_disconnected(self):
+        return self.disconnected
+
+
+def slow_run(cancelled: list):
+    # One event, then an LLM call that never returns
+    async def source(stream_id):
+        try:
+            yield {"type": "run", "stream_id": stream_id}
+            await asyncio.sleep(10)
+            yield "STREAM_END"
+        except asyncio.CancelledError:
+            cancelled.append(stream_id)
+            raise
+    return source
+
+
+def test_disconnect_mid_stream_over_asgi_cancels_the_run():
+    # Starlette cancels the response task on http.disconnect while sse_stream waits for the next event
+    cancelled, sent = [], []
+    disconnects = stream_utils.stats["disconnects"]
+
+    async def run():
+        flight = StreamFlight(idle_timeout=0.05)
+        broadcast = flight.start("idea", slow_run(cancelled))
+        response = StreamingResponse(stream_utils.sse_stream(broadcast, request=FakeRequest()), media_type="text/event-stream")
+        first_chunk = asyncio.Event()
+        messages = [{"type": "http.request", "body": b"", "more_body": False}]
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            await first_chunk.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+            if message["type"] == "http.response.body":
+                first_chunk.set()
+
+        scope = {"type": "http", "asgi": {"spec_version": "2.0"}}
+        await asyncio.wait_for(response(scope, receive, send), 1)
+        await asyncio.wait_for(asyncio.gather(broadcast.task, return_exceptions=True), 1)
+        return flight, broadcast
+
+    flight, broadcast = asyncio.run(run())
+    assert [m["type"] for m in sent] == ["http.response.start", "http.response.body"]
+    assert stream_utils.stats["disconnects"] == disconnects + 1
+    assert broadcast.abandoned and broadcast.subscribers == 0
+    assert flight.abandoned == 1
+    assert cancelled == [broadcast.id]
+
+
+def test_polled_disconnect_ends_the_stream_and_cancels_the_run(monkeypatch):
+    monkeypatch.setattr(stream_utils, "STREAM_DISCONNECT_POLL_SECONDS", 0.01)
+    cancelled = []
+    disconnects = stream_utils.stats["disconnects"]
+
+    async def run():
+        flight = StreamFlight(idle_timeout=0.05)
+        broadcast = flight.start("idea", slow_run(cancelled))
+        request = FakeRequest()
+        chunks = []
+        async for chunk in stream_utils.sse_stream(broadcast, request=request):
+            chunks.append(chunk)
+            request.disconnected = True
+        await asyncio.wait_for(asyncio.gather(broadcast.task, return_exceptions=True), 1)
+        return flight, broadcast, chunks
+
+    flight, broadcast, chunks = asyncio.run(run())
+    assert len(chunks) == 1 and chunks[0].startswith(f"id: {broadcast.id}:0\n")
+    assert stream_utils.stats["disconnects"] == disconnects + 1
+    assert flight.abandoned == 1 and cancelled == [broadcast.id]
+
+
+def test_finished_stream_is_not_a_disconnect():
+    disconnects = stream_utils.stats["disconnects"]
+
+    async def source(stream_id):
+        yield {"type": "run", "stream_id": stream_id}
+        yield "STREAM_END"
+
+    async def run():
+        broadcast = StreamFlight().start("idea", source)
+        return [chunk async for chunk in stream_utils.sse_stream(broadcast, request=FakeRequest())]
+
+    chunks = asyncio.run(run())
+    assert chunks[-1].endswith("data: STREAM_END\n\n")
+    assert stream_utils.stats["disconnects"] == disconnects
+
+
+def test_reattach_replays_after_last_event_id():
+    async def source(stream_id):
+        for i in range(4):
+            yield {"type": "delta", "seq": i}
+
+    async def run():
+        broadcast = stream_utils.stream_flight.start("replay-test", source)
+        await broadcast.task
+        stream_id, events = stream_utils.attach_stream(broadcast.id, f"{broadcast.id}:1")
+        replayed = [chunk async for chunk in events]
+        # An id from another stream replays from the start
+        _, events = stream_utils.attach_stream(broadcast.id, "other-stream:1")
+        return broadcast, stream_id, replayed, [chunk async for chunk in events]
+
+    broadcast, stream_id, replayed, from_start = asyncio.run(run())
+    assert stream_id == broadcast.id
+    assert [chunk.split("\n")[0] for chunk in replayed] == [f"id: {broadcast.id}:2", f"id: {broadcast.id}:3"]
+    assert len(from_start) == 4
+    assert stream_utils.attach_stream("unknown", None) is None
@@ -0,0 +1,127 @@
+import os
+import re
+from utils.log import get_logger
+
+# Upstream outputs larger than an agent's input budget are compacted before they are
+# pasted into its prompt, so prompt size stays flat however verbose earlier stages get.
+# Opt-in: compaction drops detail from the upstream stages' outputs.
+COMPACTION_ENABLED = os.getenv("COMPACTION_ENABLED", "false").lower() in ("1", "true", "yes")
+# Input budget in estimated tokens, shared by all upstream inputs of one agent. The default
+# sits well above the largest route max_tokens (2048), so only runaway outputs get compacted.
+COMPACTION_DEFAULT_BUDGET = int(os.getenv("COMPACTION_DEFAULT_BUDGET", "4096"))
+# Per-agent overrides, e.g. "ArchitecturePlannerAgent=2500,SecurityInfraAgent=1000"
+COMPACTION_BUDGETS = os.getenv("COMPACTION_BUDGETS", "")
+# "extract" keeps headings and bullets deterministically; "summarize" asks a cheap model first
+COMPACTION_MODE = os.getenv("COMPACTION_MODE", "extract")
+COMPACTION_SUMMARY_MODEL = os.getenv("COMPACTION_SUMMARY_MODEL", "meta-llama/Llama-3.2-3B-Instruct-Turbo")
+
+CHARS_PER_TOKEN = 4
+MAX_BULLET_CHARS = 160
+
+HEADING_RE = re.compile(r"^\s*(#{1,6}\s+\S|\*\*[^*]+\*\*:?\s*$|[A-Z][^.!?]{0,80}:\s*$)")
+BULLET_RE = re.compile(r"^(\s*)([-*+•]|\d+[.)])\s+\S")
+SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s")
+
+stats = {"inputs": 0, "compacted": 0, "tokens_in": 0, "tokens_out": 0, "summaries": 0, "summary_errors": 0}
+
+logger = get_logger("compaction")
+
+
+def _parse_budgets(spec: str) -> dict:
+    budgets = {}
+    for item in spec.split(","):
+        name, _, value = item.partition("=")
+        if name.strip() and value.strip():
+            budgets[name.strip()] = int(value)
+    return budgets
+
+
+AGENT_BUDGETS = _parse_budgets(COMPACTION_BUDGETS)
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English markdown; close enough for budgeting
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def input_budget(agent_name: str, input_count: int = 1) -> int:
+    return AGENT_BUDGETS.get(agent_name, COMPACTION_DEFAULT_BUDGET) // max(1, input_count)
+
+
+def _first_sentence(line: str, limit: int = MAX_BULLET_CHARS) -> str:
+    line = SENTENCE_END_RE.split(line.rstrip(), maxsplit=1)[0]
+    return line if len(line) <= limit else line[:limit].rstrip() + "…"
+
+
+def _fit(lines: list, max_chars: int) -> list:
+    kept, size = [], 0
+    for line in lines:
+        if size + len(line) + 1 > max_chars:
+            break
+        kept.append(line)
+        size += len(line) + 1
+    return kept
+
+
+def extract_outline(text: str, max_tokens: int) -> str:
+    # Deterministic compaction, progressively coarser until the text fits:
+    # headings + bullets -> bullets cut to their first sentence -> top-level bullets only -> hard cut
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    lines = [line.rstrip() for line in text.splitlines() if line.strip()]
+    outline = [line for line in lines if HEADING_RE.match(line) or BULLET_RE.match(line)]
+    if not outline:
+        # Plain prose: lead sentence of every paragraph
+        paragraphs = [p for p in re.split(r"\n\s*\n", text) if p.strip()]
+        outline = [_first_sentence(" ".join(p.split())) for p in paragraphs]
+
+    if len("\n".join(outline)) > max_chars:
+        outline = [line if HEADING_RE.match(line) else _first_sentence(line) for line in outline]
+    if len("\n".join(outline)) > max_chars:
+        outline = [line for line in outline if not (BULLET_RE.match(line) and BULLET_RE.match(line).group(1))]
+    return "\n".join(_fit(outline, max_chars))
+
+
+async def _summarize(text: str, max_tokens: int) -> str:
+    from utils.llm import call_llm
+    max_words = max(50, int(max_tokens * 0.7))
+    prompt = f"""
+Condense the following document to at most {max_words} words.
+Keep every section heading, component name, feature and technology it mentions, as markdown bullet points.
+Do not add anything that is not in the document.
+
+{text}
+"""
+    return await call_llm(prompt, model=COMPACTION_SUMMARY_MODEL)
+
+
+async def compact(text: str, max_tokens: int, mode: str = None) -> str:
+    stats["inputs"] += 1
+    tokens = estimate_tokens(text)
+    if not COMPACTION_ENABLED or tokens <= max_tokens:
+        return text
+
+    compacted = text
+    if (mode or COMPACTION_MODE) == "summarize":
+        try:
+            compacted = await _summarize(text, max_tokens)
+            stats["summaries"] += 1
+        except Exception as e:
+            stats["summary_errors"] += 1
+            logger.warning("Summary compaction failed, falling back to extraction", error=str(e))
+    if estimate_tokens(compacted) > max_tokens:
+        compacted = extract_outline(compacted, max_tokens)
+
+    stats["compacted"] += 1
+    stats["tokens_in"] += tokens
+    stats["tokens_out"] += estimate_tokens(compacted)
+    logger.debug("Compacted agent input", tokens_in=tokens, tokens_out=estimate_tokens(compacted), budget=max_tokens)
+    return compacted
+
+
+async def compact_inputs(agent_name: str, inputs: list) -> list:
+    budget = input_budget(agent_name, len(inputs))
+    return [await compact(value, budget) for value in inputs]
+
+
+def compaction_stats() -> dict:
+    return {**stats, "tokens_saved": stats["tokens_in"] - stats["tokens_out"]}
@@ -0,0 +1,137 @@
+import os
+import zlib
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    # Optional: `pip install brotli` enables Content-Encoding: br
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSION_MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "1024"))
+# Moderate levels: most of the size win for a fraction of the CPU of gzip -9 / brotli 11
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+# SSE chunks are sync-flushed, so every event still reaches the client immediately
+COMPRESSION_SSE = os.getenv("COMPRESSION_SSE", "true").lower() == "true"
+
+# Already compressed, or streamed in a way compression would break; "type/*" matches any subtype
+EXCLUDED_CONTENT_TYPES = (
+    "application/grpc", "application/gzip", "application/x-gzip", "application/zip",
+    "audio/*", "font/woff", "font/woff2", "image/avif", "image/gif", "image/jpeg", "image/png", "image/webp", "video/*",
+)
+
+
+def accepted_encodings(accept_encoding: str) -> set:
+    encodings = set()
+    for item in accept_encoding.split(","):
+        name, _, params = item.partition(";")
+        name = name.strip().lower()
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if name:
+            encodings.add(name)
+    return encodings
+
+
+class GzipEncoder:
+    name = "gzip"
+
+    def __init__(self, level: int = COMPRESSION_GZIP_LEVEL):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def encode(self, body: bytes, more_body: bool) -> bytes:
+        # Sync flush after every chunk of a streamed body, so nothing waits in the compressor
+        return self._compressor.compress(body) + self._compressor.flush(zlib.Z_SYNC_FLUSH if more_body else zlib.Z_FINISH)
+
+
+class BrotliEncoder:
+    name = "br"
+
+    def __init__(self, quality: int = COMPRESSION_BROTLI_QUALITY):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def encode(self, body: bytes, more_body: bool) -> bytes:
+        if more_body:
+            return self._compressor.process(body) + self._compressor.flush()
+        return self._compressor.process(body) + self._compressor.finish()
+
+
+class CompressionMiddleware:
+    # gzip, or brotli when available, for responses at least minimum_size bytes long; streamed
+    # bodies (SSE included) are compressed chunk by chunk with a flush after each.
+    # Plain ASGI on purpose: Starlette's GZipMiddleware has no extension points for other encodings.
+    def __init__(self, app, minimum_size: int = COMPRESSION_MINIMUM_SIZE, sse: bool = COMPRESSION_SSE):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.exclude_content_types = EXCLUDED_CONTENT_TYPES if sse else (*EXCLUDED_CONTENT_TYPES, "text/event-stream")
+
+    def _encoder_for(self, scope):
+        encodings = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        if brotli is not None and "br" in encodings:
+            return BrotliEncoder
+        if "gzip" in encodings:
+            return GzipEncoder
+        return None
+
+    def _compressible(self, start: dict) -> bool:
+        headers = Headers(raw=start["headers"])
+        media_type = headers.get("content-type", "").partition(";")[0].strip().lower()
+        excluded = media_type in self.exclude_content_types or f"{media_type.partition('/')[0]}/*" in self.exclude_content_types
+        return "content-encoding" not in headers and start["status"] != 206 and not excluded
+
+    async def __call__(self, scope, receive, send):
+        encoder_cls = self._encoder_for(scope) if scope["type"] == "http" else None
+        if encoder_cls is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None        # http.response.start, held back until the first body chunk decides the headers
+        encoder = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, encoder, passthrough
+            if passthrough:
+                await send(message)
+            elif message["type"] == "http.response.start":
+                if self._compressible(message):
+                    start = message
+                else:
+                    passthrough = True
+                    await send(message)
+            elif message["type"] != "http.response.body":
+                # e.g. http.response.pathsend: can't be compressed, send the response as is
+                passthrough = True
+                if start is not None:
+                    await send(start)
+                await send(message)
+            elif encoder is None:
+                body = message.get("body", b"")
+                more_body = message.get("more_body", False)
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                encoder = encoder_cls()
+                compressed = encoder.encode(body, more_body)
+                headers = MutableHeaders(raw=list(start["headers"]))
+                headers["content-encoding"] = encoder.name
+                headers.add_vary_header("Accept-Encoding")
+                if more_body:
+                    del headers["content-length"]
+                else:
+                    headers["content-length"] = str(len(compressed))
+                await send({**start, "headers": headers.raw})
+                await send({**message, "body": compressed})
+            else:
+                more_body = message.get("more_body", False)
+                await send({**message, "body": encoder.encode(message.get("body", b""), more_body)})
+
+        await self.app(scope, receive, send_compressed)
@@ -1,32 +1,245 @@
 import os
-import requests
+import json
+import time
+import asyncio
+import httpx
 from dotenv import load_dotenv
+from utils import llm_cache, routing
+from utils.log import get_logger
+from metrics import current_agent, track_llm_call, record_usage, LLM_FALLBACKS, LLM_HEDGES
+from utils.rate_limit import llm_limiter, RetryableError, parse_retry_after
 
 load_dotenv()
 
 TOGETHER_API_KEY = os.getenv("TOGETHER_API_KEY")
+# Point at a local mock (benchmarks/mock_together.py) to run without spending tokens
+TOGETHER_BASE_URL = os.getenv("TOGETHER_BASE_URL", "https://api.together.xyz/v1").rstrip("/")
+TOGETHER_API_URL = f"{TOGETHER_BASE_URL}/chat/completions"
 
-def call_llm(prompt: str, model: str = "lgai/exaone-3-5-32b-instruct") -> str:
-    url = "https://api.together.xyz/v1/chat/completions"
+# Connection pool / timeout settings for the shared client
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "120"))
+
+_client = None
+logger = get_logger("llm")
+
+def get_client() -> httpx.AsyncClient:
+    # One keep-alive client per process, created lazily so it binds to the running loop
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(
+                LLM_READ_TIMEOUT,
+                connect=LLM_CONNECT_TIMEOUT,
+            ),
+        )
+    return _client
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+async def call_llm(prompt: str, model: str = None, on_delta=None) -> str:
+    # Model, max_tokens and temperature come from the calling agent's route (utils/routing.py);
+    # an explicit model overrides the route's model and skips its fallbacks
+    agent = current_agent.get()
+    route = routing.route_for(agent)
+    models = [model] if model else route.models()
     headers = {
         "Authorization": f"Bearer {TOGETHER_API_KEY}",
         "Content-Type": "application/json"
     }
-    data = {
-        "model": model,
-        "max_tokens": 2048,
-        "messages": [{"role": "user", "content": prompt}]
-    }
+    forwarded = []
+
+    def forward(delta):
+        forwarded.append(True)
+        on_delta(delta)
+
+    for index, candidate in enumerate(models):
+        data = route.request(candidate, prompt)
+
+        # Identical completions are served from the cache without touching the network
+        key = llm_cache.cache_key(data)
+        cached = await llm_cache.lookup(key)
+        if cached is not None:
+            if on_delta is not None:
+                on_delta(cached)
+            return cached
+
+        routing.stats["calls"] += 1
+        try:
+            content = await _call_hedged(agent, route, headers, data, forward if on_delta else None)
+        except Exception as e:
+            # Deltas already sent can't be taken back, so a stream only falls back before its first token
+            if forwarded or index == len(models) - 1:
+                raise
+            routing.stats["fallbacks"] += 1
+            LLM_FALLBACKS.labels(agent, candidate).inc()
+            logger.warning("LLM call failed, trying fallback model", model=candidate, fallback=models[index + 1], error=str(e))
+            continue
+        await llm_cache.store(key, content, model=candidate)
+        return content
+
+async def _timed_call(agent: str, headers: dict, data: dict, on_delta=None) -> str:
+    # One request (with the limiter's retries); feeds the latency window that sets hedge delays
+    model = data["model"]
+    started = time.perf_counter()
+    with track_llm_call(model):
+        if on_delta is None:
+            content = await _complete_llm(headers, data)
+            routing.latency.observe((agent, model, "complete"), time.perf_counter() - started)
+            return content
+
+        first = []
+
+        def timed_delta(delta):
+            if not first:
+                first.append(True)
+                routing.latency.observe((agent, model, "first_token"), time.perf_counter() - started)
+            on_delta(delta)
 
-    response = requests.post(url, headers=headers, json=data)
+        # Token streaming: forward each delta to on_delta and return the full completion
+        return await _stream_llm(headers, data, timed_delta)
 
+async def _call_hedged(agent: str, route, headers: dict, data: dict, on_delta=None) -> str:
+    # Sends a duplicate request if the first hasn't answered (or, streaming, hasn't produced a token)
+    # by the agent's p95 latency. The first response wins; the other request is cancelled. A stream
+    # is won by the first attempt to produce a token, and only the winner's deltas are forwarded.
+    kind = "first_token" if on_delta else "complete"
+    delay = routing.hedge_delay(agent, data["model"], kind)
+    if delay is None:
+        return await _timed_call(agent, headers, data, on_delta)
+
+    tasks = []
+    models = []
+    winner = []
+
+    def forward_for(index):
+        def forward(delta):
+            if not winner:
+                winner.append(index)
+                for other, task in enumerate(tasks):
+                    if other != index:
+                        task.cancel()
+            if winner[0] == index:
+                on_delta(delta)
+        return forward
+
+    def start(attempt_data):
+        forward = forward_for(len(tasks)) if on_delta else None
+        tasks.append(asyncio.ensure_future(_timed_call(agent, headers, attempt_data, forward)))
+        models.append(attempt_data["model"])
+
+    start(data)
     try:
-        resp_json = response.json()
-    except Exception:
-        raise RuntimeError(f"Failed to parse JSON from Together API: {response.text}")
+        await asyncio.wait(tasks, timeout=delay)
+        if not tasks[0].done() and not winner and routing.take_hedge():
+            hedge_model = route.hedge_model or data["model"]
+            LLM_HEDGES.labels(agent, hedge_model, "sent").inc()
+            start({**data, "model": hedge_model})
+
+        errors = []
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.cancelled():
+                    continue
+                error = task.exception()
+                if error is None:
+                    if task is not tasks[0]:
+                        routing.stats["hedge_wins"] += 1
+                        LLM_HEDGES.labels(agent, models[tasks.index(task)], "won").inc()
+                    return task.result()
+                if winner and tasks[winner[0]] is task:
+                    raise error
+                errors.append(error)
+        raise errors[0]
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+def _raise_if_retryable(response: httpx.Response, body: str):
+    # 429 and 5xx are worth another attempt; Retry-After wins over our own backoff
+    if response.status_code == 429 or response.status_code >= 500:
+        raise RetryableError(
+            f"Together API error {response.status_code}: {body}",
+            retry_after=parse_retry_after(response.headers.get("retry-after")),
+            overload=response.status_code in (429, 503),
+        )
+
+async def _complete_llm(headers: dict, data: dict) -> str:
+    # Without streaming the response only starts once generation is done, so no first-byte signal
+    async def attempt(on_first_byte):
+        try:
+            response = await get_client().post(TOGETHER_API_URL, headers=headers, json=data)
+        except httpx.TransportError as e:
+            raise RetryableError(f"Together API request failed: {e!r}")
+        _raise_if_retryable(response, response.text)
+
+        try:
+            resp_json = response.json()
+        except Exception:
+            raise RuntimeError(f"Failed to parse JSON from Together API: {response.text}")
+
+        if "choices" not in resp_json:
+            logger.warning("Together API error", response=resp_json)
+            raise RuntimeError(f"Together API error: {resp_json}")
+
+        record_usage(data["model"], resp_json.get("usage"))
+        return resp_json["choices"][0]["message"]["content"]
+
+    return await llm_limiter.call(attempt)
+
+async def _stream_llm(headers: dict, data: dict, on_delta) -> str:
+    async def attempt(on_first_byte):
+        parts = []
+        try:
+            async with get_client().stream("POST", TOGETHER_API_URL, headers=headers, json={**data, "stream": True}) as response:
+                if response.status_code != 200:
+                    body = (await response.aread()).decode(errors="replace")
+                    _raise_if_retryable(response, body)
+                    logger.warning("Together API error", status=response.status_code, body=body)
+                    raise RuntimeError(f"Together API error: {body}")
 
-    if "choices" not in resp_json:
-        print(f"Together API error: {resp_json}")
-        raise RuntimeError(f"Together API error: {resp_json}")
+                async for line in response.aiter_lines():
+                    on_first_byte()
+                    if not line.startswith("data:"):
+                        continue
+                    payload = line[len("data:"):].strip()
+                    if payload == "[DONE]":
+                        break
+                    try:
+                        chunk = json.loads(payload)
+                    except ValueError:
+                        raise RuntimeError(f"Failed to parse stream chunk from Together API: {payload}")
+                    # Together reports usage on the final chunk
+                    record_usage(data["model"], chunk.get("usage"))
+                    if "choices" not in chunk:
+                        logger.warning("Together API error", chunk=chunk)
+                        raise RuntimeError(f"Together API error: {chunk}")
+                    if not chunk["choices"]:
+                        continue
+                    delta = (chunk["choices"][0].get("delta") or {}).get("content")
+                    if delta:
+                        parts.append(delta)
+                        on_delta(delta)
+        except httpx.TransportError as e:
+            # Deltas already forwarded can't be taken back, so only retry a stream that never started
+            if parts:
+                raise RuntimeError(f"Together API stream interrupted: {e!r}")
+            raise RetryableError(f"Together API request failed: {e!r}")
+        return "".join(parts)
 
-    return resp_json["choices"][0]["message"]["content"]
+    return await llm_limiter.call(attempt)
@@ -0,0 +1,147 @@
+import os
+import json
+import time
+import hashlib
+import datetime
+from collections import OrderedDict
+from utils.log import get_logger
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024"))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(24 * 3600)))
+# Shared tier in Postgres; only used when the app's database is connected
+LLM_CACHE_PERSIST = os.getenv("LLM_CACHE_PERSIST", "true").lower() == "true"
+LLM_CACHE_PURGE_EVERY = int(os.getenv("LLM_CACHE_PURGE_EVERY", "500"))
+
+logger = get_logger("llm_cache")
+
+stats = {"memory_hits": 0, "persistent_hits": 0, "misses": 0, "evictions": 0, "persistent_errors": 0}
+
+
+def cache_key(params: dict) -> str:
+    # Content address: model, messages, max_tokens and any other generation params
+    canonical = json.dumps(params, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class LRUCache:
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()   # key -> (value, expires_at monotonic)
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            stats["evictions"] += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: str, ttl_seconds: float = None):
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            stats["evictions"] += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+memory_cache = LRUCache(LLM_CACHE_MAX_ENTRIES, LLM_CACHE_TTL_SECONDS)
+_writes_since_purge = 0
+
+
+def _persistent_db():
+    # Imported lazily: db.py needs DATABASE_URL, and scripts may run without a database
+    if not LLM_CACHE_PERSIST or not os.getenv("DATABASE_URL"):
+        return None
+    from db import database, llm_cache, upsert
+    return database, llm_cache, upsert
+
+
+async def lookup(key: str):
+    if not LLM_CACHE_ENABLED:
+        return None
+    value = memory_cache.get(key)
+    if value is not None:
+        stats["memory_hits"] += 1
+        return value
+
+    persistent = _persistent_db()
+    if persistent is not None:
+        database, llm_cache, _ = persistent
+        now = datetime.datetime.now(datetime.timezone.utc)
+        try:
+            row = await database.fetch_one(
+                llm_cache.select().where(llm_cache.c.key == key).where(llm_cache.c.expires_at > now)
+            )
+        except Exception as e:
+            stats["persistent_errors"] += 1
+            logger.warning("Persistent cache lookup failed", error=str(e))
+            row = None
+        if row is not None:
+            stats["persistent_hits"] += 1
+            remaining = (row["expires_at"] - now).total_seconds()
+            memory_cache.set(key, row["response"], min(remaining, LLM_CACHE_TTL_SECONDS))
+            return row["response"]
+
+    stats["misses"] += 1
+    return None
+
+
+async def store(key: str, value: str, model: str = None):
+    global _writes_since_purge
+    if not LLM_CACHE_ENABLED:
+        return
+    memory_cache.set(key, value)
+
+    persistent = _persistent_db()
+    if persistent is None:
+        return
+    database, llm_cache, upsert = persistent
+    now = datetime.datetime.now(datetime.timezone.utc)
+    expires_at = now + datetime.timedelta(seconds=LLM_CACHE_TTL_SECONDS)
+    upsert_stmt = upsert(llm_cache).values(
+        key=key, model=model, response=value, created_at=now, expires_at=expires_at
+    ).on_conflict_do_update(
+        index_elements=[llm_cache.c.key],
+        set_={"response": value, "created_at": now, "expires_at": expires_at},
+    )
+    try:
+        await database.execute(upsert_stmt)
+        _writes_since_purge += 1
+        if _writes_since_purge >= LLM_CACHE_PURGE_EVERY:
+            _writes_since_purge = 0
+            await purge_expired()
+    except Exception as e:
+        stats["persistent_errors"] += 1
+        logger.warning("Persistent cache write failed", error=str(e))
+
+
+async def purge_expired():
+    persistent = _persistent_db()
+    if persistent is None:
+        return
+    database, llm_cache, _ = persistent
+    now = datetime.datetime.now(datetime.timezone.utc)
+    await database.execute(llm_cache.delete().where(llm_cache.c.expires_at <= now))
+
+
+def cache_stats() -> dict:
+    lookups = stats["memory_hits"] + stats["persistent_hits"] + stats["misses"]
+    hits = stats["memory_hits"] + stats["persistent_hits"]
+    return {
+        **stats,
+        "memory_entries": len(memory_cache),
+        "hit_ratio": hits / lookups if lookups else 0.0,
+    }
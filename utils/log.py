@@ -0,0 +1,150 @@
+import os
+import sys
+import json
+import queue
+import uuid
+import atexit
+import random
+import logging
+import datetime
+import logging.handlers
+from contextvars import ContextVar
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Fraction of DEBUG/INFO records kept; warnings and errors are never sampled out
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+# Longer string fields are replaced by a preview plus their size
+LOG_MAX_FIELD_CHARS = int(os.getenv("LOG_MAX_FIELD_CHARS", "512"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+request_id_var = ContextVar("request_id", default=None)
+
+stats = {"dropped": 0, "sampled_out": 0}
+
+_listener = None
+
+
+def truncate(value, limit: int = LOG_MAX_FIELD_CHARS):
+    if isinstance(value, str):
+        if len(value) <= limit:
+            return value
+        return {"preview": value[:limit], "size": len(value)}
+    if isinstance(value, dict):
+        return {key: truncate(item, limit) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if len(value) > 20:
+            return {"preview": [truncate(item, limit) for item in value[:20]], "size": len(value)}
+        return [truncate(item, limit) for item in value]
+    return value
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": truncate(record.getMessage()),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(truncate(fields))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or LOG_SAMPLE_RATE >= 1.0:
+            return True
+        if random.random() < LOG_SAMPLE_RATE:
+            return True
+        stats["sampled_out"] += 1
+        return False
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    # Never blocks the event loop: when the writer thread falls behind, records are dropped
+    def prepare(self, record):
+        # Bind the request id now; the listener thread has no access to this context
+        record.request_id = request_id_var.get()
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            stats["dropped"] += 1
+
+
+class StructuredLogger(logging.LoggerAdapter):
+    # logger.info("chat saved", chat_id=..., messages=...) -> keyword args become JSON fields
+    def process(self, msg, kwargs):
+        fields = {key: kwargs.pop(key) for key in list(kwargs) if key not in ("exc_info", "stack_info", "stacklevel", "extra")}
+        extra = kwargs.setdefault("extra", {})
+        extra["fields"] = {**extra.get("fields", {}), **fields}
+        return msg, kwargs
+
+
+def get_logger(name: str) -> StructuredLogger:
+    return StructuredLogger(logging.getLogger(name), {})
+
+
+def configure_logging():
+    global _listener
+    if _listener is not None:
+        return
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter())
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter())
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(LOG_LEVEL)
+    # One line per upstream request is noise at INFO
+    logging.getLogger("httpx").setLevel(max(logging.WARNING, root.level))
+
+
+def stop_logging():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class RequestIdMiddleware:
+    # Correlation id per request: taken from X-Request-ID or generated, echoed back in the response
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_id = None
+        for name, value in scope.get("headers", []):
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:128]
+                break
+        request_id = request_id or uuid.uuid4().hex
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        token = request_id_var.set(request_id)
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id_var.reset(token)
@@ -0,0 +1,192 @@
+import os
+import time
+import random
+import asyncio
+import datetime
+from email.utils import parsedate_to_datetime
+from utils.log import get_logger
+
+# Requests per second allowed towards the provider, with a burst allowance
+LLM_RATE_LIMIT_RPS = float(os.getenv("LLM_RATE_LIMIT_RPS", "10"))
+LLM_RATE_LIMIT_BURST = float(os.getenv("LLM_RATE_LIMIT_BURST", "20"))
+# AIMD concurrency window
+LLM_MIN_CONCURRENCY = int(os.getenv("LLM_MIN_CONCURRENCY", "1"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+LLM_INITIAL_CONCURRENCY = int(os.getenv("LLM_INITIAL_CONCURRENCY", "8"))
+# Time to first byte above which the window shrinks. Whole-completion time is no signal: a long,
+# healthy generation takes as long as an overloaded short one
+LLM_FIRST_BYTE_TARGET_SECONDS = float(os.getenv("LLM_FIRST_BYTE_TARGET_SECONDS", "10"))
+# Retries for 429 / 5xx / transport errors
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "0.5"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "30"))
+
+logger = get_logger("rate_limit")
+
+
+class RetryableError(Exception):
+    # Raised by an attempt that may succeed if repeated; overload=True for provider throttling
+    def __init__(self, message: str, retry_after: float = None, overload: bool = False):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.overload = overload
+
+
+def parse_retry_after(value: str):
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (when - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+
+def backoff_delay(attempt: int) -> float:
+    # Full jitter: uniform in [0, base * 2^attempt], capped
+    return random.uniform(0, min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * (2 ** attempt)))
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class AdaptiveLimiter:
+    # Process-wide gate for LLM calls: token bucket for rate, AIMD window for concurrency
+    def __init__(
+        self,
+        rate: float = LLM_RATE_LIMIT_RPS,
+        burst: float = LLM_RATE_LIMIT_BURST,
+        min_limit: int = LLM_MIN_CONCURRENCY,
+        max_limit: int = LLM_MAX_CONCURRENCY,
+        initial_limit: int = LLM_INITIAL_CONCURRENCY,
+        first_byte_target: float = LLM_FIRST_BYTE_TARGET_SECONDS,
+        max_retries: int = LLM_MAX_RETRIES,
+    ):
+        self.bucket = TokenBucket(rate, burst)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(max(min_limit, min(initial_limit, max_limit)))
+        self.first_byte_target = first_byte_target
+        self.max_retries = max_retries
+        self.in_flight = 0
+        self.waiting = 0
+        self._slots = asyncio.Condition()
+        self.stats = {
+            "requests": 0,
+            "retries": 0,
+            "throttled": 0,
+            "errors": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+        }
+
+    async def acquire(self):
+        started = time.monotonic()
+        self.waiting += 1
+        try:
+            async with self._slots:
+                await self._slots.wait_for(lambda: self.in_flight < int(self.limit))
+                self.in_flight += 1
+            try:
+                await self.bucket.acquire()
+            except BaseException:
+                await self._release()
+                raise
+        finally:
+            self.waiting -= 1
+        waited = time.monotonic() - started
+        self.stats["wait_seconds_total"] += waited
+        self.stats["wait_seconds_max"] = max(self.stats["wait_seconds_max"], waited)
+        return waited
+
+    async def _release(self):
+        async with self._slots:
+            self.in_flight -= 1
+            self._slots.notify_all()
+
+    def _on_success(self, first_byte_latency: float = None):
+        # first_byte_latency is None for attempts that can't tell (non-streamed completions only
+        # answer once generation is done); those only count towards the increase
+        if first_byte_latency is not None and first_byte_latency > self.first_byte_target:
+            # Upstream is queueing our requests: back off before it starts rejecting us
+            self.limit = max(self.min_limit, self.limit * 0.9)
+        else:
+            # Additive increase, roughly +1 per window of successful calls
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def _on_overload(self):
+        self.limit = max(self.min_limit, self.limit / 2)
+
+    async def call(self, attempt_fn):
+        # Runs attempt_fn(on_first_byte) inside a slot, retrying RetryableError with jittered
+        # backoff. The attempt calls on_first_byte() when the response starts arriving.
+        attempt = 0
+        while True:
+            await self.acquire()
+            self.stats["requests"] += 1
+            started = time.monotonic()
+            first_byte = []
+
+            def on_first_byte():
+                if not first_byte:
+                    first_byte.append(time.monotonic())
+
+            try:
+                result = await attempt_fn(on_first_byte)
+            except RetryableError as e:
+                if e.overload:
+                    self.stats["throttled"] += 1
+                    self._on_overload()
+                else:
+                    self.stats["errors"] += 1
+                await self._release()
+                if attempt >= self.max_retries:
+                    raise RuntimeError(str(e))
+                delay = e.retry_after if e.retry_after is not None else backoff_delay(attempt)
+                delay = min(delay, LLM_BACKOFF_MAX_SECONDS)
+                attempt += 1
+                self.stats["retries"] += 1
+                logger.info("Retrying LLM call", delay=round(delay, 3), attempt=attempt, max_retries=self.max_retries, error=str(e))
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                self.stats["errors"] += 1
+                await self._release()
+                raise
+            self._on_success(first_byte[0] - started if first_byte else None)
+            await self._release()
+            return result
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "queue_depth": self.waiting,
+            "in_flight": self.in_flight,
+            "concurrency_limit": self.limit,
+        }
+
+
+llm_limiter = AdaptiveLimiter()
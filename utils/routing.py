@@ -0,0 +1,143 @@
+import os
+import json
+from collections import deque
+from utils.log import get_logger
+
+# Route used by agents without an entry below, and by calls made outside any agent
+LLM_DEFAULT_MODEL = os.getenv("LLM_DEFAULT_MODEL", "lgai/exaone-3-5-32b-instruct")
+LLM_DEFAULT_MAX_TOKENS = int(os.getenv("LLM_DEFAULT_MAX_TOKENS", "2048"))
+# Comma-separated models tried, in order, when a route's own model fails after retries
+LLM_DEFAULT_FALLBACKS = os.getenv("LLM_DEFAULT_FALLBACKS", "meta-llama/Llama-3.3-70B-Instruct-Turbo")
+# JSON object merged over DEFAULT_ROUTES, e.g.
+# {"FeatureParserAgent": {"model": "...", "max_tokens": 1024, "temperature": 0.2, "fallbacks": ["..."], "hedge": true}}
+LLM_ROUTES = os.getenv("LLM_ROUTES", "")
+
+# Hedging: a call still unanswered after its agent's p95 latency gets a duplicate request;
+# the first response wins and the other is cancelled
+LLM_HEDGING_ENABLED = os.getenv("LLM_HEDGING_ENABLED", "false").lower() in ("1", "true", "yes")
+LLM_HEDGE_QUANTILE = float(os.getenv("LLM_HEDGE_QUANTILE", "0.95"))
+LLM_HEDGE_WINDOW = int(os.getenv("LLM_HEDGE_WINDOW", "200"))
+# No hedging until an agent/model has this many latency samples
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_MIN_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", "1.0"))
+# Hedges are capped at this fraction of calls, so a slow provider doesn't double our traffic
+LLM_HEDGE_MAX_RATIO = float(os.getenv("LLM_HEDGE_MAX_RATIO", "0.1"))
+
+# Stages that only reformat their input don't need the full 2048-token budget
+DEFAULT_ROUTES = {
+    "ResearchAgent": {"max_tokens": 1536},
+    "FeatureParserAgent": {"max_tokens": 1024},
+    "ArchitecturePlannerAgent": {"max_tokens": 2048},
+    "TechStackSelectorAgent": {"max_tokens": 1024},
+    "SecurityInfraAgent": {"max_tokens": 1536},
+}
+
+logger = get_logger("routing")
+
+stats = {"calls": 0, "fallbacks": 0, "hedges": 0, "hedge_wins": 0, "hedges_skipped_budget": 0}
+
+
+class Route:
+    def __init__(self, model: str, max_tokens: int, temperature: float = None, fallbacks: list = (), hedge: bool = True, hedge_model: str = None):
+        self.model = model
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.fallbacks = [m for m in fallbacks if m != model]
+        self.hedge = hedge
+        self.hedge_model = hedge_model  # None: hedge on the same model as the request
+
+    @classmethod
+    def from_config(cls, config: dict):
+        fallbacks = config.get("fallbacks")
+        if fallbacks is None:
+            fallbacks = [m.strip() for m in LLM_DEFAULT_FALLBACKS.split(",") if m.strip()]
+        return cls(
+            model=config.get("model", LLM_DEFAULT_MODEL),
+            max_tokens=int(config.get("max_tokens", LLM_DEFAULT_MAX_TOKENS)),
+            temperature=config.get("temperature"),
+            fallbacks=fallbacks,
+            hedge=config.get("hedge", True),
+            hedge_model=config.get("hedge_model"),
+        )
+
+    def models(self) -> list:
+        return [self.model, *self.fallbacks]
+
+    def request(self, model: str, prompt: str) -> dict:
+        # Together chat/completions body; temperature is only sent when configured so the
+        # provider default (and existing cache keys) are kept otherwise
+        data = {
+            "model": model,
+            "max_tokens": self.max_tokens,
+            "messages": [{"role": "user", "content": prompt}],
+        }
+        if self.temperature is not None:
+            data["temperature"] = self.temperature
+        return data
+
+
+def _load_routes(spec: str) -> dict:
+    configs = {name: dict(config) for name, config in DEFAULT_ROUTES.items()}
+    if spec.strip():
+        try:
+            overrides = json.loads(spec)
+        except ValueError as e:
+            raise RuntimeError(f"LLM_ROUTES is not valid JSON: {e}")
+        for name, config in overrides.items():
+            configs.setdefault(name, {}).update(config)
+    return {name: Route.from_config(config) for name, config in configs.items()}
+
+
+ROUTES = _load_routes(LLM_ROUTES)
+DEFAULT_ROUTE = Route.from_config({})
+
+
+def route_for(agent_name: str) -> Route:
+    return ROUTES.get(agent_name, DEFAULT_ROUTE)
+
+
+class LatencyTracker:
+    # Sliding window of recent latencies per (agent, model, kind); kind is "complete" for whole
+    # responses and "first_token" for streams, where a hedge only makes sense before any output
+    def __init__(self, window: int = LLM_HEDGE_WINDOW):
+        self.window = window
+        self._samples = {}
+
+    def observe(self, key: tuple, seconds: float):
+        self._samples.setdefault(key, deque(maxlen=self.window)).append(seconds)
+
+    def quantile(self, key: tuple, q: float, min_samples: int = LLM_HEDGE_MIN_SAMPLES):
+        samples = self._samples.get(key)
+        if not samples or len(samples) < min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def __len__(self):
+        return len(self._samples)
+
+
+latency = LatencyTracker()
+
+
+def hedge_delay(agent_name: str, model: str, kind: str):
+    # Seconds to wait before hedging this call, or None to not hedge it
+    if not LLM_HEDGING_ENABLED or not route_for(agent_name).hedge:
+        return None
+    p = latency.quantile((agent_name, model, kind), LLM_HEDGE_QUANTILE)
+    if p is None:
+        return None
+    return max(LLM_HEDGE_MIN_DELAY_SECONDS, p)
+
+
+def take_hedge() -> bool:
+    # Spends one hedge from the LLM_HEDGE_MAX_RATIO budget
+    if stats["hedges"] + 1 > LLM_HEDGE_MAX_RATIO * stats["calls"]:
+        stats["hedges_skipped_budget"] += 1
+        return False
+    stats["hedges"] += 1
+    return True
+
+
+def routing_stats() -> dict:
+    return {**stats, "routes": len(ROUTES), "latency_series": len(latency)}
@@ -0,0 +1,270 @@
+import os
+import re
+import time
+import uuid
+import zlib
+import asyncio
+import datetime
+import unicodedata
+import numpy as np
+import sqlalchemy
+from utils.log import get_logger
+
+# Opt-in. Despite the name this is a lexical near-duplicate cache, not a semantic one: a product
+# idea that shares most of its words with an earlier one (character n-grams, see embed()) reuses
+# that stored blueprint. Ideas that mean the same thing in different words always miss.
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+# Stored blueprints are only reused for the user whose run produced them (anonymous runs share one
+# scope). True reuses them across all users, i.e. one user's generated outputs are served to others.
+SEMANTIC_CACHE_SHARED = os.getenv("SEMANTIC_CACHE_SHARED", "false").lower() in ("1", "true", "yes")
+# Cosine similarity of the n-gram vectors at which the whole stored blueprint is returned
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.85"))
+# Looser match: only SEMANTIC_CACHE_PARTIAL_STAGES are reused, later stages run for the new idea
+SEMANTIC_CACHE_PARTIAL_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_PARTIAL_THRESHOLD", "0.7"))
+SEMANTIC_CACHE_PARTIAL_STAGES = os.getenv("SEMANTIC_CACHE_PARTIAL_STAGES", "research_summary")
+SEMANTIC_CACHE_TTL_SECONDS = float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+# Index memory is roughly MAX_ENTRIES * DIM * 4 bytes (100k x 256 ~ 100 MB)
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "100000"))
+SEMANTIC_CACHE_DIM = int(os.getenv("SEMANTIC_CACHE_DIM", "256"))
+# Entries written by other workers are picked up this often
+SEMANTIC_CACHE_REFRESH_SECONDS = float(os.getenv("SEMANTIC_CACHE_REFRESH_SECONDS", "60"))
+# Shared tier in the database; only used when the app's database is configured
+SEMANTIC_CACHE_PERSIST = os.getenv("SEMANTIC_CACHE_PERSIST", "true").lower() == "true"
+
+NGRAM_SIZES = (3, 4, 5)
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+# Filler that shows up in most product ideas and says nothing about which product it is
+STOPWORDS = frozenset(
+    "a an the for of to and or with in on by my your our app apps application platform tool service website based".split()
+)
+
+logger = get_logger("semantic_cache")
+
+stats = {"lookups": 0, "hits": 0, "partial_hits": 0, "misses": 0, "stores": 0, "errors": 0, "lookup_seconds_total": 0.0}
+
+
+def embed(text: str, dim: int = SEMANTIC_CACHE_DIM) -> np.ndarray:
+    # Hashed character n-grams of the content words, L2-normalized. Lexical, not semantic:
+    # it matches rewordings, reorderings and inflections ("diabetic meal planner" vs
+    # "meal planning app for diabetics"), not paraphrases that share no words.
+    features = []
+    # Accents folded so "résumé" and "resume" share n-grams
+    text = unicodedata.normalize("NFKD", text.lower()).encode("ascii", "ignore").decode("ascii")
+    for word in TOKEN_RE.findall(text):
+        if word in STOPWORDS:
+            continue
+        padded = f" {word} "
+        for n in NGRAM_SIZES:
+            features.extend(padded[i:i + n] for i in range(max(1, len(padded) - n + 1)))
+    vector = np.zeros(dim, dtype=np.float32)
+    if not features:
+        return vector
+    # crc32 rather than hash(): vectors are persisted and must match across processes
+    hashes = np.fromiter((zlib.crc32(f.encode("utf-8")) for f in features), dtype=np.uint32, count=len(features))
+    signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+    np.add.at(vector, hashes % dim, signs)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class SemanticIndex:
+    # Brute-force cosine index: one (n, dim) float32 matrix of unit vectors, so a lookup is a
+    # single matrix-vector product. Oldest entries are dropped past max_entries. Every entry has
+    # a scope (the owning user) and a search can be limited to one scope.
+    def __init__(self, dim: int = SEMANTIC_CACHE_DIM, max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES):
+        self.dim = dim
+        self.max_entries = max_entries
+        self._vectors = np.zeros((1024, dim), dtype=np.float32)
+        self._expires = np.zeros(1024, dtype=np.float64)  # unix time
+        self._scopes = np.zeros(1024, dtype=np.int32)      # ids from _scope_ids
+        self._scope_ids = {}
+        self._keys = []
+
+    def add(self, key: str, vector: np.ndarray, expires_at: float, scope: str = "") -> list:
+        # Returns the keys dropped to make room
+        dropped = []
+        if len(self._keys) >= self.max_entries:
+            dropped = self._drop_oldest(max(1, self.max_entries // 10))
+        n = len(self._keys)
+        if n == len(self._vectors):
+            capacity = min(max(2 * n, 1024), self.max_entries)
+            self._vectors = np.resize(self._vectors, (capacity, self.dim))
+            self._expires = np.resize(self._expires, capacity)
+            self._scopes = np.resize(self._scopes, capacity)
+        self._vectors[n] = vector
+        self._expires[n] = expires_at
+        self._scopes[n] = self._scope_ids.setdefault(scope, len(self._scope_ids))
+        self._keys.append(key)
+        return dropped
+
+    def _drop_oldest(self, count: int) -> list:
+        n = len(self._keys)
+        self._vectors[:n - count] = self._vectors[count:n]
+        self._expires[:n - count] = self._expires[count:n]
+        self._scopes[:n - count] = self._scopes[count:n]
+        dropped = self._keys[:count]
+        del self._keys[:count]
+        return dropped
+
+    def search(self, vector: np.ndarray, now: float = None, scope: str = None):
+        # (key, similarity) of the nearest unexpired entry in `scope` (any scope if None), or None
+        n = len(self._keys)
+        scope_id = self._scope_ids.get(scope)
+        if n == 0 or (scope is not None and scope_id is None):
+            return None
+        scores = self._vectors[:n] @ vector
+        scores[self._expires[:n] <= (time.time() if now is None else now)] = -1.0
+        if scope is not None:
+            scores[self._scopes[:n] != scope_id] = -1.0
+        best = int(np.argmax(scores))
+        if scores[best] < 0:
+            return None
+        return self._keys[best], float(scores[best])
+
+    def nbytes(self) -> int:
+        return self._vectors.nbytes + self._expires.nbytes + self._scopes.nbytes
+
+    def __len__(self):
+        return len(self._keys)
+
+
+index = SemanticIndex()
+_memory_outputs = {}       # key -> outputs, when there is no database
+_added_locally = set()     # persisted by this process and already indexed; skipped by _refresh
+_loaded_until = None       # created_at of the newest persisted entry in the index
+_refreshed_at = 0.0
+_refresh_lock = asyncio.Lock()
+
+
+def _persistent_db():
+    # Imported lazily: db.py needs DATABASE_URL, and scripts may run without a database
+    if not SEMANTIC_CACHE_PERSIST or not os.getenv("DATABASE_URL"):
+        return None
+    from db import database, blueprint_semantic_cache
+    return database, blueprint_semantic_cache
+
+
+async def _refresh():
+    # Loads persisted entries newer than the last load (all of them on first use)
+    global _loaded_until, _refreshed_at
+    persistent = _persistent_db()
+    if persistent is None or time.monotonic() - _refreshed_at < SEMANTIC_CACHE_REFRESH_SECONDS:
+        return
+    async with _refresh_lock:
+        if time.monotonic() - _refreshed_at < SEMANTIC_CACHE_REFRESH_SECONDS:
+            return
+        database, table = persistent
+        now = datetime.datetime.now(datetime.timezone.utc)
+        await database.execute(table.delete().where(table.c.expires_at <= now))
+        query = (
+            sqlalchemy.select(table.c.id, table.c.user_id, table.c.embedding, table.c.created_at, table.c.expires_at)
+            .where(table.c.expires_at > now)
+            .order_by(table.c.created_at)
+        )
+        if _loaded_until is not None:
+            query = query.where(table.c.created_at > _loaded_until)
+        rows = await database.fetch_all(query)
+        for row in rows:
+            _loaded_until = row["created_at"]
+            if row["id"] in _added_locally:
+                _added_locally.discard(row["id"])
+                continue
+            vector = np.frombuffer(row["embedding"], dtype=np.float32)
+            if vector.shape[0] == index.dim:   # rows written with another SEMANTIC_CACHE_DIM are skipped
+                index.add(row["id"], vector, row["expires_at"].timestamp(), _scope(row["user_id"]))
+        _refreshed_at = time.monotonic()
+
+
+async def _load_outputs(key: str):
+    persistent = _persistent_db()
+    if persistent is None:
+        return _memory_outputs.get(key)
+    database, table = persistent
+    row = await database.fetch_one(sqlalchemy.select(table.c.outputs).where(table.c.id == key))
+    return row["outputs"] if row is not None else None
+
+
+def _scope(user_id: str) -> str:
+    return user_id or ""
+
+
+def _partial(outputs: dict) -> dict:
+    keys = [key.strip() for key in SEMANTIC_CACHE_PARTIAL_STAGES.split(",") if key.strip()]
+    return {key: outputs[key] for key in keys if key in outputs}
+
+
+async def lookup(product_idea: str, user_id: str = None):
+    # Stage outputs to reuse for this user's idea, or None when nothing is close enough: the whole
+    # blueprint above SEMANTIC_CACHE_THRESHOLD, the partial stages above the partial threshold.
+    # Errors are logged and count as a miss; the cache never fails a request.
+    if not SEMANTIC_CACHE_ENABLED:
+        return None
+    stats["lookups"] += 1
+    started = time.perf_counter()
+    try:
+        await _refresh()
+        match = index.search(embed(product_idea), scope=None if SEMANTIC_CACHE_SHARED else _scope(user_id))
+        outputs = None
+        if match is not None and match[1] >= min(SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_PARTIAL_THRESHOLD):
+            outputs = await _load_outputs(match[0])
+    except Exception as e:
+        stats["errors"] += 1
+        logger.warning("Semantic cache lookup failed", error=str(e))
+        return None
+    finally:
+        stats["lookup_seconds_total"] += time.perf_counter() - started
+
+    if not outputs:
+        stats["misses"] += 1
+        return None
+    similarity = match[1]
+    if similarity >= SEMANTIC_CACHE_THRESHOLD:
+        stats["hits"] += 1
+        logger.info("Semantic cache hit", similarity=round(similarity, 3))
+        return dict(outputs)
+    reused = _partial(outputs)
+    if not reused:
+        stats["misses"] += 1
+        return None
+    stats["partial_hits"] += 1
+    logger.info("Semantic cache partial hit", similarity=round(similarity, 3), stages=list(reused))
+    return reused
+
+
+async def store(product_idea: str, outputs: dict, user_id: str = None):
+    # Call with the outputs of a fully successful run by user_id (None for anonymous runs)
+    if not SEMANTIC_CACHE_ENABLED or not outputs:
+        return
+    key = str(uuid.uuid4())
+    vector = embed(product_idea)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    expires_at = now + datetime.timedelta(seconds=SEMANTIC_CACHE_TTL_SECONDS)
+    persistent = _persistent_db()
+    try:
+        if persistent is None:
+            _memory_outputs[key] = dict(outputs)
+        else:
+            database, table = persistent
+            await database.execute(table.insert().values(
+                id=key, user_id=user_id, title=product_idea, embedding=vector.tobytes(), outputs=dict(outputs),
+                created_at=now, expires_at=expires_at,
+            ))
+    except Exception as e:
+        stats["errors"] += 1
+        logger.warning("Semantic cache write failed", error=str(e))
+        return
+    if persistent is not None:
+        _added_locally.add(key)
+    for dropped in index.add(key, vector, expires_at.timestamp(), _scope(user_id)):
+        _memory_outputs.pop(dropped, None)
+    stats["stores"] += 1
+
+
+def semantic_cache_stats() -> dict:
+    return {
+        **stats,
+        "entries": len(index),
+        "index_bytes": index.nbytes(),
+        "enabled": SEMANTIC_CACHE_ENABLED,
+        "shared": SEMANTIC_CACHE_SHARED,
+    }